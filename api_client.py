@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module client HTTP dùng chung cho các thành phần Python gọi API Node.js (cổng 3000).
+Giữ kết nối keep-alive theo pool, tự động thử lại với backoff và cho phép cấu hình
+địa chỉ API qua biến môi trường thay vì hardcode trong từng module.
+
+Biến môi trường:
+    API_URL          Địa chỉ gốc của API (mặc định http://localhost:3000/api)
+    API_TIMEOUT      Timeout mặc định cho mỗi request (giây, mặc định 10)
+    API_RETRIES      Số lần thử lại khi lỗi kết nối hoặc HTTP 502/503/504 (mặc định 2)
+    API_BACKOFF      Hệ số backoff giữa các lần thử lại (giây, mặc định 0.3)
+    API_POOL_SIZE    Số kết nối keep-alive tối đa giữ trong pool (mặc định 32)
+"""
+
+import os
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+logger = logging.getLogger('api_client')
+
+API_BASE_URL = os.getenv("API_URL", "http://localhost:3000/api").rstrip('/')
+DEFAULT_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+DEFAULT_RETRIES = int(os.getenv("API_RETRIES", "2"))
+DEFAULT_BACKOFF = float(os.getenv("API_BACKOFF", "0.3"))
+DEFAULT_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "32"))
+
+
+class ApiClient:
+    """
+    Client HTTP dùng một requests.Session với pool kết nối keep-alive.
+    An toàn khi dùng chung giữa nhiều thread (mỗi request lấy một kết nối riêng từ pool).
+    """
+    
+    def __init__(self, base_url=API_BASE_URL, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF, pool_size=DEFAULT_POOL_SIZE):
+        """
+        Khởi tạo client
+        
+        Args:
+            base_url (str): Địa chỉ gốc của API
+            timeout (float): Timeout mặc định cho mỗi request (giây)
+            retries (int): Số lần thử lại cho các request GET
+            backoff_factor (float): Hệ số backoff, thời gian chờ = backoff_factor * 2^(lần thử - 1)
+            pool_size (int): Số kết nối tối đa giữ trong pool
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        
+        # Chỉ thử lại các request idempotent, POST (ví dụ /connect) không được gửi lặp
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def url(self, path):
+        """Tạo URL đầy đủ từ đường dẫn tương đối (ví dụ '/connections')"""
+        return f"{self.base_url}/{path.lstrip('/')}"
+    
+    def get(self, path, timeout=None, **kwargs):
+        """Gửi request GET, timeout mặc định lấy từ cấu hình client"""
+        return self.session.get(self.url(path), timeout=timeout or self.timeout, **kwargs)
+    
+    def post(self, path, timeout=None, **kwargs):
+        """Gửi request POST, timeout mặc định lấy từ cấu hình client"""
+        return self.session.post(self.url(path), timeout=timeout or self.timeout, **kwargs)
+    
+    def close(self):
+        """Đóng tất cả kết nối trong pool"""
+        self.session.close()
+
+
+# Singleton instance
+api_client = ApiClient()
@@ -17,6 +17,10 @@ import plotly.graph_objects as go
 from datetime import datetime
 from dotenv import load_dotenv
 
+from api_client import api_client
+from monitoring.metric_store import MetricStore, DEFAULT_PATH
+from monitoring.metric_rollup import MetricRollups
+
 # Tải biến môi trường
 load_dotenv()
 
@@ -49,16 +53,11 @@ with st.sidebar:
         © 2025 MikroTik Monitor
     """)
 
-# Cấu hình API URL (đảm bảo có thể truy cập trên cùng host)
-API_BASE_URL = "http://127.0.0.1:3000/api"
-
 # Hàm lấy thông tin router từ API
 def get_router_info():
     try:
-        import requests
-        
         # Kiểm tra trạng thái kết nối
-        response = requests.get(f"{API_BASE_URL}/test-mikrotik-connection", timeout=10)
+        response = api_client.get("/test-mikrotik-connection")
         
         if response.status_code == 200:
             data = response.json()
@@ -66,7 +65,7 @@ def get_router_info():
                 router_info = data.get("routerInfo", {})
                 
                 # Lấy thông tin tài nguyên
-                resources_response = requests.get(f"{API_BASE_URL}/connections/1/resources", timeout=10)
+                resources_response = api_client.get("/connections/1/resources")
                 resources = {}
                 
                 if resources_response.status_code == 200:
@@ -128,13 +127,11 @@ def get_router_info():
 # Hàm lấy thông tin interface từ API
 def get_interfaces():
     try:
-        import requests
-        
         # Gọi API lấy danh sách interfaces
-        response = requests.get(f"{API_BASE_URL}/connections/1/interfaces", timeout=10)
+        response = api_client.get("/connections/1/interfaces")
         
         # Gọi API lấy thống kê interfaces
-        stats_response = requests.get(f"{API_BASE_URL}/connections/1/interface-stats", timeout=10)
+        stats_response = api_client.get("/connections/1/interface-stats")
         
         stats_data = []
         if stats_response.status_code == 200:
@@ -174,10 +171,8 @@ def get_interfaces():
 # Hàm lấy thông tin log từ API
 def get_logs(limit=50):
     try:
-        import requests
-        
         # Gọi API lấy logs
-        response = requests.get(f"{API_BASE_URL}/connections/1/logs?limit={limit}", timeout=10)
+        response = api_client.get(f"/connections/1/logs?limit={limit}")
         
         if response.status_code == 200:
             logs_data = response.json()
@@ -213,6 +208,28 @@ def get_notification_config():
         st.error(f"Lỗi khi đọc cấu hình thông báo: {e}")
         return None
 
+# Hàm mở kho chuỗi thời gian và các tầng rollup do AlertMonitor ghi (chỉ đọc)
+@st.cache_resource
+def get_metric_rollups():
+    store_config = {}
+    try:
+        if os.path.exists("config/alert_monitor_config.json"):
+            with open("config/alert_monitor_config.json", "r") as f:
+                store_config = json.load(f).get("metric_store", {})
+    except Exception as e:
+        st.error(f"Lỗi khi đọc cấu hình giám sát: {e}")
+    rollups = MetricRollups(MetricStore(store_config.get("path", DEFAULT_PATH)))
+    rollups.configure(store_config)
+    return rollups
+
+# Các khoảng thời gian của biểu đồ băng thông: (số giây, độ phân giải mong muốn)
+BANDWIDTH_RANGES = {
+    "1 giờ": (3600, 60),
+    "24 giờ": (24 * 3600, 300),
+    "7 ngày": (7 * 24 * 3600, 3600),
+    "30 ngày": (30 * 24 * 3600, 4 * 3600)
+}
+
 # Dashboard
 if page == "Dashboard":
     st.header("Dashboard")
@@ -345,54 +362,75 @@ elif page == "Thống kê mạng":
     with tab1:
         st.subheader("Biểu đồ sử dụng băng thông")
         
-        # Mô phỏng dữ liệu
-        time_points = [f"2023-03-26 {hour}:00" for hour in range(24)]
-        download = [5, 7, 4, 2, 1, 0.5, 0.7, 3, 8, 12, 18, 15, 14, 16, 18, 22, 25, 28, 35, 32, 24, 18, 10, 7]
-        upload = [2, 1, 0.8, 0.5, 0.2, 0.1, 0.3, 1, 4, 6, 8, 7, 6, 7, 8, 10, 12, 13, 15, 14, 10, 8, 5, 3]
-        
-        # Tạo DataFrame
-        data = pd.DataFrame({
-            "time": time_points,
-            "download": download,
-            "upload": upload
-        })
-        
-        # Vẽ biểu đồ
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=data["time"],
-            y=data["download"],
-            mode="lines",
-            name="Download (Mbps)",
-            line=dict(color="blue", width=2)
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=data["time"],
-            y=data["upload"],
-            mode="lines",
-            name="Upload (Mbps)",
-            line=dict(color="green", width=2)
-        ))
-        
-        fig.update_layout(
-            title="Bandwidth Usage (Last 24 Hours)",
-            xaxis_title="Time",
-            yaxis_title="Bandwidth (Mbps)",
-            height=500
+        # Lịch sử băng thông do AlertMonitor lưu trong kho chuỗi thời gian
+        metric_rollups = get_metric_rollups()
+        router_id = "1"
+        interface_names = sorted(
+            series["tags"]["interface"] for series in metric_rollups.store.series("rx_bits")
+            if series["tags"].get("router") == router_id
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        if interface_names:
+            col1, col2 = st.columns(2)
+            with col1:
+                interface_name = st.selectbox("Interface", interface_names)
+            with col2:
+                range_name = st.selectbox("Khoảng thời gian", list(BANDWIDTH_RANGES), index=1)
+            tags = {"router": router_id, "interface": interface_name}
+            duration, resolution = BANDWIDTH_RANGES[range_name]
+            end = time.time()
+            start = end - duration
+            
+            # Giá trị trung bình theo độ phân giải, đọc từ tầng rollup thô nhất đáp ứng được
+            download_times, download, tier_name = metric_rollups.query("rx_bits", tags, start, end, resolution=resolution)
+            upload_times, upload, _ = metric_rollups.query("tx_bits", tags, start, end, resolution=resolution)
+            
+            # Tạo DataFrame
+            data = pd.DataFrame({
+                "time": [datetime.fromtimestamp(timestamp) for timestamp in download_times],
+                "download": download / 1000000
+            })
+            upload_data = pd.DataFrame({
+                "time": [datetime.fromtimestamp(timestamp) for timestamp in upload_times],
+                "upload": upload / 1000000
+            })
+            
+            # Vẽ biểu đồ
+            fig = go.Figure()
+            
+            fig.add_trace(go.Scatter(
+                x=data["time"],
+                y=data["download"],
+                mode="lines",
+                name="Download (Mbps)",
+                line=dict(color="blue", width=2)
+            ))
+            
+            fig.add_trace(go.Scatter(
+                x=upload_data["time"],
+                y=upload_data["upload"],
+                mode="lines",
+                name="Upload (Mbps)",
+                line=dict(color="green", width=2)
+            ))
+            
+            fig.update_layout(
+                title=f"Bandwidth Usage - {interface_name} ({range_name}, {tier_name})",
+                xaxis_title="Time",
+                yaxis_title="Bandwidth (Mbps)",
+                height=500
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Chưa có lịch sử băng thông. Bật \"metric_store\" trong config/alert_monitor_config.json và chạy giám sát để thu thập dữ liệu.")
     
     with tab2:
         st.subheader("DHCP Leases")
         
         # Lấy dữ liệu DHCP từ API
         try:
-            import requests
-            
-            response = requests.get(f"{API_BASE_URL}/connections/1/dhcp", timeout=10)
+            response = api_client.get("/connections/1/dhcp")
             
             if response.status_code == 200:
                 dhcp_data = response.json()
@@ -448,9 +486,7 @@ elif page == "Thống kê mạng":
         
         # Lấy dữ liệu Wireless từ API
         try:
-            import requests
-            
-            response = requests.get(f"{API_BASE_URL}/connections/1/wireless", timeout=10)
+            response = api_client.get("/connections/1/wireless")
             
             if response.status_code == 200:
                 wireless_data = response.json()
@@ -13,6 +13,8 @@ import requests
 from datetime import datetime
 from dotenv import load_dotenv
 
+from api_client import api_client
+
 # Tải biến môi trường từ file .env
 load_dotenv()
 
@@ -23,7 +25,6 @@ DEFAULT_ROUTER = {
     "username": os.getenv("MIKROTIK_USERNAME", ""),
     "password": os.getenv("MIKROTIK_PASSWORD", "")
 }
-API_URL = os.getenv("API_URL", "http://localhost:3000/api")
 
 def format_bytes(bytes_value, decimals=2):
     """Format số byte thành KB, MB, GB, TB"""
@@ -73,14 +74,13 @@ def get_resource_info(router_id=1):
     """Lấy thông tin tài nguyên từ router"""
     try:
         # Kết nối đến router
-        response = requests.post(f"{API_URL}/connections/{router_id}/connect", 
-                                json=DEFAULT_ROUTER)
+        response = api_client.post(f"/connections/{router_id}/connect", json=DEFAULT_ROUTER)
         if response.status_code != 200:
             print(f"Lỗi kết nối: {response.json().get('message', 'Không rõ')}")
             return None
         
         # Lấy thông tin tài nguyên
-        response = requests.get(f"{API_URL}/connections/{router_id}/resources")
+        response = api_client.get(f"/connections/{router_id}/resources")
         if response.status_code != 200:
             print(f"Lỗi lấy thông tin: {response.json().get('message', 'Không rõ')}")
             return None
@@ -93,7 +93,7 @@ def get_resource_info(router_id=1):
 def get_interfaces(router_id=1):
     """Lấy danh sách interfaces từ router"""
     try:
-        response = requests.get(f"{API_URL}/connections/{router_id}/interfaces")
+        response = api_client.get(f"/connections/{router_id}/interfaces")
         if response.status_code != 200:
             print(f"Lỗi lấy interfaces: {response.json().get('message', 'Không rõ')}")
             return None
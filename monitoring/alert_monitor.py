@@ -9,16 +9,29 @@ import os
 import sys
 import time
 import json
+import hashlib
 import logging
 import atexit
 from datetime import datetime, timedelta
+from collections import deque
 import threading
-import requests
+from concurrent.futures import ThreadPoolExecutor
 
 # Thêm thư mục gốc vào đường dẫn để import các module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from notifications import send_alert
+from notifications import send_alert, notification_service
+from monitoring.check_bandwidth_usage import bandwidth_monitor
+from monitoring.bandwidth_forecast import bandwidth_forecaster
+from monitoring.router_metadata import router_metadata
+from monitoring.router_snapshot import router_snapshots
+from monitoring.check_scheduler import CheckScheduler
+from monitoring.circuit_breaker import router_breakers
+from monitoring.tcp_prober import tcp_prober
+from monitoring.routeros_collector import routeros_collector
+from monitoring.routeros_subscriptions import routeros_subscriptions
+from monitoring.metric_store import metric_store
+from monitoring.metric_rollup import metric_rollups
 
 # Cấu hình logging
 logging.basicConfig(
@@ -34,6 +47,20 @@ logger = logging.getLogger('alert_monitor')
 # Đường dẫn đến file cấu hình thông báo
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'alert_monitor_config.json')
 
+# Các bước kiểm tra chạy cho mỗi router đang kết nối. Mỗi bước đánh giá phần "name" của
+# snapshot router bằng hàm "evaluate"; bước kiểm tra chỉ chạy khi ít nhất một loại cảnh báo
+# trong "alerts" được bật. Danh sách này dùng chung cho mọi engine giám sát (thread và asyncio).
+# Chu kỳ của từng bước kiểm tra lấy từ "check_intervals" trong cấu hình (theo "name"), ngoài ra
+# còn hai bước "connection" (chỉ lấy trạng thái kết nối) và "bandwidth" (băng thông interface).
+ROUTER_CHECKS = [
+    {"name": "resources", "alerts": ["high_cpu", "high_memory"], "evaluate": "_evaluate_resources"},
+    {"name": "interfaces", "alerts": ["interface_down"], "evaluate": "_evaluate_interfaces"},
+    {"name": "firewall", "alerts": ["firewall_change"], "evaluate": "_evaluate_firewall"},
+    {"name": "dhcp", "alerts": ["dhcp_server_down"], "evaluate": "_evaluate_dhcp_servers"},
+    {"name": "vpn", "alerts": ["vpn_connection_failed"], "evaluate": "_evaluate_vpn_connections"},
+    {"name": "wireless", "alerts": ["wireless_interference"], "evaluate": "_evaluate_wireless"},
+]
+
 class AlertMonitor:
     """
     Giám sát các thông số của thiết bị MikroTik và phát cảnh báo khi phát hiện sự cố
@@ -44,8 +71,44 @@ class AlertMonitor:
         self.config = self._load_config()
         self.active = False
         self.stop_event = threading.Event()
+        self.wake_event = threading.Event()  # Đánh thức vòng lặp giám sát trước thời điểm đến hạn
         self.last_alerts = {}  # Lưu thời gian gửi cảnh báo gần nhất
         self.router_status = {}  # Lưu trạng thái các router
+        self.state_lock = threading.RLock()  # Bảo vệ trạng thái dùng chung giữa các worker
+        self.executor = None
+        self.scheduler = CheckScheduler()  # Lịch kiểm tra theo từng cặp (router, bước kiểm tra)
+        self.in_flight = set()  # Các router đang được kiểm tra
+        self.poll_intervals = {}  # (router_id, bước kiểm tra) -> chu kỳ đã điều chỉnh theo chế độ thích ứng
+        self.interval_changes = {}  # Các thay đổi chu kỳ chờ vòng lặp giám sát áp dụng vào lịch
+        self.liveness_changes = {}  # router_id -> trạng thái TCP mới, chờ vòng lặp giám sát xử lý
+        self.pending_confirmations = {}  # router_id -> thời điểm kiểm tra lại nhanh để xác nhận mất kết nối
+        self.prober = None  # TcpProber khi bật "tcp_prober" trong cấu hình
+        self.metrics = None  # MetricStore khi bật "metric_store" trong cấu hình
+        self.subscriptions = None  # RouterOSSubscriptions khi bật "subscriptions" (chỉ với data_source "routeros")
+        self.subscription_changes = set()  # Router vừa mất đăng ký sự kiện, chờ vòng lặp giám sát kiểm tra interface ngay
+        self.router_logs = {}  # router_id -> các dòng log nhận được qua đăng ký sự kiện
+        self.schedule_window = {}  # Bộ đếm của khoảng thời gian hiện tại giữa hai lần tải danh sách router
+        self.cycle_stats = {}  # Thống kê của khoảng thời gian gần nhất
+        self.concurrency_setting = "max_workers"  # Tham số cấu hình giới hạn xử lý song song
+        
+        # Thời gian hết hạn của cache thông tin router
+        router_metadata.ttl = self.config.get("router_cache_ttl", 300)
+        
+        # Tham số circuit breaker cho router không kết nối được
+        router_breakers.configure(self.config.get("circuit_breaker", {}))
+        
+        # Nguồn snapshot router: API Node.js hoặc trực tiếp qua RouterOS API
+        if self.config.get("data_source", "api") == "routeros":
+            routeros_collector.configure(self.config.get("routeros", {}))
+            self.data_source = routeros_collector
+        else:
+            self.data_source = router_snapshots
+        
+        # Bộ đếm byte của interface: interface nào chỉ có bộ đếm 32 bit
+        bandwidth_monitor.configure(self.config["alerts"].get("high_bandwidth", {}))
+        
+        # Tham số dự báo bão hòa băng thông
+        bandwidth_forecaster.configure(self.config["alerts"].get("bandwidth_saturation", {}))
         
         # Tạo thư mục logs nếu chưa tồn tại
         logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
@@ -59,7 +122,7 @@ class AlertMonitor:
         """Đọc cấu hình từ file JSON"""
         if not os.path.exists(CONFIG_FILE):
             return self._get_default_config()
-            
+        
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
@@ -84,13 +147,76 @@ class AlertMonitor:
         """Trả về cấu hình mặc định"""
         return {
             "enabled": True,
-            "check_interval": 60,  # Kiểm tra mỗi 60 giây
+            "check_interval": 60,  # Chu kỳ tải lại danh sách router và chu kỳ mặc định của các bước kiểm tra
+            "check_intervals": {  # Chu kỳ (giây) riêng của từng bước kiểm tra
+                "connection": 10,
+                "resources": 60,
+                "interfaces": 30,
+                "bandwidth": 60,
+                "firewall": 600,
+                "dhcp": 120,
+                "vpn": 60,
+                "wireless": 300
+            },
+            "adaptive_polling": {  # Tăng tần suất kiểm tra tài nguyên/băng thông khi gần ngưỡng cảnh báo
+                "enabled": True,
+                "min_interval": 10,  # Chu kỳ ngắn nhất khi đã vượt ngưỡng (giây)
+                "max_interval": 300,  # Chu kỳ dài nhất khi giá trị thấp xa ngưỡng (giây)
+                "near_ratio": 0.8,  # Từ tỉ lệ giá trị/ngưỡng này trở lên, chu kỳ giảm dần về min_interval
+                "far_ratio": 0.5,  # Dưới tỉ lệ này, chu kỳ tăng dần đến max_interval
+                "growth": 1.5  # Hệ số tăng chu kỳ sau mỗi lần kiểm tra khi giá trị thấp xa ngưỡng
+            },
+            "circuit_breaker": {  # Tạm dừng kiểm tra router không kết nối được
+                "failure_threshold": 3,  # Số lần không kết nối được liên tiếp trước khi mở mạch
+                "base_backoff": 10,  # Thời gian chờ (giây) trước lần thăm dò đầu tiên
+                "max_backoff": 600,  # Thời gian chờ tối đa giữa hai lần thăm dò
+                "multiplier": 2  # Hệ số tăng thời gian chờ sau mỗi lần thăm dò thất bại
+            },
+            "tcp_prober": {  # Thăm dò TCP trực tiếp tới cổng API của router làm tín hiệu liveness nhanh
+                "enabled": False,
+                "interval": 5,  # Chu kỳ thăm dò (giây)
+                "timeout": 2,  # Timeout của mỗi lần kết nối (giây)
+                "max_concurrency": 1000,  # Số kết nối đồng thời tối đa
+                "history_size": 720  # Số điểm RTT giữ lại cho mỗi router
+            },
+            "data_source": "api",  # "api" (qua API Node.js) hoặc "routeros" (trực tiếp qua RouterOS API, cổng 8728)
+            "routeros": {  # Tham số kết nối khi dùng "data_source": "routeros"
+                "timeout": 10,  # Timeout của socket API (giây)
+                "use_ssl": False,  # Dùng API-SSL (cổng 8729)
+                "plaintext_login": True  # Đăng nhập kiểu mới (RouterOS >= 6.43)
+            },
+            "subscriptions": {  # Nhận thay đổi interface/log qua lệnh listen thay cho polling (cần "data_source": "routeros")
+                "enabled": False,
+                "retry_interval": 60,  # Thời gian chờ (giây) trước khi đăng ký lại router bị ngắt
+                "log_history": 100  # Số dòng log giữ lại cho mỗi router
+            },
+            "metric_store": {  # Lưu lịch sử CPU, Memory, rx/tx interface, RTT vào file (dùng cho biểu đồ)
+                "enabled": True,
+                "path": "data/metrics",  # Tương đối với thư mục gốc project
+                "segment_seconds": 3600,  # Mỗi file segment chứa 1 giờ dữ liệu
+                "flush_interval": 5,
+                "seal_delay": 300,
+                "raw_retention": 172800,  # Giữ dữ liệu gốc 2 ngày
+                "rollup_interval": 60,  # Chu kỳ tổng hợp các tầng 1m/5m/1h
+                "rollup_lag": 30,
+                "tiers": [  # step, retention, segment_seconds tính bằng giây
+                    {"name": "1m", "step": 60, "retention": 604800, "segment_seconds": 3600},
+                    {"name": "5m", "step": 300, "retention": 2592000, "segment_seconds": 21600},
+                    {"name": "1h", "step": 3600, "retention": 31536000, "segment_seconds": 86400}
+                ]
+            },
             "connection_timeout": 10,  # Timeout kết nối 10 giây
+            "engine": "thread",  # "thread" hoặc "asyncio"
+            "max_workers": 16,  # Số router được kiểm tra song song tối đa (1 = tuần tự)
+            "max_concurrency": 1000,  # Số router xử lý đồng thời khi dùng engine asyncio
+            "routeros_workers": 64,  # Engine asyncio với "data_source": "routeros": số lệnh RouterOS API (chặn) chạy song song
+            "router_cache_ttl": 300,  # Thời gian (giây) giữ cache tên/địa chỉ router
             "alert_cooldown": 1800,  # Thời gian chờ giữa các cảnh báo (giây)
             "alerts": {
                 "connection_lost": {
                     "enabled": True,
-                    "retries": 3,  # Số lần thử lại trước khi cảnh báo
+                    "retries": 3,  # Số lần kiểm tra thất bại liên tiếp trước khi cảnh báo
+                    "confirm_interval": 1,  # Khoảng thời gian (giây) giữa các lần kiểm tra lại nhanh sau lần thất bại đầu tiên
                     "cooldown": 1800  # Thời gian chờ giữa các cảnh báo (giây)
                 },
                 "high_cpu": {
@@ -114,6 +240,16 @@ class AlertMonitor:
                     "enabled": True,
                     "threshold": 80,  # Ngưỡng % băng thông tối đa
                     "duration": 300,
+                    "counter32_interfaces": [],  # Interface chỉ có bộ đếm 32 bit (tên hoặc "<router_id>_<tên>")
+                    "cooldown": 3600
+                },
+                "bandwidth_saturation": {
+                    "enabled": True,
+                    "horizon": 1800,  # Cảnh báo khi dự kiến bão hòa trong khoảng này (giây)
+                    "saturation_percent": 95,  # % băng thông tối đa được coi là bão hòa
+                    "min_samples": 5,  # Số mẫu tối thiểu để dự báo
+                    "ewma_alpha": 0.3,
+                    "max_age": None,  # Bỏ qua interface không có mẫu mới trong khoảng này (giây), mặc định 2 lần chu kỳ băng thông
                     "cooldown": 3600
                 },
                 "firewall_change": {
@@ -150,6 +286,15 @@ class AlertMonitor:
         
         self.active = True
         self.stop_event.clear()
+        self._start_metric_store()
+        self._start_prober()
+        self._start_subscriptions()
+        notification_service.start()
+        
+        # Tạo worker pool để kiểm tra các router song song
+        max_workers = self.config.get("max_workers", 1)
+        if max_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alert-monitor")
         
         # Chạy trong thread riêng
         self.monitor_thread = threading.Thread(target=self._monitor_loop)
@@ -165,116 +310,524 @@ class AlertMonitor:
         
         self.active = False
         self.stop_event.set()
+        self.wake_event.set()
         
         if hasattr(self, 'monitor_thread') and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=5)
         
+        self._stop_prober()
+        self._stop_subscriptions()
+        
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        
+        if self.data_source is routeros_collector:
+            routeros_collector.close_all()
+        
+        self._stop_metric_store()
+        self._drain_notifications()
         logger.info("Đã dừng giám sát MikroTik")
     
     def _monitor_loop(self):
-        """Vòng lặp giám sát chính"""
+        """Vòng lặp giám sát chính: chạy các bước kiểm tra khi đến hạn theo lịch"""
         logger.info("Vòng lặp giám sát đã bắt đầu")
+        self._reset_schedule()
+        next_refresh = 0
         
         while self.active and not self.stop_event.is_set():
             try:
-                # Lấy danh sách các router đã cấu hình
-                routers = self._get_router_connections()
-                
-                for router in routers:
-                    router_id = router.get('id')
-                    if not router_id:
-                        continue
-                    
-                    # Kiểm tra kết nối
-                    self._check_router_connection(router)
-                    
-                    # Nếu router đã kết nối, kiểm tra các thông số
-                    if self._is_router_connected(router_id):
-                        self._check_router_resources(router_id)
-                        self._check_router_interfaces(router_id)
-                        
-                        # Kiểm tra các thông số nâng cao
-                        self._check_bandwidth_usage(router_id)
-                        self._check_firewall_changes(router_id)
-                        self._check_dhcp_servers(router_id)
-                        self._check_vpn_connections(router_id)
-                        self._check_wireless_networks(router_id)
+                # Tải lại danh sách router và đồng bộ lịch sau mỗi check_interval. Khi không tải được
+                # danh sách (lỗi API) giữ nguyên lịch, circuit breaker và đăng ký sự kiện hiện có
+                if time.monotonic() >= next_refresh:
+                    routers = self._get_router_connections()
+                    if routers is not None:
+                        self._refresh_schedule(routers)
+                    self._run_forecast()
+                    next_refresh = time.monotonic() + self.config["check_interval"]
                 
-                # Chờ đến lần kiểm tra tiếp theo
-                self.stop_event.wait(self.config["check_interval"])
+                for router, checks, due_at in self._pop_due_polls():
+                    if self.executor:
+                        self.executor.submit(self._run_scheduled_poll, router, checks, due_at)
+                    else:
+                        self._run_scheduled_poll(router, checks, due_at)
                 
+                # Chờ đến bước kiểm tra đến hạn tiếp theo hoặc đến khi có tín hiệu từ prober
+                self.wake_event.wait(self._time_until_next_due(next_refresh))
+                self.wake_event.clear()
+            
             except Exception as e:
                 logger.error(f"Lỗi trong vòng lặp giám sát: {e}", exc_info=True)
                 # Chờ 30 giây trước khi thử lại nếu có lỗi
                 self.stop_event.wait(30)
     
-    def _get_router_connections(self):
-        """Lấy danh sách các router đã cấu hình từ API"""
+    def _start_prober(self):
+        """Bắt đầu thăm dò TCP nếu được bật trong cấu hình"""
+        prober_config = self.config.get("tcp_prober", {})
+        if not prober_config.get("enabled", False):
+            return
+        
+        self.prober = tcp_prober
+        self.prober.configure(prober_config)
+        self.prober.add_listener(self._on_liveness_change)
+        self.prober.start()
+    
+    def _stop_prober(self):
+        """Dừng thăm dò TCP"""
+        if self.prober:
+            self.prober.remove_listener(self._on_liveness_change)
+            self.prober.stop()
+            self.prober = None
+    
+    def _on_liveness_change(self, router_id, reachable):
+        """
+        Prober báo router đổi trạng thái TCP: kiểm tra kết nối của router ngay ở lượt kế tiếp
+        (mất kết nối được xác nhận qua trạng thái từ API, router có lại kết nối được thăm dò lại ngay)
+        """
+        with self.state_lock:
+            self.liveness_changes[router_id] = reachable
+        self._wake()
+    
+    def _start_metric_store(self):
+        """Bật lưu lịch sử chỉ số vào kho chuỗi thời gian nếu được bật trong cấu hình"""
+        store_config = self.config.get("metric_store", {})
+        if not store_config.get("enabled", False):
+            return
+        
+        self.metrics = metric_store
+        self.metrics.configure(store_config)
+        bandwidth_monitor.metric_store = self.metrics
+        tcp_prober.metric_store = self.metrics
+        
+        # Tổng hợp các tầng rollup và xóa dữ liệu hết hạn trong thread nền
+        metric_rollups.configure(store_config)
+        metric_rollups.start()
+    
+    def _stop_metric_store(self):
+        """Dừng tổng hợp rollup và ghi nốt các điểm trong bộ đệm của kho chuỗi thời gian"""
+        if self.metrics:
+            bandwidth_monitor.metric_store = None
+            tcp_prober.metric_store = None
+            metric_rollups.stop()
+            self.metrics.close()
+            self.metrics = None
+    
+    def _start_subscriptions(self):
+        """Bật nhận sự kiện qua lệnh listen nếu được cấu hình (router được đăng ký khi đồng bộ lịch)"""
+        subscription_config = self.config.get("subscriptions", {})
+        if not subscription_config.get("enabled", False):
+            return
+        if self.data_source is not routeros_collector:
+            logger.warning("Đăng ký sự kiện cần \"data_source\": \"routeros\", bỏ qua")
+            return
+        
+        self.subscriptions = routeros_subscriptions
+        self.subscriptions.configure(subscription_config)
+        self.subscriptions.add_listener(self._on_subscription_event)
+    
+    def _stop_subscriptions(self):
+        """Dừng nhận sự kiện"""
+        if self.subscriptions:
+            self.subscriptions.remove_listener(self._on_subscription_event)
+            self.subscriptions.stop_all()
+            self.subscriptions = None
+    
+    def _on_subscription_event(self, router_id, kind, data):
+        """
+        Sự kiện từ kết nối đăng ký của router: interface đổi trạng thái được đánh giá ngay
+        (cảnh báo interface_down không chờ đến lượt polling), dòng log được giữ lại,
+        đăng ký bị ngắt thì interface được kiểm tra lại ngay bằng polling
+        """
+        if kind == "interface":
+            if not data["dead"] and self._is_router_connected(router_id) and self._alert_enabled("interface_down"):
+                self._evaluate_interfaces(router_id, [data])
+        elif kind == "log":
+            with self.state_lock:
+                logs = self.router_logs.get(router_id)
+                if logs is None:
+                    logs = self.router_logs[router_id] = deque(maxlen=self.config.get("subscriptions", {}).get("log_history", 100))
+                logs.append(dict(data, received_at=datetime.now()))
+            if "critical" in data.get("topics", "").split(","):
+                logger.warning(f"Log router {self._get_router_name(router_id)}: {data.get('message', '')}")
+        elif kind == "state" and not data["active"]:
+            with self.state_lock:
+                self.subscription_changes.add(router_id)
+            self._wake()
+    
+    def _interfaces_streamed(self, router_id):
+        """
+        Trạng thái interface của router đang được cập nhật qua đăng ký sự kiện (không cần polling).
+        Trạng thái ban đầu vẫn lấy bằng polling, sự kiện chỉ được so sánh với trạng thái đã có.
+        """
+        if self.subscriptions is None or not self.subscriptions.is_active(router_id):
+            return False
+        with self.state_lock:
+            return bool(self.router_status.get(router_id, {}).get('interfaces'))
+    
+    def _wake(self):
+        """Đánh thức vòng lặp giám sát"""
+        self.wake_event.set()
+    
+    def _check_intervals(self):
+        """Chu kỳ (giây) của các bước kiểm tra đang bật, mặc định bằng check_interval"""
+        configured = self.config.get("check_intervals", {})
+        default = self.config["check_interval"]
+        
+        names = ["connection"] + [check["name"] for check in ROUTER_CHECKS if self._is_check_enabled(check)]
+        if self._alert_enabled("high_bandwidth"):
+            names.append("bandwidth")
+        return {name: max(1, configured.get(name, default)) for name in names}
+    
+    def _reset_schedule(self):
+        """Bắt đầu lịch kiểm tra mới khi vòng lặp giám sát khởi động"""
+        with self.state_lock:
+            self.scheduler = CheckScheduler()
+            self.in_flight = set()
+            self.poll_intervals = {}
+            self.interval_changes = {}
+            self.liveness_changes = {}
+            self.pending_confirmations = {}
+            self.subscription_changes = set()
+            self.schedule_window = self._new_schedule_window(time.monotonic())
+    
+    def _new_schedule_window(self, started):
+        """Bộ đếm rỗng cho khoảng thời gian thống kê mới"""
+        return {"started": started, "polls": 0, "failed": 0, "skipped": 0, "suppressed": 0, "max_lag": 0.0}
+    
+    def _refresh_schedule(self, routers):
+        """Đồng bộ lịch với danh sách router và ghi thống kê của khoảng thời gian vừa qua"""
+        router_ids = [router.get('id') for router in routers if router.get('id')]
+        added, removed = self.scheduler.sync(router_ids, self._check_intervals())
+        router_breakers.forget(set(router_ids))
+        # Danh sách rỗng có thể là lỗi API: giữ bộ đếm, lịch sử và sketch phân vị băng thông
+        if router_ids:
+            bandwidth_monitor.forget(set(router_ids))
+        if self.data_source is routeros_collector:
+            routeros_collector.forget(set(router_ids))
+        if self.subscriptions:
+            self.subscriptions.sync(router_ids)
+        if removed:
+            with self.state_lock:
+                current = set(router_ids)
+                self.poll_intervals = {key: value for key, value in self.poll_intervals.items() if key[0] in current}
+        if added or removed:
+            logger.info(f"Đã cập nhật lịch kiểm tra: {len(router_ids)} router, +{added}/-{removed} bước kiểm tra")
+        self._record_cycle_stats(len(router_ids))
+    
+    def _pop_due_polls(self):
+        """
+        Lấy các router có bước kiểm tra đến hạn. Router còn đang được kiểm tra từ lần trước
+        bị bỏ qua lượt này (được tính vào "skipped"). Router đang mở circuit breaker bị bỏ qua
+        (tính vào "suppressed") cho đến lần thăm dò, lần thăm dò chỉ kiểm tra kết nối.
+        Bước kiểm tra interface được bỏ qua khi router đang gửi thay đổi interface qua đăng ký sự kiện.
+        
+        Returns:
+            list: Các tuple (router, danh sách bước kiểm tra, thời điểm đến hạn)
+        """
+        # Áp dụng các thay đổi chu kỳ của chế độ thích ứng trước khi lấy lịch
+        with self.state_lock:
+            changes, self.interval_changes = self.interval_changes, {}
+        for (router_id, check), interval in changes.items():
+            self.scheduler.set_interval(router_id, check, interval)
+        
+        # Router đổi trạng thái TCP: kiểm tra kết nối ngay, bỏ qua thời gian backoff nếu đã kết nối được
+        with self.state_lock:
+            liveness, self.liveness_changes = self.liveness_changes, {}
+        for router_id, reachable in liveness.items():
+            if reachable:
+                router_breakers.expedite(router_id)
+            self.scheduler.expedite(router_id, "connection")
+        
+        # Router vừa kiểm tra thất bại: kiểm tra kết nối lại sau confirm_interval để xác nhận mất kết nối
+        with self.state_lock:
+            confirmations, self.pending_confirmations = self.pending_confirmations, {}
+        for router_id, due_at in confirmations.items():
+            self.scheduler.expedite(router_id, "connection", due_at)
+        
+        # Router mất đăng ký sự kiện: kiểm tra interface ngay bằng polling để không bỏ sót thay đổi
+        with self.state_lock:
+            dropped, self.subscription_changes = self.subscription_changes, set()
+        for router_id in dropped:
+            self.scheduler.expedite(router_id, "interfaces")
+        
+        polls = []
+        for router_id, checks, due_at in self.scheduler.pop_due():
+            if "interfaces" in checks and self._interfaces_streamed(router_id):
+                checks = [check for check in checks if check != "interfaces"]
+                if not checks:
+                    continue
+            
+            with self.state_lock:
+                if router_id in self.in_flight:
+                    self.schedule_window["skipped"] += 1
+                    continue
+                if not self._allow_poll(router_id):
+                    self.schedule_window["suppressed"] += 1
+                    continue
+                self.in_flight.add(router_id)
+            
+            if router_breakers.is_probing(router_id):
+                checks = ["connection"]
+            
+            router = router_metadata.get(router_id, refresh=False) or {"id": router_id}
+            polls.append((router, checks, due_at))
+        return polls
+    
+    def _allow_poll(self, router_id):
+        """
+        Router được kiểm tra nếu circuit breaker cho phép. Khi có prober, lần thăm dò của router
+        đang mở mạch chỉ chạy khi router kết nối được qua TCP (hoặc chưa có kết quả TCP).
+        """
+        if self.prober and router_breakers.is_open(router_id) and self.prober.is_reachable(router_id) is False:
+            return False
+        return router_breakers.allow_request(router_id)
+    
+    def _time_until_next_due(self, next_refresh):
+        """Thời gian (giây) chờ đến bước kiểm tra đến hạn tiếp theo hoặc lần tải lại danh sách router"""
+        next_due = self.scheduler.next_due()
+        wake_at = next_refresh if next_due is None else min(next_due, next_refresh)
+        return max(0, wake_at - time.monotonic())
+    
+    def _run_scheduled_poll(self, router, checks, due_at):
+        """Chạy các bước kiểm tra đến hạn của một router và cập nhật thống kê"""
+        lag = max(0.0, time.monotonic() - due_at)
+        ok = False
         try:
-            # Gọi API để lấy danh sách router
-            url = "http://localhost:3000/api/connections"
-            response = requests.get(url, timeout=self.config["connection_timeout"])
+            ok = self._poll_router(router, checks)
+        finally:
+            self._finish_poll(router.get('id'), ok, lag)
+    
+    def _finish_poll(self, router_id, ok, lag):
+        """Ghi nhận một lần kiểm tra router đã xong"""
+        with self.state_lock:
+            self.in_flight.discard(router_id)
+            window = self.schedule_window
+            window["polls"] += 1
+            window["failed"] += 0 if ok else 1
+            window["max_lag"] = max(window["max_lag"], lag)
+    
+    def _poll_router(self, router, checks=None):
+        """
+        Chạy các bước kiểm tra cho một router, trả về False nếu có lỗi
+        
+        Args:
+            router (dict): Thông tin router
+            checks (list): Các bước kiểm tra cần chạy (mặc định tất cả các bước đang bật)
+        """
+        router_id = router.get('id')
+        if not router_id:
+            return True
+        
+        if checks is None:
+            checks = list(self._check_intervals())
+        
+        try:
+            # Lấy một snapshot cho các bước kiểm tra đến hạn, mọi bước đánh giá trên snapshot này
+            snapshot = self.data_source.fetch(router_id, self._snapshot_sections(checks),
+                                              timeout=self.config["connection_timeout"])
+            self._evaluate_snapshot(router, snapshot)
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Lỗi khi lấy danh sách router: {response.status_code}")
-                return []
+            # Mất kết nối chưa được xác nhận: xếp lịch kiểm tra lại nhanh
+            self._request_connection_confirmation(router_id)
+            
+            # Băng thông được tính qua BandwidthMonitor từ danh sách interface trong snapshot
+            if "bandwidth" in checks and self._is_router_connected(router_id):
+                self._check_bandwidth_usage(router_id, snapshot["sections"].get("interfaces"), snapshot["timestamp"])
+            return True
         except Exception as e:
-            logger.error(f"Lỗi khi lấy danh sách router: {e}")
-            return []
+            logger.error(f"Lỗi khi kiểm tra router #{router_id}: {e}", exc_info=True)
+            return False
+    
+    def _record_cycle_stats(self, router_count):
+        """
+        Lưu và ghi log thống kê của khoảng thời gian giữa hai lần tải danh sách router
+        để điều chỉnh kích thước worker pool, sau đó bắt đầu khoảng mới
+        """
+        setting = self.concurrency_setting
+        concurrency = self.config.get(setting, 1)
+        now = time.monotonic()
+        
+        with self.state_lock:
+            window = self.schedule_window
+            self.schedule_window = self._new_schedule_window(now)
+            self.cycle_stats = {
+                "duration": now - window["started"],
+                "routers": router_count,
+                "polls": window["polls"],
+                "failed": window["failed"],
+                "skipped": window["skipped"],
+                "suppressed": window["suppressed"],
+                "open_breakers": len(router_breakers.get_open_routers()),
+                "max_lag": window["max_lag"],
+                "in_flight": len(self.in_flight),
+                setting: concurrency,
+                "finished_at": datetime.now()
+            }
+        
+        if not window["polls"] and not window["skipped"]:
+            return
+        
+        logger.info(f"Thống kê kiểm tra {now - window['started']:.0f}s qua: {router_count} router, {window['polls']} lượt, "
+                    f"{window['failed']} lỗi, {window['skipped']} bỏ qua, {window['suppressed']} chờ thăm dò lại, "
+                    f"trễ tối đa {window['max_lag']:.2f}s ({setting}={concurrency})")
+        if window["skipped"]:
+            logger.warning(f"{window['skipped']} lượt kiểm tra bị bỏ qua do router vẫn đang được kiểm tra từ lượt trước, "
+                           f"cân nhắc tăng {setting}")
+    
+    def _drain_notifications(self):
+        """Gửi nốt các cảnh báo còn trong hàng đợi thông báo (trong thời hạn shutdown_timeout)"""
+        if not notification_service.shutdown():
+            logger.warning("Một số cảnh báo chưa được gửi trước khi dừng giám sát (vẫn còn trong outbox nếu bật)")
+    
+    def get_notification_metrics(self):
+        """Số liệu hàng đợi gửi thông báo của từng kênh (độ sâu, độ trễ, số lượt bị bỏ)"""
+        return notification_service.get_dispatch_metrics()
+    
+    def get_cycle_stats(self):
+        """Trả về thống kê của khoảng thời gian giữa hai lần tải danh sách router gần nhất"""
+        with self.state_lock:
+            return dict(self.cycle_stats)
+    
+    def get_liveness(self, router_id=None):
+        """
+        Kết quả thăm dò TCP (reachable, rtt, checked_at, failures) của một router hoặc tất cả router,
+        None nếu không bật prober
+        """
+        if not self.prober:
+            return None
+        if router_id is not None:
+            return self.prober.get_status(router_id)
+        return self.prober.get_all_status()
+    
+    def get_breaker_states(self):
+        """Trả về trạng thái circuit breaker của các router đang có lỗi kết nối"""
+        return router_breakers.get_states()
+    
+    def get_subscription_states(self):
+        """Trạng thái đăng ký sự kiện (active, error) của các router, None nếu không bật đăng ký"""
+        if not self.subscriptions:
+            return None
+        return self.subscriptions.get_states()
+    
+    def get_bandwidth_forecasts(self, router_id=None):
+        """
+        Kết quả dự báo băng thông gần nhất (độ dốc, EWMA, time_to_saturation tính bằng giây)
+        của các interface, hoặc của một router
+        """
+        return bandwidth_forecaster.get_forecasts(router_id)
     
-    def _check_router_connection(self, router):
-        """Kiểm tra kết nối đến router"""
+    def get_bandwidth_percentile(self, router_id=None, interface_name=None, quantile=0.95, window="monthly", period=None):
+        """
+        Phân vị tốc độ rx/tx (mặc định p95 của tháng hiện tại) của một interface, gộp cho
+        một router nếu không chỉ định interface, hoặc cho toàn bộ hệ thống nếu không chỉ định router
+        """
+        percentiles = bandwidth_monitor.percentiles
+        if interface_name is not None:
+            keys = [f"{router_id}_{interface_name}"]
+        else:
+            keys = percentiles.router_keys(router_id)
+        return percentiles.percentile(keys, quantile, window, period)
+    
+    def get_router_logs(self, router_id):
+        """Các dòng log gần nhất của router nhận được qua đăng ký sự kiện"""
+        with self.state_lock:
+            return list(self.router_logs.get(router_id, ()))
+    
+    def _get_router_connections(self):
+        """Lấy danh sách các router đã cấu hình từ API, None nếu không tải được"""
+        # Danh sách được nạp lại vào cache thông tin router ở mỗi chu kỳ
+        return router_metadata.refresh(timeout=self.config["connection_timeout"])
+    
+    def _snapshot_sections(self, checks):
+        """Các phần snapshot cần lấy cho các bước kiểm tra, trạng thái kết nối luôn được lấy"""
+        sections = ["status"]
+        for check in checks:
+            section = "interfaces" if check == "bandwidth" else check
+            if section != "connection" and section not in sections:
+                sections.append(section)
+        return sections
+    
+    def _evaluate_snapshot(self, router, snapshot):
+        """Cập nhật trạng thái kết nối và chạy các bước kiểm tra trên snapshot của router"""
         router_id = router.get('id')
         router_name = router.get('name', f'Router #{router_id}')
         
-        try:
-            # Gọi API để kiểm tra trạng thái kết nối
-            url = f"http://localhost:3000/api/connections/{router_id}/status"
-            response = requests.get(url, timeout=self.config["connection_timeout"])
+        # Kiểm tra kết nối. Trạng thái không xác định (None: lỗi API, timeout) là lỗi phía API,
+        # không phải của router, nên không tính vào circuit breaker
+        if snapshot["connected"] is not None:
+            router_breakers.record(router_id, snapshot["connected"], snapshot["timestamp"])
+            self._update_connection_state(router_id, router_name, snapshot["connected"])
+        
+        # Nếu router đã kết nối, kiểm tra các thông số
+        if not self._is_router_connected(router_id):
+            return
+        
+        sections = snapshot["sections"]
+        for check in ROUTER_CHECKS:
+            if check["name"] == "interfaces" and self._interfaces_streamed(router_id):
+                continue
+            if self._is_check_enabled(check) and check["name"] in sections:
+                self._evaluate_check(router_id, check, sections[check["name"]])
+    
+    def _update_connection_state(self, router_id, router_name, connected):
+        """Cập nhật trạng thái kết nối của router và gửi cảnh báo khi mất kết nối"""
+        # Cập nhật trạng thái router
+        with self.state_lock:
+            if router_id not in self.router_status:
+                self.router_status[router_id] = {
+                    'connected': connected,
+                    'connection_check_count': 0,
+                    'last_status_change': datetime.now(),
+                    'resources': {},
+                    'interfaces': {}
+                }
+            status = self.router_status[router_id]
             
-            if response.status_code == 200:
-                data = response.json()
-                connected = data.get('connected', False)
-                
-                # Cập nhật trạng thái router
-                if router_id not in self.router_status:
-                    self.router_status[router_id] = {
-                        'connected': connected,
-                        'connection_check_count': 0,
-                        'last_status_change': datetime.now(),
-                        'resources': {},
-                        'interfaces': {}
-                    }
-                else:
-                    # Nếu trạng thái thay đổi, cập nhật thời gian
-                    if self.router_status[router_id]['connected'] != connected:
-                        self.router_status[router_id]['last_status_change'] = datetime.now()
-                        
-                        # Gửi cảnh báo khi mất kết nối
-                        if not connected and self.config["alerts"]["connection_lost"]["enabled"]:
-                            # Tăng bộ đếm kiểm tra
-                            self.router_status[router_id]['connection_check_count'] += 1
-                            
-                            # Kiểm tra số lần thử lại
-                            if self.router_status[router_id]['connection_check_count'] >= self.config["alerts"]["connection_lost"]["retries"]:
-                                # Kiểm tra cooldown
-                                alert_key = f"connection_lost_{router_id}"
-                                if self._can_send_alert(alert_key, self.config["alerts"]["connection_lost"]["cooldown"]):
-                                    logger.warning(f"Phát hiện mất kết nối đến {router_name}")
-                                    self._send_connection_lost_alert(router_id, router_name)
-                        
-                        # Reset bộ đếm nếu kết nối lại
-                        if connected:
-                            self.router_status[router_id]['connection_check_count'] = 0
-                    
-                    # Cập nhật trạng thái
-                    self.router_status[router_id]['connected'] = connected
-            else:
-                logger.error(f"Lỗi khi kiểm tra kết nối router {router_name}: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Lỗi khi kiểm tra kết nối router {router_name}: {e}")
+            # Nếu trạng thái thay đổi, cập nhật thời gian
+            if status['connected'] != connected:
+                status['last_status_change'] = datetime.now()
+            status['connected'] = connected
+            
+            # Reset bộ đếm nếu kết nối lại, tăng bộ đếm sau mỗi lần kiểm tra thất bại
+            if connected:
+                status['connection_check_count'] = 0
+                return
+            status['connection_check_count'] += 1
+            check_count = status['connection_check_count']
+        
+        # Gửi cảnh báo khi số lần kiểm tra thất bại liên tiếp đạt số lần thử lại
+        alert_config = self._alert_config("connection_lost")
+        if alert_config.get("enabled", False) and check_count >= alert_config.get("retries", 3):
+            # Kiểm tra cooldown
+            alert_key = f"connection_lost_{router_id}"
+            if self._can_send_alert(alert_key, self._alert_cooldown("connection_lost")):
+                logger.warning(f"Phát hiện mất kết nối đến {router_name}")
+                self._send_connection_lost_alert(router_id, router_name)
+    
+    def _needs_connection_confirmation(self, router_id):
+        """
+        Router đang kiểm tra thất bại nhưng chưa đủ số lần thử lại để cảnh báo: cần kiểm tra lại
+        nhanh (theo confirm_interval) thay vì chờ các chu kỳ kiểm tra kế tiếp
+        """
+        alert_config = self._alert_config("connection_lost")
+        if not alert_config.get("enabled", False):
+            return False
+        with self.state_lock:
+            status = self.router_status.get(router_id)
+            return (status is not None and not status['connected']
+                    and 0 < status['connection_check_count'] < alert_config.get("retries", 3))
+    
+    def _request_connection_confirmation(self, router_id):
+        """
+        Xếp lần kiểm tra kết nối kế tiếp của router sau confirm_interval nếu cần xác nhận mất kết nối.
+        Vòng lặp giám sát đưa lần kiểm tra vào lịch nên worker không phải chờ giữa các lần thử lại.
+        """
+        if not self._needs_connection_confirmation(router_id):
+            return
+        confirm_interval = self._alert_config("connection_lost").get("confirm_interval", 1)
+        with self.state_lock:
+            self.pending_confirmations[router_id] = time.monotonic() + confirm_interval
+        self._wake()
     
     def _is_router_connected(self, router_id):
         """Kiểm tra xem router có đang kết nối không"""
@@ -282,34 +835,56 @@ class AlertMonitor:
             return False
         return self.router_status[router_id]['connected']
     
-    def _check_router_resources(self, router_id):
-        """Kiểm tra tài nguyên của router (CPU, Memory)"""
+    def _evaluate_check(self, router_id, check, data):
+        """Đánh giá dữ liệu đã lấy được cho một bước kiểm tra"""
         try:
-            # Gọi API để lấy thông tin tài nguyên
-            url = f"http://localhost:3000/api/routers/{router_id}/resources"
-            response = requests.get(url, timeout=self.config["connection_timeout"])
-            
-            if response.status_code == 200:
-                resources = response.json()
-                
-                # Lấy tên router
-                router_name = self._get_router_name(router_id)
-                
-                # Kiểm tra CPU
-                self._check_cpu_usage(router_id, router_name, resources)
-                
-                # Kiểm tra Memory
-                self._check_memory_usage(router_id, router_name, resources)
-                
-                # Cập nhật thông tin tài nguyên
-                self.router_status[router_id]['resources'] = resources
-            else:
-                logger.error(f"Lỗi khi lấy thông tin tài nguyên router #{router_id}: {response.status_code}")
+            getattr(self, check["evaluate"])(router_id, data)
         except Exception as e:
-            logger.error(f"Lỗi khi kiểm tra tài nguyên router #{router_id}: {e}")
+            logger.error(f"Lỗi khi kiểm tra {check['name']} router #{router_id}: {e}")
+    
+    def _is_check_enabled(self, check):
+        """Bước kiểm tra được bật nếu có ít nhất một loại cảnh báo liên quan được bật"""
+        return any(self._alert_enabled(alert_type) for alert_type in check["alerts"])
+    
+    def _evaluate_resources(self, router_id, resources):
+        """Kiểm tra tài nguyên của router (CPU, Memory)"""
+        # Lấy tên router
+        router_name = self._get_router_name(router_id)
+        
+        # Lưu lịch sử CPU, Memory
+        if self.metrics:
+            self._record_resources(router_id, resources)
+        
+        # Kiểm tra CPU
+        cpu_ratio = self._check_cpu_usage(router_id, router_name, resources)
+        
+        # Kiểm tra Memory
+        memory_ratio = self._check_memory_usage(router_id, router_name, resources)
+        
+        # Điều chỉnh chu kỳ kiểm tra theo chỉ số gần ngưỡng nhất
+        ratios = [ratio for ratio in (cpu_ratio, memory_ratio) if ratio is not None]
+        if ratios:
+            self._adapt_poll_interval(router_id, "resources", max(ratios))
+        
+        # Cập nhật thông tin tài nguyên
+        self.router_status[router_id]['resources'] = resources
+    
+    def _record_resources(self, router_id, resources):
+        """Ghi CPU (%) và Memory (%) của router vào kho chuỗi thời gian"""
+        tags = {"router": router_id}
+        points = []
+        try:
+            points.append(("cpu_load", tags, float(str(resources.get('cpuLoad', 0)).rstrip('%')), None))
+        except ValueError:
+            pass
+        
+        memory_total = resources.get('memoryTotal', 0)
+        if memory_total:
+            points.append(("memory_percent", tags, resources.get('memoryUsed', 0) / memory_total * 100, None))
+        self.metrics.write_many(points)
     
     def _check_cpu_usage(self, router_id, router_name, resources):
-        """Kiểm tra mức sử dụng CPU"""
+        """Kiểm tra mức sử dụng CPU, trả về tỉ lệ so với ngưỡng (None nếu không kiểm tra)"""
         if not self.config["alerts"]["high_cpu"]["enabled"]:
             return
         
@@ -346,11 +921,13 @@ class AlertMonitor:
                 # Reset thời gian vượt ngưỡng
                 if 'high_cpu_since' in self.router_status[router_id]:
                     del self.router_status[router_id]['high_cpu_since']
+            
+            return cpu_load / threshold if threshold else None
         except Exception as e:
             logger.error(f"Lỗi khi kiểm tra CPU router #{router_id}: {e}")
     
     def _check_memory_usage(self, router_id, router_name, resources):
-        """Kiểm tra mức sử dụng Memory"""
+        """Kiểm tra mức sử dụng Memory, trả về tỉ lệ so với ngưỡng (None nếu không kiểm tra)"""
         if not self.config["alerts"]["high_memory"]["enabled"]:
             return
         
@@ -386,97 +963,317 @@ class AlertMonitor:
                 # Reset thời gian vượt ngưỡng
                 if 'high_memory_since' in self.router_status[router_id]:
                     del self.router_status[router_id]['high_memory_since']
+            
+            return memory_percent / threshold if threshold else None
         except Exception as e:
             logger.error(f"Lỗi khi kiểm tra Memory router #{router_id}: {e}")
     
-    def _check_router_interfaces(self, router_id):
+    def _evaluate_interfaces(self, router_id, interfaces):
         """Kiểm tra trạng thái các interface"""
-        if not self.config["alerts"]["interface_down"]["enabled"]:
+        if not self._alert_enabled("interface_down"):
             return
         
-        try:
-            # Gọi API để lấy thông tin interface
-            url = f"http://localhost:3000/api/routers/{router_id}/interfaces"
-            response = requests.get(url, timeout=self.config["connection_timeout"])
+        router_name = self._get_router_name(router_id)
+        
+        # Lưu trạng thái cũ nếu chưa có
+        if 'interfaces' not in self.router_status[router_id]:
+            self.router_status[router_id]['interfaces'] = {}
+        
+        # Kiểm tra từng interface
+        for interface in interfaces:
+            name = interface.get('name')
             
-            if response.status_code == 200:
-                interfaces = response.json()
-                router_name = self._get_router_name(router_id)
-                
-                # Lưu trạng thái cũ nếu chưa có
-                if 'interfaces' not in self.router_status[router_id]:
-                    self.router_status[router_id]['interfaces'] = {}
+            # Bỏ qua các interface được loại trừ
+            if name in self.config["alerts"]["interface_down"]["excluded_interfaces"]:
+                continue
+            
+            running = interface.get('running', False)
+            disabled = interface.get('disabled', False)
+            
+            # Chỉ quan tâm đến interface đang bật
+            if disabled:
+                continue
+            
+            # Lưu trạng thái cũ
+            if name not in self.router_status[router_id]['interfaces']:
+                self.router_status[router_id]['interfaces'][name] = {
+                    'running': running,
+                    'last_change': datetime.now()
+                }
+            
+            # Kiểm tra nếu trạng thái thay đổi
+            if self.router_status[router_id]['interfaces'][name]['running'] != running:
+                self.router_status[router_id]['interfaces'][name]['running'] = running
+                self.router_status[router_id]['interfaces'][name]['last_change'] = datetime.now()
                 
-                # Kiểm tra từng interface
-                for interface in interfaces:
-                    name = interface.get('name')
-                    
-                    # Bỏ qua các interface được loại trừ
-                    if name in self.config["alerts"]["interface_down"]["excluded_interfaces"]:
-                        continue
-                    
-                    running = interface.get('running', False)
-                    disabled = interface.get('disabled', False)
-                    
-                    # Chỉ quan tâm đến interface đang bật
-                    if disabled:
-                        continue
-                    
-                    # Lưu trạng thái cũ
-                    if name not in self.router_status[router_id]['interfaces']:
-                        self.router_status[router_id]['interfaces'][name] = {
-                            'running': running,
-                            'last_change': datetime.now()
-                        }
-                    
-                    # Kiểm tra nếu trạng thái thay đổi
-                    if self.router_status[router_id]['interfaces'][name]['running'] != running:
-                        self.router_status[router_id]['interfaces'][name]['running'] = running
-                        self.router_status[router_id]['interfaces'][name]['last_change'] = datetime.now()
-                        
-                        # Gửi cảnh báo nếu interface ngừng hoạt động
-                        if not running:
-                            # Kiểm tra cooldown
-                            alert_key = f"interface_down_{router_id}_{name}"
-                            if self._can_send_alert(alert_key, self.config["alerts"]["interface_down"]["cooldown"]):
-                                logger.warning(f"Phát hiện interface {name} ngừng hoạt động trên {router_name}")
-                                self._send_interface_down_alert(router_id, router_name, name, interface)
-            else:
-                logger.error(f"Lỗi khi lấy thông tin interface router #{router_id}: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Lỗi khi kiểm tra interface router #{router_id}: {e}")
+                # Gửi cảnh báo nếu interface ngừng hoạt động
+                if not running:
+                    # Kiểm tra cooldown
+                    alert_key = f"interface_down_{router_id}_{name}"
+                    if self._can_send_alert(alert_key, self.config["alerts"]["interface_down"]["cooldown"]):
+                        logger.warning(f"Phát hiện interface {name} ngừng hoạt động trên {router_name}")
+                        self._send_interface_down_alert(router_id, router_name, name, interface)
     
-    def _get_router_name(self, router_id):
-        """Lấy tên của router từ ID"""
-        try:
-            # Gọi API để lấy thông tin router
-            url = f"http://localhost:3000/api/connections/{router_id}"
-            response = requests.get(url, timeout=self.config["connection_timeout"])
+    def _evaluate_firewall(self, router_id, firewall):
+        """Phát hiện thay đổi cấu hình firewall so với lần kiểm tra trước"""
+        filter_rules = firewall.get('filterRules', [])
+        nat_rules = firewall.get('natRules', [])
+        fingerprint = hashlib.sha1(json.dumps(firewall, sort_keys=True).encode('utf-8')).hexdigest()
+        
+        previous = self.router_status[router_id].get('firewall')
+        self.router_status[router_id]['firewall'] = {
+            'fingerprint': fingerprint,
+            'filter_count': len(filter_rules),
+            'nat_count': len(nat_rules)
+        }
+        
+        # Lần đầu chỉ lưu lại cấu hình để so sánh
+        if previous is None or previous['fingerprint'] == fingerprint:
+            return
+        
+        changes = (f"Filter: {previous['filter_count']} -> {len(filter_rules)} rule, "
+                   f"NAT: {previous['nat_count']} -> {len(nat_rules)} rule")
+        alert_key = f"firewall_change_{router_id}"
+        if self._can_send_alert(alert_key, self._alert_cooldown("firewall_change")):
+            router_name = self._get_router_name(router_id)
+            logger.warning(f"Phát hiện thay đổi firewall trên {router_name}: {changes}")
+            self._send_firewall_change_alert(router_id, router_name, changes)
+    
+    def _evaluate_dhcp_servers(self, router_id, dhcp):
+        """Phát hiện DHCP server ngừng hoạt động (bị tắt, lỗi hoặc bị xóa)"""
+        servers = {
+            server.get('name'): not server.get('disabled', False) and not server.get('invalid', False)
+            for server in dhcp.get('servers', [])
+        }
+        previous = self.router_status[router_id].get('dhcp_servers', {})
+        self.router_status[router_id]['dhcp_servers'] = servers
+        
+        for name, was_up in previous.items():
+            if not was_up or servers.get(name, False):
+                continue
+            
+            alert_key = f"dhcp_server_down_{router_id}_{name}"
+            if self._can_send_alert(alert_key, self._alert_cooldown("dhcp_server_down")):
+                router_name = self._get_router_name(router_id)
+                logger.warning(f"Phát hiện DHCP server {name} ngừng hoạt động trên {router_name}")
+                self._send_dhcp_server_down_alert(router_id, router_name, name)
+    
+    def _evaluate_vpn_connections(self, router_id, vpn):
+        """Phát hiện interface VPN (PPP) chuyển từ đang chạy sang ngừng hoạt động"""
+        previous = self.router_status[router_id].get('vpn', {})
+        current = {}
+        
+        for interface in vpn.get('interfaces', []):
+            name = interface.get('name')
+            if not name or interface.get('disabled', False):
+                continue
+            
+            running = interface.get('running', False)
+            current[name] = running
+            
+            if previous.get(name) and not running:
+                alert_key = f"vpn_connection_failed_{router_id}_{name}"
+                if self._can_send_alert(alert_key, self._alert_cooldown("vpn_connection_failed")):
+                    router_name = self._get_router_name(router_id)
+                    logger.warning(f"Phát hiện kết nối VPN {name} thất bại trên {router_name}")
+                    self._send_vpn_connection_failed_alert(router_id, router_name, interface.get('type', 'unknown'),
+                                                           f"Interface {name} ngừng hoạt động")
+        
+        self.router_status[router_id]['vpn'] = current
+    
+    def _evaluate_wireless(self, router_id, wireless):
+        """Phát hiện interface wireless có tín hiệu trung bình của client dưới ngưỡng"""
+        threshold = self._alert_config("wireless_interference").get("signal_threshold", -80)
+        
+        signals = {}
+        for client in wireless.get('clients', []):
+            signal = client.get('signalStrength')
+            if signal:
+                signals.setdefault(client.get('interface', ''), []).append(signal)
+        
+        for interface_name, values in signals.items():
+            average_signal = sum(values) / len(values)
+            if average_signal >= threshold:
+                continue
+            
+            alert_key = f"wireless_interference_{router_id}_{interface_name}"
+            if self._can_send_alert(alert_key, self._alert_cooldown("wireless_interference")):
+                router_name = self._get_router_name(router_id)
+                logger.warning(f"Phát hiện tín hiệu wireless yếu trên {router_name} - {interface_name}: {average_signal:.0f} dBm")
+                self._send_wireless_interference_alert(router_id, router_name, interface_name, round(average_signal))
+    
+    def _check_bandwidth_usage(self, router_id, interfaces=None, timestamp=None):
+        """Kiểm tra băng thông các interface thông qua BandwidthMonitor (tính từ bộ đếm trong snapshot)"""
+        if not self._alert_enabled("high_bandwidth"):
+            return
+        
+        self._evaluate_bandwidth(router_id, bandwidth_monitor.get_router_bandwidth(router_id, interfaces, timestamp))
+    
+    def _evaluate_bandwidth(self, router_id, samples):
+        """Kiểm tra các interface vượt ngưỡng băng thông liên tục trong khoảng thời gian cấu hình"""
+        alert_config = self._alert_config("high_bandwidth")
+        threshold = alert_config.get("threshold", 80)
+        high_since = self.router_status[router_id].setdefault('high_bandwidth_since', {})
+        ratios = []
+        
+        for sample in samples:
+            name = sample['name']
+            max_speed = sample['max_speed']
+            usage = max(sample['rx_bits'], sample['tx_bits'])
+            
+            if max_speed and threshold:
+                ratios.append((usage / max_speed) * 100 / threshold)
+            
+            if not max_speed or (usage / max_speed) * 100 < threshold:
+                high_since.pop(name, None)
+                continue
+            
+            since = high_since.setdefault(name, datetime.now())
+            if (datetime.now() - since).total_seconds() < alert_config.get("duration", 0):
+                continue
+            
+            alert_key = f"high_bandwidth_{router_id}_{name}"
+            if self._can_send_alert(alert_key, self._alert_cooldown("high_bandwidth")):
+                router_name = self._get_router_name(router_id)
+                logger.warning(f"Phát hiện băng thông cao trên {router_name} - {name}")
+                self._send_high_bandwidth_alert(router_id, router_name, name, usage, max_speed)
+        
+        # Điều chỉnh chu kỳ kiểm tra theo interface gần ngưỡng nhất
+        if ratios:
+            self._adapt_poll_interval(router_id, "bandwidth", max(ratios))
+    
+    def _run_forecast(self):
+        """
+        Dự báo băng thông cho toàn bộ interface (một lượt tính vectơ) và cảnh báo
+        các interface dự kiến bão hòa trong khoảng horizon
+        """
+        if not self._alert_enabled("bandwidth_saturation"):
+            return
+        
+        bandwidth_forecaster.run(self._forecast_max_age())
+        horizon = self._alert_config("bandwidth_saturation").get("horizon", 1800)
+        
+        for forecast in bandwidth_forecaster.get_saturating(horizon):
+            # Interface đã bão hòa được cảnh báo bởi high_bandwidth
+            if forecast["time_to_saturation"] <= 0:
+                continue
             
-            if response.status_code == 200:
-                router = response.json()
-                return router.get('name', f'Router #{router_id}')
+            router_id, name = forecast["router_id"], forecast["interface"]
+            alert_key = f"bandwidth_saturation_{router_id}_{name}"
+            if self._can_send_alert(alert_key, self._alert_cooldown("bandwidth_saturation")):
+                router_name = self._get_router_name(router_id)
+                logger.warning(f"Dự báo {router_name} - {name} bão hòa sau ~{forecast['time_to_saturation'] / 60:.0f} phút")
+                self._send_bandwidth_saturation_alert(router_id, router_name, forecast)
+    
+    def _forecast_max_age(self):
+        """
+        Tuổi tối đa (giây) của mẫu băng thông gần nhất để interface còn được dự báo:
+        "max_age" của cảnh báo bandwidth_saturation, mặc định 2 lần chu kỳ kiểm tra băng thông dài nhất
+        """
+        configured = self._alert_config("bandwidth_saturation").get("max_age")
+        if configured:
+            return configured
+        
+        interval = self._check_intervals().get("bandwidth", self.config["check_interval"])
+        adaptive = self.config.get("adaptive_polling", {})
+        if adaptive.get("enabled", False):
+            interval = max(interval, adaptive.get("max_interval", 300))
+        return 2 * interval
+    
+    def _adapt_poll_interval(self, router_id, check, ratio):
+        """
+        Điều chỉnh chu kỳ kiểm tra của router theo tỉ lệ giá trị/ngưỡng (chế độ adaptive_polling):
+        - ratio >= 1 (đang trong khoảng vượt ngưỡng high_*_since): min_interval
+        - near_ratio <= ratio < 1: giảm tuyến tính từ chu kỳ cấu hình về min_interval
+        - ratio < far_ratio: tăng dần theo hệ số growth đến max_interval
+        - còn lại: chu kỳ cấu hình
+        Chu kỳ được làm tròn theo bội của chu kỳ nhỏ nhất, thay đổi được vòng lặp giám sát
+        áp dụng vào lịch ở lần lấy lịch kế tiếp.
+        """
+        adaptive = self.config.get("adaptive_polling", {})
+        if not adaptive.get("enabled", False):
+            return
+        
+        intervals = self._check_intervals()
+        base = intervals.get(check)
+        if base is None:
+            return
+        
+        # Làm tròn theo chu kỳ nhỏ nhất để vẫn trùng lịch (và dùng chung snapshot) với các bước kiểm tra khác
+        step = min(intervals.values())
+        
+        min_interval = min(adaptive.get("min_interval", 10), base)
+        max_interval = max(adaptive.get("max_interval", 300), base)
+        near_ratio = adaptive.get("near_ratio", 0.8)
+        far_ratio = adaptive.get("far_ratio", 0.5)
+        key = (router_id, check)
+        
+        with self.state_lock:
+            current = self.poll_intervals.get(key, base)
+            
+            if ratio >= 1:
+                interval = min_interval
+            elif ratio >= near_ratio:
+                interval = min_interval + (base - min_interval) * (1 - ratio) / (1 - near_ratio)
+            elif ratio < far_ratio:
+                interval = min(max_interval, max(current, base) * adaptive.get("growth", 1.5))
             else:
-                return f"Router #{router_id}"
-        except Exception:
-            return f"Router #{router_id}"
+                interval = base
+            
+            interval = max(step, round(interval / step) * step)
+            if interval == current:
+                return
+            
+            self.poll_intervals[key] = interval
+            self.interval_changes[key] = interval
+        
+        logger.debug(f"Chu kỳ kiểm tra {check} router #{router_id}: {current}s -> {interval}s (tỉ lệ ngưỡng {ratio:.2f})")
+    
+    def get_poll_intervals(self):
+        """Trả về các chu kỳ kiểm tra đã được điều chỉnh theo chế độ thích ứng: router_id -> {bước kiểm tra: giây}"""
+        intervals = {}
+        with self.state_lock:
+            for (router_id, check), interval in self.poll_intervals.items():
+                intervals.setdefault(router_id, {})[check] = interval
+        return intervals
+    
+    def _get_router_name(self, router_id):
+        """Lấy tên của router từ ID (tra trong cache, không gọi API trên mỗi bước kiểm tra)"""
+        return router_metadata.get_name(router_id)
+    
+    def _alert_config(self, alert_type):
+        """Trả về cấu hình của một loại cảnh báo (rỗng nếu chưa cấu hình)"""
+        return self.config["alerts"].get(alert_type, {})
+    
+    def _alert_enabled(self, alert_type):
+        """Kiểm tra loại cảnh báo có được bật không"""
+        return self._alert_config(alert_type).get("enabled", False)
+    
+    def _alert_cooldown(self, alert_type):
+        """Thời gian chờ giữa các cảnh báo cùng loại"""
+        return self._alert_config(alert_type).get("cooldown", self.config.get("alert_cooldown", 1800))
     
     def _can_send_alert(self, alert_key, cooldown_seconds):
         """Kiểm tra xem đã đủ thời gian để gửi lại cảnh báo chưa"""
         now = datetime.now()
         
-        if alert_key not in self.last_alerts:
-            self.last_alerts[alert_key] = now
-            return True
-        
-        last_time = self.last_alerts[alert_key]
-        elapsed = (now - last_time).total_seconds()
-        
-        if elapsed >= cooldown_seconds:
-            self.last_alerts[alert_key] = now
-            return True
-        
-        return False
+        with self.state_lock:
+            if alert_key not in self.last_alerts:
+                self.last_alerts[alert_key] = now
+                return True
+            
+            last_time = self.last_alerts[alert_key]
+            elapsed = (now - last_time).total_seconds()
+            
+            if elapsed >= cooldown_seconds:
+                self.last_alerts[alert_key] = now
+                return True
+            
+            return False
+    
+    def _notify(self, router_name, alert_type, details):
+        """Đưa cảnh báo vào hàng đợi của dịch vụ thông báo (không chặn vòng giám sát)"""
+        return send_alert(router_name, alert_type, None, details)
     
     def _send_connection_lost_alert(self, router_id, router_name):
         """Gửi cảnh báo mất kết nối"""
@@ -485,7 +1282,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "connection_lost", None, details)
+        self._notify(router_name, "connection_lost", details)
     
     def _send_high_cpu_alert(self, router_id, router_name, cpu_load):
         """Gửi cảnh báo CPU cao"""
@@ -496,7 +1293,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "high_cpu", None, details)
+        self._notify(router_name, "high_cpu", details)
     
     def _send_high_memory_alert(self, router_id, router_name, memory_percent):
         """Gửi cảnh báo Memory cao"""
@@ -507,7 +1304,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "high_memory", None, details)
+        self._notify(router_name, "high_memory", details)
     
     def _send_interface_down_alert(self, router_id, router_name, interface_name, interface_data):
         """Gửi cảnh báo interface ngừng hoạt động"""
@@ -519,7 +1316,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "interface_down", None, details)
+        self._notify(router_name, "interface_down", details)
     
     def _send_high_bandwidth_alert(self, router_id, router_name, interface_name, bandwidth_usage, max_bandwidth):
         """Gửi cảnh báo băng thông cao"""
@@ -534,7 +1331,22 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "high_bandwidth", None, details)
+        self._notify(router_name, "high_bandwidth", details)
+    
+    def _send_bandwidth_saturation_alert(self, router_id, router_name, forecast):
+        """Gửi cảnh báo dự báo bão hòa băng thông"""
+        details = {
+            "router_id": router_id,
+            "interface": forecast["interface"],
+            "time_to_saturation": f"~{max(1, round(forecast['time_to_saturation'] / 60))} phút",
+            "bandwidth_usage": f"{max(forecast['rx_ewma'], forecast['tx_ewma']) / 1000000:.1f} Mbps",
+            "maximum_bandwidth": f"{forecast['max_speed'] / 1000000:.1f} Mbps",
+            "usage_percent": f"{forecast['utilization'] * 100:.1f}%",
+            "trend": f"{max(forecast['rx_slope'], forecast['tx_slope']) * 60 / 1000000:+.2f} Mbps/phút",
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        self._notify(router_name, "bandwidth_saturation", details)
     
     def _send_firewall_change_alert(self, router_id, router_name, changes):
         """Gửi cảnh báo khi phát hiện thay đổi cấu hình firewall"""
@@ -544,7 +1356,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "firewall_change", None, details)
+        self._notify(router_name, "firewall_change", details)
     
     def _send_dhcp_server_down_alert(self, router_id, router_name, server_name):
         """Gửi cảnh báo khi DHCP server ngừng hoạt động"""
@@ -554,7 +1366,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "dhcp_server_down", None, details)
+        self._notify(router_name, "dhcp_server_down", details)
     
     def _send_vpn_connection_failed_alert(self, router_id, router_name, vpn_type, details_info):
         """Gửi cảnh báo khi kết nối VPN thất bại"""
@@ -565,7 +1377,7 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "vpn_connection_failed", None, details)
+        self._notify(router_name, "vpn_connection_failed", details)
     
     def _send_wireless_interference_alert(self, router_id, router_name, interface_name, signal_strength):
         """Gửi cảnh báo khi phát hiện nhiễu sóng wireless"""
@@ -577,19 +1389,26 @@ class AlertMonitor:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        send_alert(router_name, "wireless_interference", None, details)
+        self._notify(router_name, "wireless_interference", details)
 
 
 # Singleton instance
 alert_monitor = AlertMonitor()
 
+def get_monitor():
+    """Trả về monitor tương ứng với engine được cấu hình ("thread" hoặc "asyncio")"""
+    if alert_monitor.config.get("engine", "thread") == "asyncio":
+        from monitoring.async_alert_monitor import async_alert_monitor
+        return async_alert_monitor
+    return alert_monitor
+
 def start_monitoring():
     """Bắt đầu giám sát"""
-    alert_monitor.start()
+    get_monitor().start()
 
 def stop_monitoring():
     """Dừng giám sát"""
-    alert_monitor.stop()
+    get_monitor().stop()
 
 if __name__ == "__main__":
     # Tạo thư mục logs nếu chưa tồn tại
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Engine giám sát dựa trên asyncio cho AlertMonitor.
+Dùng một event loop và client HTTP không chặn (aiohttp) để kiểm tra hàng nghìn router
+đồng thời mà không cần một thread cho mỗi router.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from api_client import api_client
+from monitoring.alert_monitor import AlertMonitor
+from notifications import notification_service
+from monitoring.check_bandwidth_usage import bandwidth_monitor
+from monitoring.router_metadata import router_metadata
+from monitoring.router_snapshot import router_snapshots, build_snapshot, is_json_content_type
+from monitoring.routeros_collector import routeros_collector
+
+logger = logging.getLogger('alert_monitor')
+
+
+class AsyncAlertMonitor(AlertMonitor):
+    """
+    Chạy cùng các bước kiểm tra như AlertMonitor trên một event loop asyncio.
+    Phần đánh giá ngưỡng và gửi cảnh báo được kế thừa nguyên vẹn từ AlertMonitor,
+    chỉ phần gọi API được thay bằng aiohttp.
+    """
+    
+    def __init__(self):
+        """Khởi tạo monitor"""
+        super().__init__()
+        self.concurrency_setting = "max_concurrency"
+        self.loop = None
+        self.wakeup = None
+        self.session = None
+    
+    def start(self):
+        """Bắt đầu giám sát"""
+        if self.active:
+            logger.warning("Giám sát đã đang chạy")
+            return
+        
+        self.active = True
+        self.stop_event.clear()
+        self._start_metric_store()
+        self._start_prober()
+        self._start_subscriptions()
+        notification_service.start()
+        
+        # Thư viện routeros_api chỉ có API chặn: các lệnh chạy trong thread pool riêng cỡ routeros_workers
+        # (thread pool mặc định của event loop chỉ có min(32, số CPU + 4) thread)
+        if self.data_source is routeros_collector:
+            workers = max(1, self.config.get("routeros_workers", 64))
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="routeros-collector")
+            if workers < self.config.get("max_concurrency", 1000):
+                logger.info(f"Nguồn dữ liệu RouterOS: tối đa {workers} router được lấy snapshot đồng thời (routeros_workers)")
+        
+        # Event loop chạy trong thread riêng
+        self.monitor_thread = threading.Thread(target=self._run_event_loop)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+        
+        logger.info("Đã bắt đầu giám sát MikroTik (engine asyncio)")
+    
+    def stop(self):
+        """Dừng giám sát"""
+        if not self.active:
+            return
+        
+        self.active = False
+        self.stop_event.set()
+        
+        # Đánh thức event loop nếu đang chờ chu kỳ tiếp theo
+        if self.loop and self.wakeup:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        
+        if hasattr(self, 'monitor_thread') and self.monitor_thread.is_alive():
+            self.monitor_thread.join(timeout=5)
+        
+        self._stop_prober()
+        self._stop_subscriptions()
+        
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        
+        if self.data_source is routeros_collector:
+            routeros_collector.close_all()
+        
+        self._stop_metric_store()
+        self._drain_notifications()
+        logger.info("Đã dừng giám sát MikroTik (engine asyncio)")
+    
+    def _run_event_loop(self):
+        """Chạy vòng lặp giám sát trên event loop mới"""
+        asyncio.run(self._monitor_loop_async())
+    
+    async def _monitor_loop_async(self):
+        """Vòng lặp giám sát chính"""
+        logger.info("Vòng lặp giám sát (asyncio) đã bắt đầu")
+        
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        
+        max_concurrency = self.config.get("max_concurrency", 1000)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        connector = aiohttp.TCPConnector(limit=max_concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.config["connection_timeout"])
+        
+        self._reset_schedule()
+        next_refresh = 0
+        tasks = set()
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            self.session = session
+            
+            while self.active and not self.stop_event.is_set():
+                try:
+                    # Tải lại danh sách router và đồng bộ lịch sau mỗi check_interval. Khi không tải được
+                    # danh sách (lỗi API) giữ nguyên lịch, circuit breaker và đăng ký sự kiện hiện có
+                    if time.monotonic() >= next_refresh:
+                        routers = await self._api_get("/connections", "danh sách router")
+                        if routers is not None:
+                            router_metadata.update(routers)
+                            self._refresh_schedule(routers)
+                        await asyncio.get_running_loop().run_in_executor(None, self._run_forecast)
+                        next_refresh = time.monotonic() + self.config["check_interval"]
+                    
+                    for router, checks, due_at in self._pop_due_polls():
+                        task = asyncio.create_task(self._run_scheduled_poll_async(router, checks, due_at, semaphore))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    
+                    # Chờ đến bước kiểm tra đến hạn tiếp theo
+                    await self._sleep(self._time_until_next_due(next_refresh))
+                
+                except Exception as e:
+                    logger.error(f"Lỗi trong vòng lặp giám sát: {e}", exc_info=True)
+                    # Chờ 30 giây trước khi thử lại nếu có lỗi
+                    await self._sleep(30)
+            
+            # Hủy các lượt kiểm tra còn dang dở trước khi đóng session
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self.session = None
+    
+    async def _sleep(self, seconds):
+        """Chờ trong khoảng thời gian cho trước hoặc đến khi monitor bị dừng/được đánh thức"""
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        if self.active:
+            self.wakeup.clear()
+    
+    def _wake(self):
+        """Đánh thức vòng lặp giám sát từ thread khác (ví dụ thread của prober)"""
+        if self.loop and self.wakeup:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+    
+    async def _api_request(self, path, description, params=None, json_only=False):
+        """
+        Gọi API bất đồng bộ
+        
+        Args:
+            json_only (bool): Bỏ qua nội dung phản hồi có Content-Type không phải JSON
+        
+        Returns:
+            tuple: (mã HTTP hoặc None nếu lỗi kết nối, dữ liệu JSON hoặc None nếu phản hồi không phải JSON)
+        """
+        try:
+            async with self.session.get(api_client.url(path), params=params) as response:
+                if response.status != 200 or (json_only and not is_json_content_type(response.content_type)):
+                    return response.status, None
+                try:
+                    return response.status, await response.json(content_type=None)
+                except ValueError as e:
+                    logger.error(f"Phản hồi không phải JSON khi lấy thông tin {description}: {e}")
+                    return response.status, None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Lỗi khi lấy thông tin {description}: {e!r}")
+        return None, None
+    
+    async def _api_get(self, path, description, params=None):
+        """Gọi API bất đồng bộ, trả về dữ liệu JSON hoặc None nếu thất bại"""
+        status, data = await self._api_request(path, description, params)
+        if status is not None and status != 200:
+            logger.error(f"Lỗi khi lấy thông tin {description}: {status}")
+        return data
+    
+    async def _fetch_snapshot_async(self, router_id, sections):
+        """Lấy snapshot của router, tương đương RouterSnapshotFetcher.fetch"""
+        # Thư viện routeros_api chỉ có API chặn: chạy trong thread pool riêng (xem start)
+        if self.data_source is routeros_collector:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, routeros_collector.fetch,
+                                                                    router_id, sections)
+        
+        sections = router_snapshots.normalize_sections(sections)
+        snapshot = None
+        
+        if router_snapshots.snapshot_endpoint_supported is not False:
+            path, params = router_snapshots.combined_request(router_id, sections)
+            status, data = await self._api_request(path, f"snapshot router #{router_id}", params, json_only=True)
+            if status == 404:
+                router_snapshots.mark_combined_unsupported()
+            elif status == 200:
+                # None khi phản hồi không phải snapshot JSON (đã chuyển sang lấy từng phần)
+                snapshot = router_snapshots.parse_combined(router_id, sections, data)
+            else:
+                error = f"HTTP {status}" if status else "lỗi kết nối"
+                logger.error(f"Lỗi khi lấy snapshot router #{router_id}: {error}")
+                snapshot = build_snapshot(router_id, {}, {"snapshot": error})
+        
+        if snapshot is None:
+            data = {}
+            status = await self._api_get(router_snapshots.section_path("status", router_id), f"kết nối router #{router_id}")
+            if status is not None:
+                data["status"] = status
+            
+            # Các phần còn lại chỉ lấy khi router đang kết nối, đồng thời với nhau
+            if status and status.get("connected", False):
+                others = sections[1:]
+                results = await asyncio.gather(*(
+                    self._api_get(router_snapshots.section_path(section, router_id), f"{section} router #{router_id}")
+                    for section in others
+                ))
+                data.update({section: result for section, result in zip(others, results) if result is not None})
+            snapshot = build_snapshot(router_id, data)
+        
+        router_snapshots.store(snapshot)
+        return snapshot
+    
+    async def _run_scheduled_poll_async(self, router, checks, due_at, semaphore):
+        """Chạy các bước kiểm tra đến hạn của một router và cập nhật thống kê"""
+        ok = False
+        lag = 0.0
+        try:
+            async with semaphore:
+                lag = max(0.0, time.monotonic() - due_at)
+                ok = await self._poll_router_async(router, checks)
+        finally:
+            self._finish_poll(router.get('id'), ok, lag)
+    
+    async def _poll_router_async(self, router, checks):
+        """Chạy các bước kiểm tra cho một router, trả về False nếu có lỗi"""
+        router_id = router.get('id')
+        if not router_id:
+            return True
+        
+        try:
+            snapshot = await self._fetch_snapshot_async(router_id, self._snapshot_sections(checks))
+            self._evaluate_snapshot(router, snapshot)
+            
+            # Mất kết nối chưa được xác nhận: xếp lịch kiểm tra lại nhanh
+            self._request_connection_confirmation(router_id)
+            
+            # Kiểm tra băng thông, dùng lại danh sách interface trong snapshot
+            if "bandwidth" in checks and self._is_router_connected(router_id):
+                samples = await self._get_router_bandwidth_async(router_id, snapshot["sections"].get("interfaces"),
+                                                                 snapshot["timestamp"])
+                self._evaluate_bandwidth(router_id, samples)
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi kiểm tra router #{router_id}: {e}", exc_info=True)
+            return False
+    
+    async def _get_router_bandwidth_async(self, router_id, interfaces=None, timestamp=None):
+        """Lấy băng thông hiện tại của các interface, tương đương BandwidthMonitor.get_router_bandwidth"""
+        if interfaces is None:
+            interfaces = await self._api_get(f"/routers/{router_id}/interfaces", f"interfaces router #{router_id}") or []
+            timestamp = None
+        timestamp = time.time() if timestamp is None else timestamp
+        bandwidth_monitor.update_interface_speeds(router_id, interfaces)
+        
+        # Tốc độ tính từ bộ đếm, chỉ interface không có bộ đếm mới gọi /interface-traffic
+        monitored = bandwidth_monitor.get_monitored_interfaces(interfaces)
+        without_counters = [interface for interface in monitored if not bandwidth_monitor.has_counters(interface)]
+        traffic = await asyncio.gather(*(
+            self._api_get(f"/routers/{router_id}/interface-traffic", "băng thông", params={"interface": interface['name']})
+            for interface in without_counters
+        ))
+        fetched = {interface['name']: bandwidth_data for interface, bandwidth_data in zip(without_counters, traffic)}
+        
+        samples = []
+        for interface in monitored:
+            if interface['name'] in fetched:
+                bandwidth_data = fetched[interface['name']]
+            else:
+                bandwidth_data = bandwidth_monitor.compute_rate(router_id, interface, timestamp, interfaces)
+            if bandwidth_data:
+                samples.append(bandwidth_monitor.record_sample(router_id, interface, bandwidth_data, interfaces))
+        return samples
+    
+    def _get_router_name(self, router_id):
+        """Lấy tên router từ cache (nạp lại ở mỗi chu kỳ), không gọi API chặn event loop"""
+        return router_metadata.get_name(router_id, refresh=False)
+    
+    def _on_subscription_event(self, router_id, kind, data):
+        """Sự kiện đến từ thread của kết nối đăng ký: xử lý trên event loop như các lượt kiểm tra"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(super()._on_subscription_event, router_id, kind, data)
+
+
+# Singleton instance
+async_alert_monitor = AsyncAlertMonitor()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module dự báo băng thông cho toàn bộ interface.
+Mỗi lượt phân tích tính đồng thời (bằng NumPy, không lặp theo từng mẫu) cho mọi interface
+có trong lịch sử băng thông: độ dốc bình phương tối thiểu, trung bình trượt hàm mũ (EWMA)
+và thời gian dự kiến đến khi liên kết bão hòa. Kết quả được giữ lại để dashboard
+và AlertMonitor (cảnh báo bandwidth_saturation) truy vấn.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+import numpy as np
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.check_bandwidth_usage import bandwidth_monitor
+
+logger = logging.getLogger('bandwidth_forecast')
+
+
+def forecast_arrays(timestamps, rx, tx, counts, speeds, ewma_alpha=0.3, saturation_ratio=0.95):
+    """
+    Tính dự báo cho nhiều interface cùng lúc
+    
+    Args:
+        timestamps, rx, tx (ndarray): Mảng (số interface, số cột) theo thứ tự thời gian, mẫu gần nhất ở cột cuối
+        counts (ndarray): Số mẫu hợp lệ (ở cuối hàng) của mỗi interface
+        speeds (ndarray): Tốc độ tối đa (bits/second) của mỗi interface, NaN nếu không xác định
+        ewma_alpha (float): Hệ số làm mượt của EWMA
+        saturation_ratio (float): Tỉ lệ tốc độ tối đa được coi là bão hòa
+    
+    Returns:
+        dict: Các mảng rx_slope, tx_slope (bits/second mỗi giây), rx_ewma, tx_ewma (bits/second),
+        utilization (EWMA lớn hơn / tốc độ tối đa) và time_to_saturation (giây, inf nếu không có xu hướng bão hòa)
+    """
+    columns = timestamps.shape[1]
+    counts = counts.astype(np.float64)
+    valid = np.arange(columns) >= (columns - counts)[:, None]
+    weights = valid.astype(np.float64)
+    
+    # Thời gian tính từ mẫu gần nhất để tránh mất độ chính xác với epoch
+    elapsed = np.where(valid, timestamps - timestamps[:, -1:], 0.0)
+    mean_time = elapsed.sum(axis=1) / counts
+    deviation = (elapsed - mean_time[:, None]) * weights
+    variance = (deviation ** 2).sum(axis=1)
+    
+    # EWMA khởi tạo bằng mẫu đầu tiên: trọng số alpha * (1 - alpha)^k cho mẫu cách mẫu cuối k bước,
+    # mẫu đầu tiên nhận phần còn lại (1 - alpha)^(n - 1) nên tổng trọng số bằng 1
+    age = np.arange(columns - 1, -1, -1, dtype=np.float64)
+    ewma_weights = np.where(valid, ewma_alpha * (1 - ewma_alpha) ** age, 0.0)
+    first = (columns - counts).astype(np.int64)
+    ewma_weights[np.arange(len(first)), first] = (1 - ewma_alpha) ** (counts - 1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = {}
+        for direction, values in (("rx", rx), ("tx", tx)):
+            values = np.where(valid, values.astype(np.float64), 0.0)
+            mean_value = values.sum(axis=1) / counts
+            result[f"{direction}_slope"] = np.where(
+                variance > 0, (deviation * (values - mean_value[:, None])).sum(axis=1) / variance, 0.0)
+            result[f"{direction}_ewma"] = (ewma_weights * values).sum(axis=1)
+        
+        target = speeds * saturation_ratio
+        time_to_saturation = np.full(len(counts), np.inf)
+        for direction in ("rx", "tx"):
+            level = result[f"{direction}_ewma"]
+            slope = result[f"{direction}_slope"]
+            eta = np.where(level >= target, 0.0, np.where(slope > 0, (target - level) / slope, np.inf))
+            time_to_saturation = np.fmin(time_to_saturation, np.where(np.isnan(target), np.inf, eta))
+        
+        result["utilization"] = np.maximum(result["rx_ewma"], result["tx_ewma"]) / speeds
+        result["time_to_saturation"] = time_to_saturation
+    return result
+
+
+class BandwidthForecaster:
+    """
+    Chạy lượt dự báo trên lịch sử băng thông của BandwidthMonitor và giữ kết quả mới nhất
+    """
+    
+    def __init__(self, monitor=None, min_samples=5, ewma_alpha=0.3, saturation_percent=95, max_age=None):
+        """
+        Khởi tạo
+        
+        Args:
+            monitor (BandwidthMonitor): Nguồn lịch sử băng thông và tốc độ interface (mặc định monitor dùng chung)
+            min_samples (int): Số mẫu tối thiểu để dự báo một interface
+            ewma_alpha (float): Hệ số làm mượt của EWMA
+            saturation_percent (float): Phần trăm tốc độ tối đa được coi là bão hòa
+            max_age (float): Bỏ qua interface có mẫu gần nhất cũ hơn số giây này (None = không giới hạn)
+        """
+        self.monitor = monitor or bandwidth_monitor
+        self.min_samples = min_samples
+        self.ewma_alpha = ewma_alpha
+        self.saturation_percent = saturation_percent
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.forecasts = {}  # key interface -> kết quả dự báo
+        self.computed_at = None
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (cảnh báo "bandwidth_saturation" của alert_monitor_config.json)"""
+        self.min_samples = config.get("min_samples", self.min_samples)
+        self.ewma_alpha = config.get("ewma_alpha", self.ewma_alpha)
+        self.saturation_percent = config.get("saturation_percent", self.saturation_percent)
+        self.max_age = config.get("max_age", self.max_age)
+    
+    def run(self, max_age=None):
+        """
+        Dự báo cho mọi interface có đủ mẫu và mẫu gần nhất chưa quá max_age giây, lưu kết quả.
+        Thời gian đến khi bão hòa được tính từ thời điểm chạy, không phải từ mẫu gần nhất.
+        
+        Args:
+            max_age (float): Tuổi tối đa của mẫu gần nhất (mặc định self.max_age)
+        
+        Returns:
+            dict: key interface ("<router_id>_<tên interface>") -> kết quả dự báo
+        """
+        started = time.perf_counter()
+        max_age = self.max_age if max_age is None else max_age
+        computed_at = time.time()
+        keys, timestamps, rx, tx, counts = self.monitor.bandwidth_history.chronological(max(2, self.min_samples))
+        
+        # Interface không còn mẫu mới (interface down, router bị gỡ) không được dự báo tiếp
+        if keys and max_age is not None:
+            fresh = computed_at - timestamps[:, -1] <= max_age
+            if not fresh.all():
+                keys = [key for key, keep in zip(keys, fresh.tolist()) if keep]
+                timestamps, rx, tx, counts = timestamps[fresh], rx[fresh], tx[fresh], counts[fresh]
+        
+        if not keys:
+            with self.lock:
+                self.forecasts, self.computed_at = {}, computed_at
+            return {}
+        
+        speeds = np.array([speed or np.nan for speed in self.monitor.get_max_speeds(keys)], dtype=np.float64)
+        arrays = forecast_arrays(timestamps, rx, tx, counts, speeds, self.ewma_alpha, self.saturation_percent / 100)
+        
+        columns = {name: values.tolist() for name, values in arrays.items()}
+        forecasts = {}
+        for index, key in enumerate(keys):
+            router_id, _, interface_name = key.partition('_')
+            last_sample = float(timestamps[index, -1])
+            # Dự báo tính từ mẫu gần nhất: trừ thời gian đã trôi qua đến lúc chạy
+            eta = max(0.0, columns["time_to_saturation"][index] - (computed_at - last_sample))
+            utilization = columns["utilization"][index]
+            forecasts[key] = {
+                "router_id": int(router_id) if router_id.isdigit() else router_id,
+                "interface": interface_name,
+                "samples": int(counts[index]),
+                "max_speed": None if np.isnan(speeds[index]) else float(speeds[index]),
+                "rx_slope": columns["rx_slope"][index],
+                "tx_slope": columns["tx_slope"][index],
+                "rx_ewma": columns["rx_ewma"][index],
+                "tx_ewma": columns["tx_ewma"][index],
+                "utilization": None if np.isnan(utilization) else utilization,
+                "time_to_saturation": None if np.isinf(eta) else eta,
+                "last_sample": last_sample,
+                "computed_at": computed_at
+            }
+        
+        with self.lock:
+            self.forecasts, self.computed_at = forecasts, computed_at
+        logger.debug(f"Đã dự báo băng thông cho {len(keys)} interface trong {time.perf_counter() - started:.3f}s")
+        return forecasts
+    
+    def get_forecast(self, router_id, interface_name):
+        """Kết quả dự báo của một interface, None nếu chưa có"""
+        with self.lock:
+            return self.forecasts.get(f"{router_id}_{interface_name}")
+    
+    def get_forecasts(self, router_id=None):
+        """Kết quả dự báo của tất cả interface hoặc của một router"""
+        with self.lock:
+            forecasts = list(self.forecasts.values())
+        if router_id is not None:
+            forecasts = [forecast for forecast in forecasts if str(forecast["router_id"]) == str(router_id)]
+        return forecasts
+    
+    def get_saturating(self, horizon):
+        """
+        Các interface dự kiến bão hòa trong khoảng horizon giây (kể cả interface đã bão hòa),
+        sắp xếp theo thời gian đến khi bão hòa
+        """
+        forecasts = [
+            forecast for forecast in self.get_forecasts()
+            if forecast["time_to_saturation"] is not None and forecast["time_to_saturation"] <= horizon
+        ]
+        return sorted(forecasts, key=lambda forecast: forecast["time_to_saturation"])
+
+
+# Singleton instance
+bandwidth_forecaster = BandwidthForecaster()
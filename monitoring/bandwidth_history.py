@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module lưu lịch sử băng thông của các interface trong bộ đệm vòng có kích thước cố định.
+Dữ liệu của mọi interface nằm trong các mảng NumPy dùng chung (structure-of-arrays,
+mỗi interface một hàng): thời điểm (epoch giây), tốc độ rx và tx (bits/second).
+Thêm mẫu là O(1) và các cửa sổ mẫu gần nhất là view của mảng (không sao chép).
+"""
+
+import threading
+
+import numpy as np
+
+
+class BandwidthHistory:
+    """
+    Bộ đệm vòng theo interface. Mỗi hàng có 2 * capacity ô, mẫu được ghi vào cả vị trí i
+    và i + capacity nên capacity mẫu gần nhất luôn nằm liền nhau trong hàng và có thể
+    trả về dưới dạng view.
+    """
+    
+    def __init__(self, capacity=60, initial_rows=1024):
+        """
+        Khởi tạo
+        
+        Args:
+            capacity (int): Số mẫu giữ lại cho mỗi interface
+            initial_rows (int): Số interface được cấp phát trước (mảng tự mở rộng khi cần)
+        """
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.index = {}  # key của interface -> số hàng
+        self.free_rows = []  # Các hàng của interface đã bị bỏ, dùng lại cho interface mới
+        self._allocate(initial_rows)
+    
+    def _allocate(self, rows):
+        """Cấp phát (hoặc mở rộng) các mảng cho rows interface, giữ nguyên dữ liệu đã có"""
+        width = 2 * self.capacity
+        timestamps = np.zeros((rows, width), dtype=np.float64)
+        rx = np.zeros((rows, width), dtype=np.float32)
+        tx = np.zeros((rows, width), dtype=np.float32)
+        heads = np.zeros(rows, dtype=np.int64)  # Vị trí ghi kế tiếp trong [0, capacity)
+        counts = np.zeros(rows, dtype=np.int64)  # Số mẫu đang có (tối đa capacity)
+        
+        used = len(getattr(self, 'heads', ()))
+        if used:
+            timestamps[:used] = self.timestamps
+            rx[:used] = self.rx
+            tx[:used] = self.tx
+            heads[:used] = self.heads
+            counts[:used] = self.counts
+        
+        self.timestamps, self.rx, self.tx, self.heads, self.counts = timestamps, rx, tx, heads, counts
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def keys(self):
+        """Danh sách key của các interface có lịch sử"""
+        with self.lock:
+            return list(self.index)
+    
+    def append(self, key, timestamp, rx_bits, tx_bits):
+        """Thêm một mẫu (timestamp là epoch giây), mẫu cũ nhất bị ghi đè khi đã đủ capacity mẫu"""
+        with self.lock:
+            row = self.index.get(key)
+            if row is None:
+                row = self._new_row(key)
+            
+            head = self.heads[row]
+            for position in (head, head + self.capacity):
+                self.timestamps[row, position] = timestamp
+                self.rx[row, position] = rx_bits
+                self.tx[row, position] = tx_bits
+            
+            self.heads[row] = (head + 1) % self.capacity
+            if self.counts[row] < self.capacity:
+                self.counts[row] += 1
+    
+    def _new_row(self, key):
+        """Cấp một hàng cho interface mới"""
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = len(self.index)
+            if row >= len(self.heads):
+                self._allocate(max(1, 2 * len(self.heads)))
+        
+        self.heads[row] = 0
+        self.counts[row] = 0
+        self.index[key] = row
+        return row
+    
+    def remove(self, key):
+        """Bỏ lịch sử của interface"""
+        with self.lock:
+            row = self.index.pop(key, None)
+            if row is not None:
+                self.counts[row] = 0
+                self.free_rows.append(row)
+    
+    def count(self, key):
+        """Số mẫu đang có của interface"""
+        row = self.index.get(key)
+        return 0 if row is None else int(self.counts[row])
+    
+    def last_timestamp(self, key):
+        """Thời điểm của mẫu gần nhất, None nếu chưa có mẫu"""
+        with self.lock:
+            row = self.index.get(key)
+            if row is None or not self.counts[row]:
+                return None
+            return float(self.timestamps[row, self.heads[row] + self.capacity - 1])
+    
+    def window(self, key, size=None):
+        """
+        Các mẫu gần nhất của interface, theo thứ tự thời gian
+        
+        Args:
+            size (int): Số mẫu (mặc định tất cả mẫu đang có)
+        
+        Returns:
+            tuple: (timestamps, rx, tx) là view chỉ đọc của mảng (không sao chép), rỗng nếu chưa có mẫu
+        """
+        with self.lock:
+            row = self.index.get(key)
+            count = 0 if row is None else int(self.counts[row])
+            size = count if size is None else min(size, count)
+            if not size:
+                return np.empty(0), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+            
+            end = int(self.heads[row]) + self.capacity
+            views = tuple(array[row, end - size:end] for array in (self.timestamps, self.rx, self.tx))
+        
+        for view in views:
+            view.flags.writeable = False
+        return views
+    
+    def chronological(self, min_count=1):
+        """
+        Bản sao theo thứ tự thời gian của tất cả interface có ít nhất min_count mẫu, dùng cho
+        các phép tính vectơ trên toàn bộ interface. Mỗi hàng có capacity cột, mẫu gần nhất
+        ở cột cuối, các cột trước mẫu đầu tiên (khi chưa đủ capacity mẫu) không có giá trị.
+        
+        Returns:
+            tuple: (danh sách key, timestamps, rx, tx, counts); các mảng 2 chiều có dạng (số interface, capacity)
+        """
+        with self.lock:
+            keys = [key for key, row in self.index.items() if self.counts[row] >= min_count]
+            rows = np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+            columns = self.heads[rows, None] + np.arange(self.capacity)
+            timestamps = self.timestamps[rows[:, None], columns]
+            rx = self.rx[rows[:, None], columns]
+            tx = self.tx[rows[:, None], columns]
+            counts = self.counts[rows].copy()
+        return keys, timestamps, rx, tx, counts
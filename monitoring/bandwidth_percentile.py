@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module tính phân vị băng thông (ví dụ p95 cho tính cước burstable) theo kiểu streaming.
+Mỗi interface và mỗi chiều (rx/tx) có một sketch cho mỗi cửa sổ ngày và tháng. Sketch chia
+giá trị vào các bucket theo thang logarit (sai số tương đối cố định, kiểu DDSketch) với số bucket
+tối đa cố định nên bộ nhớ không tăng theo số mẫu, và các sketch gộp được với nhau (cộng bucket)
+để tính phân vị của một router/site hoặc toàn bộ hệ thống mà không cần lưu từng mẫu.
+"""
+
+import math
+import time
+import threading
+
+import numpy as np
+
+# Sai số tương đối của giá trị phân vị và số bucket tối đa của mỗi sketch. Với sai số 2%, 2048 bucket
+# bao được mọi tốc độ từ 1 bps trở lên (1 bps..100 Gbps chỉ cần khoảng 640 bucket) nên trên thực tế
+# không bucket nào bị gộp; bộ nhớ chỉ cấp phát cho khoảng giá trị đã gặp
+RELATIVE_ACCURACY = 0.02
+MAX_BINS = 2048
+# Giá trị nhỏ hơn (bits/second) được tính là 0
+MIN_VALUE = 1.0
+
+# Định dạng nhãn kỳ của các cửa sổ (theo giờ địa phương)
+WINDOWS = {"daily": "%Y-%m-%d", "monthly": "%Y-%m"}
+
+
+class QuantileSketch:
+    """
+    Sketch phân vị với sai số tương đối cố định. Bucket thứ k chứa các giá trị trong
+    (gamma^(k-1), gamma^k]; mảng bucket trải từ bucket thấp nhất đến cao nhất đã gặp, tối đa
+    max_bins bucket liền nhau cao nhất, các bucket thấp hơn được gộp vào bucket thấp nhất
+    nên các phân vị cao (p95, p99) luôn giữ được độ chính xác.
+    """
+    
+    __slots__ = ("gamma", "log_gamma", "max_bins", "offset", "bins", "zero_count", "count", "sum", "min", "max")
+    
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_bins=MAX_BINS):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.offset = 0  # Chỉ số bucket của bins[0]
+        self.bins = None  # Cấp phát khi có giá trị khác 0 đầu tiên
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, value):
+        """Thêm một giá trị"""
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        
+        if value < MIN_VALUE:
+            self.zero_count += 1
+            return
+        
+        key = math.ceil(math.log(value) / self.log_gamma)
+        if self.bins is not None and self.offset <= key < self.offset + len(self.bins):
+            self.bins[key - self.offset] += 1
+        else:
+            self._store(*self._merge_keys(np.array([key]), np.array([1])))
+    
+    def merge(self, other):
+        """Gộp sketch khác (cùng sai số tương đối) vào sketch này"""
+        if other.gamma != self.gamma:
+            raise ValueError("Không thể gộp các sketch có sai số tương đối khác nhau")
+        
+        self.count += other.count
+        self.sum += other.sum
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.bins is not None:
+            self._store(*self._merge_keys(*other._nonzero()))
+        return self
+    
+    def quantile(self, q):
+        """
+        Giá trị tại phân vị q (0..1), None nếu chưa có giá trị
+        """
+        if not self.count:
+            return None
+        
+        rank = q * (self.count - 1)
+        if rank < self.zero_count or self.bins is None:
+            return max(self.min, 0.0)
+        
+        cumulative = np.cumsum(self.bins)
+        index = int(np.searchsorted(cumulative, rank - self.zero_count, side='right'))
+        index = min(index, len(self.bins) - 1)
+        # Giá trị đại diện của bucket: sai số tương đối không quá RELATIVE_ACCURACY
+        value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+    
+    def to_dict(self):
+        """Dạng dict (lưu trữ hoặc gộp giữa các tiến trình)"""
+        keys, counts = self._nonzero() if self.bins is not None else ((), ())
+        return {
+            "relative_accuracy": (self.gamma - 1) / (self.gamma + 1),
+            "max_bins": self.max_bins,
+            "bins": {str(int(key)): int(count) for key, count in zip(keys, counts)},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Tạo sketch từ dạng dict của to_dict()"""
+        sketch = cls(data.get("relative_accuracy", RELATIVE_ACCURACY), data.get("max_bins", MAX_BINS))
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        if data.get("bins"):
+            keys = np.array([int(key) for key in data["bins"]])
+            counts = np.array(list(data["bins"].values()))
+            sketch._store(*sketch._merge_keys(keys, counts))
+        return sketch
+    
+    def _nonzero(self):
+        """Chỉ số và số đếm của các bucket khác 0"""
+        positions = np.flatnonzero(self.bins)
+        return positions + self.offset, self.bins[positions]
+    
+    def _merge_keys(self, keys, counts):
+        """Gộp các bucket hiện có với (keys, counts)"""
+        if self.bins is None:
+            return keys, counts
+        own_keys, own_counts = self._nonzero()
+        return np.concatenate((own_keys, keys)), np.concatenate((own_counts, counts))
+    
+    def _store(self, keys, counts):
+        """Ghi lại các bucket, gộp các bucket nằm dưới khoảng max_bins bucket cao nhất"""
+        highest = int(keys.max())
+        offset = max(int(keys.min()), highest - self.max_bins + 1)
+        bins = np.zeros(highest - offset + 1, dtype=np.uint32)
+        np.add.at(bins, np.maximum(keys, offset) - offset, counts)
+        self.offset, self.bins = offset, bins
+
+
+class BandwidthPercentiles:
+    """
+    Sketch phân vị rx/tx của các interface theo cửa sổ ngày và tháng.
+    Mỗi cửa sổ giữ kỳ hiện tại và retain - 1 kỳ trước (ví dụ tháng trước để tính cước).
+    """
+    
+    def __init__(self, retain=2, relative_accuracy=RELATIVE_ACCURACY, max_bins=MAX_BINS):
+        """
+        Khởi tạo
+        
+        Args:
+            retain (int): Số kỳ giữ lại cho mỗi cửa sổ
+            relative_accuracy (float): Sai số tương đối của giá trị phân vị
+            max_bins (int): Số bucket tối đa của mỗi sketch
+        """
+        self.retain = retain
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.lock = threading.Lock()
+        # key interface -> cửa sổ -> nhãn kỳ -> {"rx": QuantileSketch, "tx": QuantileSketch}
+        self.sketches = {}
+    
+    def add(self, key, timestamp, rx_bits, tx_bits):
+        """Thêm một mẫu tốc độ (bits/second) của interface, timestamp là epoch giây"""
+        local_time = time.localtime(timestamp)
+        with self.lock:
+            windows = self.sketches.setdefault(key, {window: {} for window in WINDOWS})
+            for window, label_format in WINDOWS.items():
+                periods = windows[window]
+                label = time.strftime(label_format, local_time)
+                sketches = periods.get(label)
+                if sketches is None:
+                    sketches = periods[label] = {
+                        direction: QuantileSketch(self.relative_accuracy, self.max_bins) for direction in ("rx", "tx")
+                    }
+                    # Bỏ các kỳ cũ (nhãn kỳ sắp xếp được theo thời gian)
+                    for old_label in sorted(periods)[:-self.retain]:
+                        del periods[old_label]
+                sketches["rx"].add(rx_bits)
+                sketches["tx"].add(tx_bits)
+    
+    def remove(self, key):
+        """Bỏ sketch của interface"""
+        with self.lock:
+            self.sketches.pop(key, None)
+    
+    def periods(self, key, window="monthly"):
+        """Các kỳ đang có của interface trong cửa sổ, theo thứ tự thời gian"""
+        with self.lock:
+            return sorted(self.sketches.get(key, {}).get(window, {}))
+    
+    def merged(self, keys, window="monthly", period=None):
+        """
+        Gộp sketch của nhiều interface trong một kỳ
+        
+        Args:
+            keys (iterable): Key của các interface ("<router_id>_<tên interface>")
+            window (str): "daily" hoặc "monthly"
+            period (str): Nhãn kỳ (mặc định kỳ hiện tại)
+        
+        Returns:
+            dict: {"rx": QuantileSketch, "tx": QuantileSketch}
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"Cửa sổ không hợp lệ: {window}")
+        period = period or time.strftime(WINDOWS[window])
+        result = {direction: QuantileSketch(self.relative_accuracy, self.max_bins) for direction in ("rx", "tx")}
+        
+        with self.lock:
+            for key in keys:
+                sketches = self.sketches.get(key, {}).get(window, {}).get(period)
+                if sketches:
+                    for direction in ("rx", "tx"):
+                        result[direction].merge(sketches[direction])
+        return result
+    
+    def percentile(self, keys, quantile=0.95, window="monthly", period=None):
+        """
+        Phân vị tốc độ rx/tx của một hoặc nhiều interface (gộp sketch) trong một kỳ
+        
+        Returns:
+            dict: {rx, tx (bits/second, None nếu chưa có mẫu), samples, window, period, quantile}
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        period = period or time.strftime(WINDOWS.get(window, "%Y-%m"))
+        sketches = self.merged(keys, window, period)
+        return {
+            "rx": sketches["rx"].quantile(quantile),
+            "tx": sketches["tx"].quantile(quantile),
+            "samples": sketches["rx"].count,
+            "window": window,
+            "period": period,
+            "quantile": quantile
+        }
+    
+    def router_keys(self, router_id=None):
+        """Key của các interface thuộc router (tất cả interface nếu router_id là None)"""
+        with self.lock:
+            keys = list(self.sketches)
+        if router_id is None:
+            return keys
+        prefix = f"{router_id}_"
+        return [key for key in keys if key.startswith(prefix)]
@@ -12,13 +12,19 @@ import sys
 import time
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
-import requests
 import math
 
 # Thêm thư mục gốc vào đường dẫn để import các module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from api_client import api_client, ApiClient
+from monitoring.router_metadata import router_metadata, RouterMetadataCache
+from monitoring.router_snapshot import router_snapshots, RouterSnapshotFetcher
+from monitoring.circuit_breaker import router_breakers
+from monitoring.bandwidth_history import BandwidthHistory
+from monitoring.bandwidth_percentile import BandwidthPercentiles
 from notifications import send_alert
 
 # Cấu hình logging
@@ -32,35 +38,82 @@ logging.basicConfig(
 )
 logger = logging.getLogger('bandwidth_monitor')
 
+# Giới hạn của bộ đếm 32 bit (một số interface/phiên bản RouterOS cũ chỉ có bộ đếm 32 bit,
+# RouterOS hiện tại trả về bộ đếm 64 bit)
+COUNTER32_LIMIT = 2 ** 32
+
+# Mức tăng sau khi tràn bộ đếm không được vượt quá tốc độ tối đa của interface nhân hệ số này
+COUNTER_WRAP_TOLERANCE = 1.5
+
+
+def counter_delta(previous, current, max_delta=None, counter32=False):
+    """
+    Mức tăng của bộ đếm tích lũy giữa hai lần đọc.
+    Khi bộ đếm giảm: coi là bộ đếm bị reset (router khởi động lại, reset-counters) và trả về None.
+    Chỉ với interface đã biết có bộ đếm 32 bit (counter32), bộ đếm giảm được coi là tràn nếu giá trị
+    trước nằm trong khoảng 32 bit và mức tăng sau khi tràn không vượt max_delta (khi biết max_delta).
+    """
+    if current >= previous:
+        return current - previous
+    if counter32 and previous < COUNTER32_LIMIT:
+        delta = COUNTER32_LIMIT - previous + current
+        if max_delta is None or delta <= max_delta:
+            return delta
+    return None
+
+
 class BandwidthMonitor:
     """
     Theo dõi và phân tích băng thông mạng trên thiết bị MikroTik.
     """
     
-    def __init__(self, api_base_url="http://localhost:3000/api"):
-        """Khởi tạo monitor"""
-        self.api_base_url = api_base_url
-        self.bandwidth_history = {}  # Lưu lịch sử dữ liệu băng thông
-        self.interface_info = {}     # Lưu thông tin về các interface
+    def __init__(self, api_base_url=None):
+        """Khởi tạo monitor (mặc định dùng client API dùng chung)"""
+        self.client = ApiClient(base_url=api_base_url) if api_base_url else api_client
+        self.api_base_url = self.client.base_url
+        self.router_metadata = RouterMetadataCache(client=self.client) if api_base_url else router_metadata
+        self.snapshots = RouterSnapshotFetcher(client=self.client) if api_base_url else router_snapshots
+        self.breakers = router_breakers
+        self.bandwidth_history = BandwidthHistory(capacity=60)  # Lịch sử băng thông (giữ 60 mẫu gần nhất mỗi interface)
+        self.percentiles = BandwidthPercentiles()  # Sketch phân vị rx/tx theo ngày/tháng của mỗi interface
+        self.metric_store = None     # MetricStore lưu lịch sử rx/tx (AlertMonitor gán khi bật "metric_store")
+        self.counters = {}           # Lần đọc bộ đếm rxBytes/txBytes gần nhất và tốc độ tính được của mỗi interface
+        self.interface_info = {}     # Tốc độ tối đa của interface (kể cả kết quả không xác định) kèm thuộc tính dùng để tính
         self.alert_history = {}      # Lưu lịch sử cảnh báo
+        self.counter32_interfaces = set()  # Tên interface hoặc "<router_id>_<interface>" chỉ có bộ đếm 32 bit
+        # Bảo vệ counters và interface_info, được ghi từ các worker kiểm tra, thread đăng ký và prober
+        self.lock = threading.Lock()
         
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (cảnh báo "high_bandwidth" của alert_monitor_config.json)"""
+        self.counter32_interfaces = set(config.get("counter32_interfaces", self.counter32_interfaces))
+    
+    def forget(self, router_ids):
+        """
+        Bỏ bộ đếm, tốc độ interface, lịch sử băng thông và sketch phân vị của các router
+        không còn trong danh sách
+        """
+        current = {str(router_id) for router_id in router_ids}
+        with self.lock:
+            for cache in (self.counters, self.interface_info):
+                for key in [key for key in cache if key.partition('_')[0] not in current]:
+                    del cache[key]
+        for key in self.bandwidth_history.keys():
+            if key.partition('_')[0] not in current:
+                self.bandwidth_history.remove(key)
+        for key in self.percentiles.router_keys():
+            if key.partition('_')[0] not in current:
+                self.percentiles.remove(key)
+    
     def get_router_connections(self):
-        """Lấy danh sách các kết nối router từ API"""
-        try:
-            response = requests.get(f"{self.api_base_url}/connections", timeout=10)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Lỗi khi lấy danh sách router: HTTP {response.status_code}")
-                return []
-        except Exception as e:
-            logger.error(f"Lỗi khi lấy danh sách router: {e}")
-            return []
+        """Lấy danh sách các kết nối router từ API (đồng thời nạp lại cache thông tin router)"""
+        routers = self.router_metadata.refresh()
+        return routers if routers is not None else []
     
     def get_router_interfaces(self, router_id):
         """Lấy danh sách interfaces của router từ API"""
         try:
-            response = requests.get(f"{self.api_base_url}/routers/{router_id}/interfaces", timeout=10)
+            response = self.client.get(f"/routers/{router_id}/interfaces")
             if response.status_code == 200:
                 return response.json()
             else:
@@ -71,24 +124,16 @@ class BandwidthMonitor:
             return []
     
     def get_router_name(self, router_id):
-        """Lấy tên router từ API"""
-        try:
-            response = requests.get(f"{self.api_base_url}/connections/{router_id}", timeout=10)
-            if response.status_code == 200:
-                router = response.json()
-                return router.get('name', f'Router #{router_id}')
-            else:
-                return f"Router #{router_id}"
-        except Exception:
-            return f"Router #{router_id}"
+        """Lấy tên router từ cache thông tin router"""
+        return self.router_metadata.get_name(router_id)
     
     def get_interface_bandwidth(self, router_id, interface_name):
         """Lấy thông tin băng thông hiện tại của interface từ API"""
         try:
             # Đường dẫn API có thể cần điều chỉnh tùy thuộc vào cấu trúc API thực tế
-            response = requests.get(
-                f"{self.api_base_url}/routers/{router_id}/interface-traffic?interface={interface_name}",
-                timeout=10
+            response = self.client.get(
+                f"/routers/{router_id}/interface-traffic",
+                params={"interface": interface_name}
             )
             if response.status_code == 200:
                 return response.json()
@@ -99,42 +144,85 @@ class BandwidthMonitor:
             logger.error(f"Lỗi khi lấy thông tin băng thông: {e}")
             return None
     
-    def get_interface_speed(self, router_id, interface_name):
+    def get_interface_speed(self, router_id, interface_name, interfaces=None):
         """
         Lấy tốc độ tối đa của interface (nếu có).
         Trả về tốc độ theo bits/second hoặc None nếu không xác định được.
+        
+        Nếu đã có sẵn danh sách interfaces của router thì truyền vào để tránh gọi lại API.
+        Khi chưa có trong cache, tốc độ của mọi interface trên router được tính từ một lần lấy danh sách;
+        interface không xác định được tốc độ cũng được lưu để không tìm lại ở mỗi chu kỳ.
         """
-        # Nếu đã có thông tin về interface này, lấy từ cache
         interface_key = f"{router_id}_{interface_name}"
-        if interface_key in self.interface_info and 'max_speed' in self.interface_info[interface_key]:
-            return self.interface_info[interface_key]['max_speed']
+        with self.lock:
+            info = self.interface_info.get(interface_key)
+        if info is not None:
+            return info['max_speed']
         
+        # Gọi API ngoài lock
         try:
-            # Lấy danh sách interfaces để tìm thông tin về interface cụ thể
-            interfaces = self.get_router_interfaces(router_id)
-            for interface in interfaces:
-                if interface.get('name') == interface_name:
-                    # Lấy tốc độ từ thuộc tính 'speed', 'max-speed' hoặc từ loại interface
-                    speed = None
-                    if 'speed' in interface:
-                        speed = self._parse_speed(interface['speed'])
-                    elif 'max-speed' in interface:
-                        speed = self._parse_speed(interface['max-speed'])
-                    elif 'type' in interface:
-                        # Ước tính tốc độ dựa trên loại interface
-                        speed = self._estimate_speed_from_type(interface['type'])
-                    
-                    # Lưu vào cache
-                    if interface_key not in self.interface_info:
-                        self.interface_info[interface_key] = {}
-                    self.interface_info[interface_key]['max_speed'] = speed
-                    return speed
-            
-            logger.warning(f"Không tìm thấy thông tin cho interface {interface_name} trên router {router_id}")
-            return None
+            if interfaces is None:
+                interfaces = self.get_router_interfaces(router_id)
+            self.update_interface_speeds(router_id, interfaces)
         except Exception as e:
             logger.error(f"Lỗi khi lấy tốc độ interface: {e}")
             return None
+        
+        with self.lock:
+            info = self.interface_info.get(interface_key)
+            if info is None:
+                logger.warning(f"Không tìm thấy thông tin cho interface {interface_name} trên router {router_id}")
+                info = self.interface_info[interface_key] = {'max_speed': None, 'fingerprint': None}
+        return info['max_speed']
+    
+    def get_max_speeds(self, interface_keys):
+        """Tốc độ tối đa đã cache của các interface (None nếu chưa có hoặc không xác định)"""
+        with self.lock:
+            return [self.interface_info.get(key, {}).get('max_speed') for key in interface_keys]
+    
+    def update_interface_speeds(self, router_id, interfaces):
+        """
+        Cập nhật cache tốc độ tối đa từ danh sách interface của router. Chỉ tính lại interface
+        mới hoặc có loại, trạng thái liên kết hay thuộc tính tốc độ thay đổi so với lần trước.
+        """
+        for interface in interfaces:
+            interface_name = interface.get('name')
+            if not interface_name:
+                continue
+            
+            interface_key = f"{router_id}_{interface_name}"
+            fingerprint = self._speed_fingerprint(interface)
+            with self.lock:
+                cached = self.interface_info.get(interface_key)
+            if cached is not None and cached['fingerprint'] == fingerprint:
+                continue
+            
+            info = {'max_speed': self._resolve_speed(interface), 'fingerprint': fingerprint}
+            with self.lock:
+                self.interface_info[interface_key] = info
+    
+    def _speed_fingerprint(self, interface):
+        """Các thuộc tính quyết định tốc độ tối đa của interface, cache bị bỏ khi một trong số đó thay đổi"""
+        return (
+            interface.get('type'),
+            interface.get('running'),
+            interface.get('rate'),
+            interface.get('speed'),
+            interface.get('max-speed')
+        )
+    
+    def _resolve_speed(self, interface):
+        """
+        Tốc độ tối đa của interface: tốc độ đàm phán thực tế ('rate'), tốc độ cấu hình ('speed',
+        'max-speed'), cuối cùng mới ước tính theo loại interface
+        """
+        for field in ('rate', 'speed', 'max-speed'):
+            speed = self._parse_speed(interface.get(field))
+            if speed:
+                return speed
+        if interface.get('type'):
+            return self._estimate_speed_from_type(interface['type'])
+        return None
     
     def _parse_speed(self, speed_str):
         """
@@ -145,8 +233,10 @@ class BandwidthMonitor:
             return None
         
         try:
-            # Xử lý các định dạng có thể có
+            # Xử lý các định dạng có thể có (bỏ hậu tố duplex của RouterOS, ví dụ '1Gbps-full')
             speed_str = str(speed_str).lower().strip()
+            for suffix in ('-full', '-half'):
+                speed_str = speed_str.replace(suffix, '')
             
             if 'gbps' in speed_str or 'gb/s' in speed_str:
                 num = float(speed_str.replace('gbps', '').replace('gb/s', ''))
@@ -213,51 +303,28 @@ class BandwidthMonitor:
                     if not router_id:
                         continue
                     
+                    # Router không kết nối được nhiều lần liên tiếp: chờ đến lần thăm dò kế tiếp
+                    if not self.breakers.allow_request(router_id):
+                        continue
+                    
+                    # Dùng snapshot của chu kỳ hiện tại (dùng chung với AlertMonitor nếu còn mới)
+                    snapshot = self.snapshots.get(router_id, ["status", "interfaces"], max_age=interval_seconds)
+                    if snapshot["connected"] is not None:
+                        self.breakers.record(router_id, snapshot["connected"], snapshot["timestamp"])
+                    
                     # Kiểm tra trạng thái kết nối
-                    if not self._is_router_connected(router_id):
+                    if not snapshot["connected"]:
                         logger.debug(f"Router {router_id} không kết nối, bỏ qua kiểm tra băng thông")
                         continue
                     
                     router_name = self.get_router_name(router_id)
+                    interfaces = snapshot["sections"].get("interfaces", [])
                     
-                    # Lấy danh sách interfaces
-                    interfaces = self.get_router_interfaces(router_id)
-                    
-                    for interface in interfaces:
-                        interface_name = interface.get('name')
-                        if not interface_name:
-                            continue
-                        
-                        # Bỏ qua loopback và các interfaces đã tắt
-                        if interface_name == 'lo' or interface.get('disabled', False):
-                            continue
-                        
-                        # Lấy thông tin băng thông hiện tại
-                        bandwidth_data = self.get_interface_bandwidth(router_id, interface_name)
-                        if not bandwidth_data:
-                            continue
-                        
-                        # Phân tích dữ liệu băng thông
-                        rx_bits = bandwidth_data.get('rx_bits_per_second', 0)
-                        tx_bits = bandwidth_data.get('tx_bits_per_second', 0)
-                        
-                        # Thêm vào lịch sử để phân tích xu hướng
-                        interface_key = f"{router_id}_{interface_name}"
-                        if interface_key not in self.bandwidth_history:
-                            self.bandwidth_history[interface_key] = []
-                        
-                        # Giới hạn lịch sử lưu trữ (giữ 60 mẫu gần nhất)
-                        if len(self.bandwidth_history[interface_key]) >= 60:
-                            self.bandwidth_history[interface_key].pop(0)
-                        
-                        self.bandwidth_history[interface_key].append({
-                            'timestamp': datetime.now(),
-                            'rx_bits': rx_bits,
-                            'tx_bits': tx_bits
-                        })
-                        
-                        # Lấy tốc độ interface
-                        max_speed = self.get_interface_speed(router_id, interface_name)
+                    for sample in self.get_router_bandwidth(router_id, interfaces, snapshot["timestamp"]):
+                        interface_name = sample['name']
+                        rx_bits = sample['rx_bits']
+                        tx_bits = sample['tx_bits']
+                        max_speed = sample['max_speed']
                         
                         # Nếu không xác định được tốc độ tối đa, bỏ qua kiểm tra ngưỡng
                         if not max_speed:
@@ -286,16 +353,121 @@ class BandwidthMonitor:
             # Chờ đến lần kiểm tra tiếp theo
             time.sleep(interval_seconds)
     
-    def _is_router_connected(self, router_id):
-        """Kiểm tra xem router có đang kết nối không"""
-        try:
-            response = requests.get(f"{self.api_base_url}/connections/{router_id}/status", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('connected', False)
-            return False
-        except Exception:
-            return False
+    def get_router_bandwidth(self, router_id, interfaces=None, timestamp=None):
+        """
+        Lấy băng thông hiện tại của tất cả interface đang bật trên router.
+        Tốc độ được tính từ bộ đếm rxBytes/txBytes trong danh sách interfaces (một request cho
+        cả router); chỉ interface không có bộ đếm mới lấy qua /interface-traffic.
+        Nếu đã có danh sách interfaces (ví dụ từ snapshot) thì không gọi lại API.
+        
+        Args:
+            interfaces (list): Danh sách interface kèm bộ đếm
+            timestamp (float): Thời điểm đọc bộ đếm (time.time(), ví dụ timestamp của snapshot)
+        
+        Returns:
+            list: Mỗi phần tử gồm name, rx_bits, tx_bits và max_speed (bits/second). Interface mới
+            xuất hiện hoặc vừa bị reset bộ đếm chưa có mẫu cho đến lần đọc tiếp theo.
+        """
+        if interfaces is None:
+            interfaces = self.get_router_interfaces(router_id)
+            timestamp = None
+        timestamp = time.time() if timestamp is None else timestamp
+        self.update_interface_speeds(router_id, interfaces)
+        samples = []
+        
+        for interface in self.get_monitored_interfaces(interfaces):
+            if self.has_counters(interface):
+                bandwidth_data = self.compute_rate(router_id, interface, timestamp, interfaces)
+            else:
+                bandwidth_data = self.get_interface_bandwidth(router_id, interface['name'])
+            if not bandwidth_data:
+                continue
+            samples.append(self.record_sample(router_id, interface, bandwidth_data, interfaces))
+        
+        return samples
+    
+    def has_counters(self, interface):
+        """Interface có bộ đếm byte tích lũy để tính tốc độ"""
+        return interface.get('rxBytes') is not None and interface.get('txBytes') is not None
+    
+    def compute_rate(self, router_id, interface, timestamp, interfaces=None):
+        """
+        Tính tốc độ (bits/second) của interface từ mức tăng bộ đếm rxBytes/txBytes so với lần đọc trước.
+        Lần đọc không mới hơn lần trước (snapshot dùng chung giữa các monitor) trả về tốc độ đã tính.
+        
+        Returns:
+            dict: rx_bits_per_second, tx_bits_per_second, sampled_at; None nếu chưa có lần đọc trước
+            hoặc bộ đếm bị reset
+        """
+        interface_name = interface['name']
+        interface_key = f"{router_id}_{interface_name}"
+        rx_bytes = int(interface['rxBytes'])
+        tx_bytes = int(interface['txBytes'])
+        
+        # Đọc và ghi lần đọc mới trong cùng lock để snapshot dùng chung chỉ được tính một lần
+        with self.lock:
+            previous = self.counters.get(interface_key)
+            if previous is not None and timestamp <= previous['timestamp']:
+                return previous['rate']
+            current = self.counters[interface_key] = {'timestamp': timestamp, 'rx': rx_bytes, 'tx': tx_bytes, 'rate': None}
+        
+        if previous is None:
+            return None
+        
+        elapsed = timestamp - previous['timestamp']
+        max_speed = self.get_interface_speed(router_id, interface_name, interfaces)
+        max_delta = max_speed / 8 * elapsed * COUNTER_WRAP_TOLERANCE if max_speed else None
+        
+        counter32 = interface_name in self.counter32_interfaces or interface_key in self.counter32_interfaces
+        rx_delta = counter_delta(previous['rx'], rx_bytes, max_delta, counter32)
+        tx_delta = counter_delta(previous['tx'], tx_bytes, max_delta, counter32)
+        if rx_delta is None or tx_delta is None:
+            logger.info(f"Bộ đếm của {interface_name} trên router {router_id} đã bị reset, tính lại từ lần đọc này")
+            return None
+        
+        rate = {
+            'rx_bits_per_second': rx_delta * 8 / elapsed,
+            'tx_bits_per_second': tx_delta * 8 / elapsed,
+            'sampled_at': timestamp
+        }
+        with self.lock:
+            current['rate'] = rate
+        return rate
+    
+    def get_monitored_interfaces(self, interfaces):
+        """Lọc các interface cần theo dõi (bỏ qua loopback và các interfaces đã tắt)"""
+        return [
+            interface for interface in interfaces
+            if interface.get('name') and interface.get('name') != 'lo' and not interface.get('disabled', False)
+        ]
+    
+    def record_sample(self, router_id, interface, bandwidth_data, interfaces=None):
+        """
+        Lưu một mẫu băng thông vào lịch sử và trả về mẫu kèm tốc độ tối đa của interface.
+        Không gọi API nếu đã truyền danh sách interfaces và tốc độ đã có trong cache.
+        """
+        interface_name = interface['name']
+        
+        # Phân tích dữ liệu băng thông
+        rx_bits = bandwidth_data.get('rx_bits_per_second', 0)
+        tx_bits = bandwidth_data.get('tx_bits_per_second', 0)
+        
+        # Thêm vào lịch sử để phân tích xu hướng (mẫu tính từ cùng một lần đọc bộ đếm chỉ thêm một lần)
+        interface_key = f"{router_id}_{interface_name}"
+        sampled_at = bandwidth_data.get('sampled_at', time.time())
+        if self.bandwidth_history.last_timestamp(interface_key) != sampled_at:
+            self.bandwidth_history.append(interface_key, sampled_at, rx_bits, tx_bits)
+            self.percentiles.add(interface_key, sampled_at, rx_bits, tx_bits)
+            if self.metric_store is not None:
+                tags = {"router": router_id, "interface": interface_name}
+                self.metric_store.write_many([("rx_bits", tags, rx_bits, sampled_at), ("tx_bits", tags, tx_bits, sampled_at)])
+        
+        return {
+            'name': interface_name,
+            'rx_bits': rx_bits,
+            'tx_bits': tx_bits,
+            'max_speed': self.get_interface_speed(router_id, interface_name, interfaces)
+        }
     
     def _can_send_alert(self, alert_key, cooldown_seconds):
         """Kiểm tra xem đã đủ thời gian để gửi lại cảnh báo chưa"""
@@ -342,25 +514,15 @@ class BandwidthMonitor:
         """
         interface_key = f"{router_id}_{interface_name}"
         
-        if interface_key not in self.bandwidth_history or len(self.bandwidth_history[interface_key]) < 5:
+        if self.bandwidth_history.count(interface_key) < 5:
             return None
         
-        # Lấy 5 mẫu gần nhất
-        recent_samples = self.bandwidth_history[interface_key][-5:]
-        
-        # Tính toán xu hướng
-        rx_trend = []
-        tx_trend = []
-        
-        for i in range(len(recent_samples) - 1):
-            rx_diff = recent_samples[i+1]['rx_bits'] - recent_samples[i]['rx_bits']
-            tx_diff = recent_samples[i+1]['tx_bits'] - recent_samples[i]['tx_bits']
-            rx_trend.append(rx_diff)
-            tx_trend.append(tx_diff)
+        # 5 mẫu gần nhất (view của bộ đệm, không sao chép)
+        _, rx_bits, tx_bits = self.bandwidth_history.window(interface_key, 5)
         
-        # Xác định xu hướng tổng thể
-        avg_rx_trend = sum(rx_trend) / len(rx_trend)
-        avg_tx_trend = sum(tx_trend) / len(tx_trend)
+        # Mức thay đổi trung bình giữa hai mẫu liên tiếp (tổng các hiệu liên tiếp = mẫu cuối - mẫu đầu)
+        avg_rx_trend = float(rx_bits[-1] - rx_bits[0]) / (len(rx_bits) - 1)
+        avg_tx_trend = float(tx_bits[-1] - tx_bits[0]) / (len(tx_bits) - 1)
         
         trend_desc = "Ổn định"
         if avg_rx_trend > 0 and avg_tx_trend > 0:
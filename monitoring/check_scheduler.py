@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module lập lịch các bước kiểm tra của AlertMonitor.
+Mỗi cặp (router, bước kiểm tra) có chu kỳ riêng và được xếp trong một hàng đợi ưu tiên (heap)
+theo thời điểm đến hạn, thay cho việc kiểm tra toàn bộ router cùng lúc sau mỗi check_interval.
+"""
+
+import time
+import heapq
+import zlib
+import itertools
+
+# Các bước kiểm tra đến hạn cách nhau ít hơn khoảng này được gộp vào cùng một lần lấy snapshot
+COALESCE_WINDOW = 0.5
+
+
+def router_phase(router_id):
+    """
+    Độ lệch pha cố định của router, trong khoảng [0, 1).
+    Tính từ hash của ID nên ổn định giữa các lần khởi động lại và phân bố đều giữa các router.
+    """
+    return zlib.crc32(str(router_id).encode('utf-8')) / 0x100000000
+
+
+class CheckScheduler:
+    """
+    Hàng đợi ưu tiên các bước kiểm tra theo thời điểm đến hạn.
+    
+    Thời điểm chạy của bước kiểm tra có chu kỳ T trên router r luôn có dạng
+    phase(r) * base + k * T (base là chu kỳ nhỏ nhất), nên:
+    - các router được dàn đều trong khoảng base thay vì dồn vào cùng một thời điểm;
+    - các bước kiểm tra của cùng một router có chu kỳ là bội của nhau đến hạn cùng lúc
+      và được gộp vào một lần lấy snapshot.
+    
+    Không dùng khóa: chỉ vòng lặp giám sát thao tác trên scheduler.
+    """
+    
+    def __init__(self, coalesce_window=COALESCE_WINDOW, clock=time.monotonic):
+        """
+        Khởi tạo scheduler
+        
+        Args:
+            coalesce_window (float): Khoảng thời gian (giây) để gộp các bước kiểm tra gần nhau
+            clock: Hàm trả về thời gian hiện tại (mặc định time.monotonic)
+        """
+        self.coalesce_window = coalesce_window
+        self.clock = clock
+        self.heap = []  # (thời điểm đến hạn, thế hệ, router_id, bước kiểm tra)
+        self.entries = {}  # (router_id, bước kiểm tra) -> {"base", "interval", "phase", "generation"}
+        self.phases = {}  # router_id -> độ lệch pha (giây)
+        self.base_interval = None
+        self.counter = itertools.count()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def sync(self, router_ids, intervals):
+        """
+        Đồng bộ lịch với danh sách router và chu kỳ các bước kiểm tra hiện tại.
+        Router/bước kiểm tra mới được thêm vào lịch, các mục không còn được bỏ đi,
+        mục đổi chu kỳ cấu hình được xếp lại (bỏ chu kỳ đã điều chỉnh bằng set_interval).
+        
+        Args:
+            router_ids (iterable): ID các router cần kiểm tra
+            intervals (dict): Tên bước kiểm tra -> chu kỳ (giây)
+        
+        Returns:
+            tuple: (số mục được thêm, số mục bị bỏ)
+        """
+        router_ids = set(router_ids)
+        base_interval = min(intervals.values()) if intervals else None
+        if base_interval != self.base_interval:
+            # Chu kỳ cơ sở thay đổi thì độ lệch pha của mọi router phải tính lại
+            self.base_interval = base_interval
+            self.phases = {}
+        
+        wanted = {(router_id, check) for router_id in router_ids for check in intervals}
+        removed = [key for key in self.entries if key not in wanted]
+        for key in removed:
+            del self.entries[key]
+        for router_id in list(self.phases):
+            if router_id not in router_ids:
+                del self.phases[router_id]
+        
+        added = 0
+        for router_id, check in wanted:
+            entry = self.entries.get((router_id, check))
+            if entry is None:
+                # Lần chạy đầu tiên nằm trong chu kỳ cơ sở để mọi bước kiểm tra sớm có dữ liệu
+                added += 1
+                self.schedule(router_id, check, intervals[check], initial=True)
+            elif entry["base"] != intervals[check]:
+                self.schedule(router_id, check, intervals[check])
+            elif entry["phase"] != self._phase(router_id):
+                self.schedule(router_id, check, entry["interval"], base=entry["base"])
+        
+        return added, len(removed)
+    
+    def schedule(self, router_id, check, interval, now=None, initial=False, base=None):
+        """
+        Xếp (lại) một bước kiểm tra vào thời điểm chạy kế tiếp theo chu kỳ interval
+        
+        Args:
+            now (float): Mốc thời gian tính lần chạy kế tiếp (mặc định thời gian hiện tại)
+            initial (bool): Lần chạy đầu tiên, xếp theo chu kỳ cơ sở thay vì interval
+            base (float): Chu kỳ theo cấu hình (mặc định bằng interval)
+        """
+        now = self.clock() if now is None else now
+        generation = next(self.counter)
+        phase = self._phase(router_id)
+        self.entries[(router_id, check)] = {
+            "base": interval if base is None else base,
+            "interval": interval,
+            "phase": phase,
+            "generation": generation
+        }
+        slot_interval = min(interval, self.base_interval or interval) if initial else interval
+        heapq.heappush(self.heap, (self._next_slot(phase, slot_interval, now), generation, router_id, check))
+    
+    def set_interval(self, router_id, check, interval, now=None):
+        """
+        Đổi chu kỳ hiện tại của một bước kiểm tra (giữ nguyên chu kỳ cấu hình),
+        lần chạy kế tiếp được xếp lại theo chu kỳ mới
+        
+        Returns:
+            bool: True nếu chu kỳ thay đổi
+        """
+        entry = self.entries.get((router_id, check))
+        if entry is None or entry["interval"] == interval:
+            return False
+        self.schedule(router_id, check, interval, now, base=entry["base"])
+        return True
+    
+    def expedite(self, router_id, check, now=None):
+        """
+        Cho một bước kiểm tra đến hạn ngay (ví dụ khi có tín hiệu router đổi trạng thái) hoặc
+        tại thời điểm now, sau lần chạy đó lịch tiếp tục theo chu kỳ hiện tại
+        
+        Args:
+            now (float): Thời điểm đến hạn (mặc định thời gian hiện tại)
+        
+        Returns:
+            bool: True nếu bước kiểm tra có trong lịch
+        """
+        entry = self.entries.get((router_id, check))
+        if entry is None:
+            return False
+        entry["generation"] = next(self.counter)
+        heapq.heappush(self.heap, (self.clock() if now is None else now, entry["generation"], router_id, check))
+        return True
+    
+    def get_interval(self, router_id, check):
+        """Chu kỳ hiện tại của một bước kiểm tra, None nếu không có trong lịch"""
+        entry = self.entries.get((router_id, check))
+        return entry["interval"] if entry else None
+    
+    def next_due(self):
+        """Thời điểm đến hạn sớm nhất, None nếu lịch trống"""
+        self._discard_stale()
+        return self.heap[0][0] if self.heap else None
+    
+    def pop_due(self, now=None):
+        """
+        Lấy các bước kiểm tra đã đến hạn (gộp theo router) và xếp lịch lần chạy kế tiếp
+        
+        Returns:
+            list: Các tuple (router_id, danh sách bước kiểm tra, thời điểm đến hạn sớm nhất)
+        """
+        now = self.clock() if now is None else now
+        due = {}
+        
+        while True:
+            self._discard_stale()
+            if not self.heap or self.heap[0][0] > now + self.coalesce_window:
+                break
+            
+            due_at, _, router_id, check = heapq.heappop(self.heap)
+            checks, first_due = due.get(router_id, ([], due_at))
+            checks.append(check)
+            due[router_id] = (checks, min(first_due, due_at))
+            
+            # Lần chạy kế tiếp tính từ thời điểm hiện tại: các lần bị lỡ (khi quá tải) được bỏ qua
+            entry = self.entries[(router_id, check)]
+            self.schedule(router_id, check, entry["interval"], max(now, due_at), base=entry["base"])
+        
+        return [(router_id, checks, first_due) for router_id, (checks, first_due) in due.items()]
+    
+    def _phase(self, router_id):
+        """Độ lệch pha (giây) của router trong chu kỳ cơ sở"""
+        if router_id not in self.phases:
+            self.phases[router_id] = router_phase(router_id) * (self.base_interval or 0)
+        return self.phases[router_id]
+    
+    def _next_slot(self, phase, interval, now):
+        """Thời điểm đầu tiên sau now có dạng phase + k * interval"""
+        slot = now + (phase - now) % interval
+        return slot if slot > now else slot + interval
+    
+    def _discard_stale(self):
+        """Bỏ các mục ở đầu heap đã bị xóa hoặc đã được xếp lại"""
+        while self.heap:
+            _, generation, router_id, check = self.heap[0]
+            entry = self.entries.get((router_id, check))
+            if entry is not None and entry["generation"] == generation:
+                return
+            heapq.heappop(self.heap)
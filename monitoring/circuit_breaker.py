@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module circuit breaker theo từng router.
+Sau một số lần liên tiếp không kết nối được, router bị "mở mạch": các bước kiểm tra đầy đủ
+bị dừng và router chỉ được thăm dò trạng thái kết nối theo lịch backoff hàm mũ,
+đến khi thăm dò thành công thì mạch đóng lại.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('circuit_breaker')
+
+# Trạng thái của mạch
+CLOSED = "closed"  # Hoạt động bình thường
+OPEN = "open"  # Tạm dừng kiểm tra, chờ đến lần thăm dò kế tiếp
+HALF_OPEN = "half_open"  # Đang thăm dò, chỉ cho phép một request
+
+
+class RouterCircuitBreakers:
+    """
+    Quản lý circuit breaker của tất cả router. An toàn khi dùng chung giữa nhiều thread
+    và giữa các monitor (AlertMonitor, BandwidthMonitor).
+    """
+    
+    def __init__(self, failure_threshold=3, base_backoff=10, max_backoff=600, multiplier=2, probe_timeout=60):
+        """
+        Khởi tạo
+        
+        Args:
+            failure_threshold (int): Số lần thất bại liên tiếp trước khi mở mạch
+            base_backoff (float): Thời gian chờ (giây) trước lần thăm dò đầu tiên
+            max_backoff (float): Thời gian chờ tối đa giữa hai lần thăm dò
+            multiplier (float): Hệ số nhân thời gian chờ sau mỗi lần thăm dò thất bại
+            probe_timeout (float): Sau thời gian này mà lần thăm dò chưa có kết quả thì cho phép thăm dò lại
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.probe_timeout = probe_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}  # router_id -> trạng thái mạch
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "circuit_breaker" của alert_monitor_config.json)"""
+        self.failure_threshold = config.get("failure_threshold", self.failure_threshold)
+        self.base_backoff = config.get("base_backoff", self.base_backoff)
+        self.max_backoff = config.get("max_backoff", self.max_backoff)
+        self.multiplier = config.get("multiplier", self.multiplier)
+        self.probe_timeout = config.get("probe_timeout", self.probe_timeout)
+    
+    def allow_request(self, router_id):
+        """
+        Kiểm tra có được gửi request tới router không.
+        Khi mạch mở và đã đến thời điểm thăm dò, mạch chuyển sang half-open và cho phép một request.
+        """
+        now = time.monotonic()
+        with self.lock:
+            breaker = self.breakers.get(router_id)
+            if breaker is None or breaker["state"] == CLOSED:
+                return True
+            
+            if breaker["state"] == HALF_OPEN and now - breaker["probe_started"] < self.probe_timeout:
+                return False
+            if breaker["state"] == OPEN and now < breaker["next_probe"]:
+                return False
+            
+            breaker["state"] = HALF_OPEN
+            breaker["probe_started"] = now
+            return True
+    
+    def expedite(self, router_id):
+        """Cho phép thăm dò router ngay, không chờ hết thời gian backoff (ví dụ khi có tín hiệu router đã kết nối được)"""
+        with self.lock:
+            breaker = self.breakers.get(router_id)
+            if breaker is not None and breaker["state"] == OPEN:
+                breaker["next_probe"] = 0
+    
+    def is_probing(self, router_id):
+        """Router đang ở trạng thái thăm dò (chỉ nên kiểm tra kết nối, không chạy đủ các bước)"""
+        with self.lock:
+            breaker = self.breakers.get(router_id)
+            return breaker is not None and breaker["state"] == HALF_OPEN
+    
+    def is_open(self, router_id):
+        """Mạch của router đang mở hoặc đang thăm dò"""
+        with self.lock:
+            breaker = self.breakers.get(router_id)
+            return breaker is not None and breaker["state"] != CLOSED
+    
+    def record(self, router_id, success, observed_at=None):
+        """
+        Ghi nhận kết quả kết nối tới router
+        
+        Args:
+            router_id: ID router
+            success (bool): Kết nối thành công hay không
+            observed_at (float): Thời điểm lấy kết quả (time.time(), ví dụ timestamp của snapshot).
+                Kết quả không mới hơn kết quả đã ghi nhận bị bỏ qua, để một snapshot dùng chung
+                giữa nhiều monitor chỉ được tính một lần.
+        """
+        now = time.monotonic()
+        observed_at = time.time() if observed_at is None else observed_at
+        
+        with self.lock:
+            breaker = self.breakers.get(router_id)
+            if breaker is None:
+                if success:
+                    return
+                breaker = self.breakers[router_id] = {
+                    "state": CLOSED,
+                    "failures": 0,
+                    "backoff": 0,
+                    "next_probe": 0,
+                    "probe_started": 0,
+                    "opened_at": None,
+                    "observed_at": 0
+                }
+            
+            if observed_at <= breaker["observed_at"]:
+                return
+            breaker["observed_at"] = observed_at
+            previous = breaker["state"]
+            
+            if success:
+                del self.breakers[router_id]
+                if previous != CLOSED:
+                    logger.info(f"Router #{router_id} đã kết nối lại, đóng circuit breaker")
+                return
+            
+            breaker["failures"] += 1
+            if previous == CLOSED and breaker["failures"] < self.failure_threshold:
+                return
+            
+            # Mở mạch lần đầu hoặc thăm dò thất bại: tăng thời gian chờ theo hàm mũ
+            if previous == CLOSED:
+                breaker["backoff"] = self.base_backoff
+                breaker["opened_at"] = datetime.now()
+            else:
+                breaker["backoff"] = min(self.max_backoff, max(breaker["backoff"], self.base_backoff) * self.multiplier)
+            breaker["state"] = OPEN
+            breaker["next_probe"] = now + breaker["backoff"]
+        
+        if previous == CLOSED:
+            logger.warning(f"Router #{router_id} không kết nối được {breaker['failures']} lần liên tiếp, "
+                           f"mở circuit breaker (thăm dò lại sau {breaker['backoff']:.0f}s)")
+        else:
+            logger.debug(f"Thăm dò router #{router_id} thất bại, thăm dò lại sau {breaker['backoff']:.0f}s")
+    
+    def forget(self, router_ids):
+        """Bỏ trạng thái của các router không còn trong danh sách"""
+        with self.lock:
+            for router_id in [router_id for router_id in self.breakers if router_id not in router_ids]:
+                del self.breakers[router_id]
+    
+    def get_states(self):
+        """
+        Trạng thái các router có lỗi kết nối (router không có trong kết quả là đang đóng mạch)
+        
+        Returns:
+            dict: router_id -> {state, failures, backoff, opened_at, next_probe_in}
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                router_id: {
+                    "state": breaker["state"],
+                    "failures": breaker["failures"],
+                    "backoff": breaker["backoff"],
+                    "opened_at": breaker["opened_at"],
+                    "next_probe_in": max(0, breaker["next_probe"] - now) if breaker["state"] == OPEN else 0
+                }
+                for router_id, breaker in self.breakers.items()
+            }
+    
+    def get_open_routers(self):
+        """Danh sách ID các router đang mở mạch"""
+        return [router_id for router_id, state in self.get_states().items() if state["state"] != CLOSED]
+
+
+# Singleton instance, dùng chung cho AlertMonitor và BandwidthMonitor
+router_breakers = RouterCircuitBreakers()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module nén chuỗi chỉ số kiểu Gorilla cho kho chuỗi thời gian.
+Mỗi block (tối đa BLOCK_SIZE điểm) gồm header cố định (số điểm, kích thước, thời điểm đầu/cuối,
+min/max/sum của giá trị) và phần dữ liệu nén:
+- timestamp: giá trị đầu tiên đầy đủ, sau đó là delta-of-delta (theo đơn vị TIMESTAMP_RESOLUTION)
+  ghi bằng mã độ dài thay đổi; chuỗi polling đều đặn chỉ tốn 1 bit mỗi điểm
+- giá trị: XOR với giá trị trước, chỉ ghi các bit có nghĩa (dùng lại cửa sổ leading/trailing zero
+  của giá trị trước nếu vừa)
+Header cho phép tính min/max/sum/count của khoảng thời gian mà không cần giải nén block.
+"""
+
+import numpy as np
+
+# Số điểm tối đa của một block
+BLOCK_SIZE = 1024
+# Timestamp được lưu theo mili giây
+TIMESTAMP_RESOLUTION = 1000
+
+BLOCK_HEADER_DTYPE = np.dtype([
+    ('count', '<u4'), ('size', '<u4'),
+    ('start', '<f8'), ('end', '<f8'),
+    ('min', '<f8'), ('max', '<f8'), ('sum', '<f8')
+])
+
+# Mã delta-of-delta: (số bit điều khiển, mã điều khiển, số bit giá trị)
+DOD_BUCKETS = ((2, 0b10, 7), (3, 0b110, 9), (4, 0b1110, 12))
+DOD_FALLBACK = (4, 0b1111, 64)
+
+
+def _leading_zeros(values):
+    """Số bit 0 đầu của các số uint64 (64 với số 0)"""
+    count = np.zeros(len(values), dtype=np.int64)
+    remaining = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (remaining >> np.uint64(64 - shift)) == 0
+        count += np.where(empty, shift, 0)
+        remaining = np.where(empty, remaining << np.uint64(shift), remaining)
+    return np.where(values == 0, 64, count)
+
+
+def _trailing_zeros(values):
+    """Số bit 0 cuối của các số uint64 (64 với số 0)"""
+    lowest = values & (~values + np.uint64(1))
+    with np.errstate(divide='ignore'):
+        count = np.log2(lowest.astype(np.float64))
+    return np.where(values == 0, 64, count).astype(np.int64)
+
+
+def _pack_bits(fields, widths):
+    """Ghép các trường (giá trị uint64, số bit) liên tiếp thành bytes"""
+    widths = np.asarray(widths, dtype=np.int64)
+    fields = np.asarray(fields, dtype=np.uint64)
+    keep = widths > 0
+    fields, widths = fields[keep], widths[keep]
+    
+    field_index = np.repeat(np.arange(len(widths)), widths)
+    starts = np.cumsum(widths) - widths
+    shifts = widths[field_index] - 1 - (np.arange(len(field_index)) - starts[field_index])
+    bits = (fields[field_index] >> shifts.astype(np.uint64)) & np.uint64(1)
+    return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def encode_block(timestamps, values):
+    """
+    Nén một block
+    
+    Args:
+        timestamps (ndarray): Thời điểm (epoch giây) tăng dần, tối đa BLOCK_SIZE điểm
+        values (ndarray): Giá trị float64
+    
+    Returns:
+        bytes: Header + dữ liệu nén
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    count = len(values)
+    if not count or count > BLOCK_SIZE or len(timestamps) != count:
+        raise ValueError(f"Block phải có từ 1 đến {BLOCK_SIZE} điểm")
+    
+    # Timestamp: giá trị đầu (64 bit), delta đầu và các delta-of-delta
+    ticks = np.round(timestamps * TIMESTAMP_RESOLUTION).astype(np.int64)
+    deltas = np.diff(ticks)
+    dods = np.diff(deltas, prepend=0)
+    dod_fields = dods.astype(np.uint64)
+    dod_control = np.full(len(dods), DOD_FALLBACK[1], dtype=np.uint64)
+    dod_control_bits = np.full(len(dods), DOD_FALLBACK[0])
+    dod_bits = np.full(len(dods), DOD_FALLBACK[2])
+    for control_bits, control, value_bits in reversed(DOD_BUCKETS):
+        fits = (dods >= -(1 << (value_bits - 1))) & (dods < 1 << (value_bits - 1))
+        dod_control = np.where(fits, control, dod_control)
+        dod_control_bits = np.where(fits, control_bits, dod_control_bits)
+        dod_bits = np.where(fits, value_bits, dod_bits)
+        dod_fields = np.where(fits, dods.astype(np.uint64) & np.uint64((1 << value_bits) - 1), dod_fields)
+    zero = dods == 0
+    dod_control = np.where(zero, 0, dod_control)
+    dod_control_bits = np.where(zero, 1, dod_control_bits)
+    dod_bits = np.where(zero, 0, dod_bits)
+    
+    # Giá trị: XOR với giá trị trước, quyết định dùng lại cửa sổ bit (tuần tự vì phụ thuộc cửa sổ trước)
+    raw = values.view(np.uint64)
+    xors = raw[1:] ^ raw[:-1]
+    leading = np.minimum(_leading_zeros(xors), 31).tolist()
+    trailing = _trailing_zeros(xors).tolist()
+    value_control = []
+    value_control_bits = []
+    window_leading, window_trailing = [], []
+    previous_leading, previous_trailing = -1, -1
+    for xor_leading, xor_trailing in zip(leading, trailing):
+        if xor_trailing == 64:
+            value_control.append(0)
+            value_control_bits.append(1)
+            window_leading.append(0)
+            window_trailing.append(64)
+        elif previous_leading >= 0 and xor_leading >= previous_leading and xor_trailing >= previous_trailing:
+            value_control.append(0b10)
+            value_control_bits.append(2)
+            window_leading.append(previous_leading)
+            window_trailing.append(previous_trailing)
+        else:
+            meaningful = 64 - xor_leading - xor_trailing
+            value_control.append((0b11 << 11) | (xor_leading << 6) | (meaningful & 0x3f))
+            value_control_bits.append(13)
+            window_leading.append(xor_leading)
+            window_trailing.append(xor_trailing)
+            previous_leading, previous_trailing = xor_leading, xor_trailing
+    window_leading = np.array(window_leading, dtype=np.int64)
+    window_trailing = np.array(window_trailing, dtype=np.int64)
+    meaningful_bits = np.where(window_trailing == 64, 0, 64 - window_leading - np.minimum(window_trailing, 63))
+    meaningful_fields = xors >> np.minimum(window_trailing, 63).astype(np.uint64)
+    
+    # Thứ tự trường: ts đầu, giá trị đầu, rồi mỗi điểm tiếp theo: [điều khiển dod, dod, điều khiển xor, bit có nghĩa]
+    first_fields = [np.uint64(ticks[0]), raw[0]]
+    per_point_fields = np.stack((
+        dod_control, dod_fields,
+        np.array(value_control, dtype=np.uint64), meaningful_fields
+    ), axis=1).ravel() if count > 1 else np.empty(0, dtype=np.uint64)
+    per_point_widths = np.stack((
+        dod_control_bits, dod_bits,
+        np.array(value_control_bits, dtype=np.int64), meaningful_bits
+    ), axis=1).ravel() if count > 1 else np.empty(0, dtype=np.int64)
+    payload = _pack_bits(
+        np.concatenate((np.array(first_fields, dtype=np.uint64), per_point_fields)),
+        np.concatenate((np.array([64, 64]), per_point_widths))
+    )
+    
+    header = np.zeros(1, dtype=BLOCK_HEADER_DTYPE)
+    header['count'] = count
+    header['size'] = len(payload)
+    header['start'] = timestamps[0]
+    header['end'] = timestamps[-1]
+    header['min'] = values.min()
+    header['max'] = values.max()
+    header['sum'] = values.sum()
+    return header.tobytes() + payload
+
+
+class _BitReader:
+    """Đọc lần lượt các trường bit từ bytes"""
+    
+    def __init__(self, data):
+        self.data = bytes(data) + b'\0' * 9
+        self.position = 0
+    
+    def read(self, width):
+        byte = self.position >> 3
+        chunk = int.from_bytes(self.data[byte:byte + 9], 'big')
+        value = (chunk >> (72 - (self.position & 7) - width)) & ((1 << width) - 1)
+        self.position += width
+        return value
+
+
+def _signed(value, width):
+    return value - (1 << width) if value >= 1 << (width - 1) else value
+
+
+def decode_block(data, offset=0):
+    """
+    Giải nén một block
+    
+    Returns:
+        tuple: (timestamps, values, kích thước block tính bằng byte)
+    """
+    header = np.frombuffer(data, dtype=BLOCK_HEADER_DTYPE, count=1, offset=offset)[0]
+    count, size = int(header['count']), int(header['size'])
+    payload_start = offset + BLOCK_HEADER_DTYPE.itemsize
+    reader = _BitReader(memoryview(data)[payload_start:payload_start + size])
+    read = reader.read
+    
+    tick = _signed(read(64), 64)
+    value = read(64)
+    ticks = [tick]
+    raw = [value]
+    delta = 0
+    window_leading, window_trailing = 0, 0
+    
+    for _ in range(count - 1):
+        if not read(1):
+            dod = 0
+        elif not read(1):
+            dod = _signed(read(7), 7)
+        elif not read(1):
+            dod = _signed(read(9), 9)
+        elif not read(1):
+            dod = _signed(read(12), 12)
+        else:
+            dod = _signed(read(64), 64)
+        delta += dod
+        tick += delta
+        ticks.append(tick)
+        
+        if read(1):
+            if read(1):
+                window_leading = read(5)
+                meaningful = read(6) or 64
+                window_trailing = 64 - window_leading - meaningful
+            value ^= read(64 - window_leading - window_trailing) << window_trailing
+        raw.append(value)
+    
+    timestamps = np.array(ticks, dtype=np.float64) / TIMESTAMP_RESOLUTION
+    values = np.array(raw, dtype=np.uint64).view(np.float64)
+    return timestamps, values, BLOCK_HEADER_DTYPE.itemsize + size
+
+
+def encode_series(timestamps, values):
+    """Nén một chuỗi thành các block liên tiếp (mỗi block tối đa BLOCK_SIZE điểm)"""
+    return b''.join(
+        encode_block(timestamps[start:start + BLOCK_SIZE], values[start:start + BLOCK_SIZE])
+        for start in range(0, len(values), BLOCK_SIZE)
+    )
+
+
+def block_headers(data, count=None):
+    """
+    Header của các block (không giải nén)
+    
+    Returns:
+        list: Các tuple (offset, header)
+    """
+    headers = []
+    offset = 0
+    while offset < len(data) and (count is None or len(headers) < count):
+        header = np.frombuffer(data, dtype=BLOCK_HEADER_DTYPE, count=1, offset=offset)[0]
+        headers.append((offset, header))
+        offset += BLOCK_HEADER_DTYPE.itemsize + int(header['size'])
+    return headers
+
+
+def decode_series(data, start=None, end=None):
+    """
+    Giải nén các block có điểm trong khoảng [start, end] (block nằm ngoài được bỏ qua qua header)
+    
+    Returns:
+        tuple: (timestamps, values)
+    """
+    parts = []
+    for offset, header in block_headers(data):
+        if (start is not None and header['end'] < start) or (end is not None and header['start'] > end):
+            continue
+        timestamps, values, _ = decode_block(data, offset)
+        parts.append((timestamps, values))
+    
+    if not parts:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+    return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module tổng hợp (rollup) dữ liệu của kho chuỗi thời gian theo các tầng độ phân giải.
+Thread nền định kỳ gộp các điểm gốc (mỗi lần poll) thành các tầng 1m, 5m, 1h với các giá trị
+min/max/avg/last/p95 của mỗi khoảng, tính đồng thời cho mọi chuỗi bằng NumPy và chỉ xử lý
+các khoảng mới kể từ lần trước (mốc đã xử lý của mỗi tầng được lưu trong state.json).
+Mỗi tầng là một MetricStore riêng (thư mục rollup/<tầng>, chuỗi "<chỉ số>:<phép gộp>") có thời gian
+lưu trữ riêng; segment hết hạn của dữ liệu gốc và các tầng được xóa (dữ liệu gốc chỉ bị xóa khi
+mọi tầng đã tổng hợp xong). Truy vấn chọn tầng thô nhất vẫn đáp ứng độ phân giải yêu cầu.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.metric_store import metric_store, MetricStore, RECORD_DTYPE, bucket_aggregates, empty_series
+
+logger = logging.getLogger('metric_rollup')
+
+# Các giá trị được tính cho mỗi khoảng của tầng rollup
+ROLLUP_AGGREGATES = ("min", "max", "avg", "last", "p95")
+
+# Các tầng mặc định: độ dài khoảng, thời gian lưu trữ và độ dài segment (giây)
+DEFAULT_TIERS = [
+    {"name": "1m", "step": 60, "retention": 7 * 86400, "segment_seconds": 3600},
+    {"name": "5m", "step": 300, "retention": 30 * 86400, "segment_seconds": 6 * 3600},
+    {"name": "1h", "step": 3600, "retention": 365 * 86400, "segment_seconds": 86400}
+]
+
+
+class MetricRollups:
+    """
+    Pipeline rollup của một MetricStore. Tiến trình ghi (AlertMonitor) chạy thread nền,
+    tiến trình chỉ đọc (app.py) dùng query() để đọc từ tầng phù hợp.
+    """
+    
+    def __init__(self, store=None, tiers=None, interval=60, lag=30, raw_retention=2 * 86400):
+        """
+        Khởi tạo
+        
+        Args:
+            store (MetricStore): Kho dữ liệu gốc (mặc định kho dùng chung)
+            tiers (list): Các tầng {name, step, retention, segment_seconds}
+            interval (float): Chu kỳ chạy rollup (giây)
+            lag (float): Chỉ tổng hợp khoảng đã kết thúc quá lag giây (chờ điểm đến muộn)
+            raw_retention (float): Thời gian lưu dữ liệu gốc (giây)
+        """
+        self.store = store or metric_store
+        self.interval = interval
+        self.lag = lag
+        self.raw_retention = raw_retention
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._set_tiers(tiers or DEFAULT_TIERS)
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "metric_store" của alert_monitor_config.json)"""
+        with self.lock:
+            self.interval = config.get("rollup_interval", self.interval)
+            self.lag = config.get("rollup_lag", self.lag)
+            self.raw_retention = config.get("raw_retention", self.raw_retention)
+            self._set_tiers(config.get("tiers", self.tiers))
+    
+    def _set_tiers(self, tiers):
+        """Sắp xếp các tầng theo độ phân giải và mở kho dữ liệu của mỗi tầng"""
+        self.tiers = sorted((dict(tier) for tier in tiers), key=lambda tier: tier["step"])
+        self.tier_stores = {
+            tier["name"]: MetricStore(
+                os.path.join(self.store.path, "rollup", tier["name"]),
+                segment_seconds=tier.get("segment_seconds", 86400)
+            )
+            for tier in self.tiers
+        }
+        self.series_maps = {tier["name"]: np.full((0, len(ROLLUP_AGGREGATES)), -1, dtype=np.int64) for tier in self.tiers}
+    
+    def _state_path(self):
+        return os.path.join(self.store.path, "rollup", "state.json")
+    
+    def load_state(self):
+        """Mốc đã tổng hợp (epoch giây) của mỗi tầng"""
+        try:
+            with open(self._state_path(), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _save_state(self, state):
+        path = self._state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+    
+    def start(self):
+        """Bắt đầu thread rollup"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="metric-rollup")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("Đã bắt đầu tổng hợp rollup chuỗi thời gian")
+    
+    def stop(self):
+        """Dừng thread rollup và ghi nốt dữ liệu các tầng"""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=10)
+        self.thread = None
+        self.stop_event.clear()
+        for tier_store in self.tier_stores.values():
+            tier_store.close()
+    
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Lỗi khi tổng hợp rollup: {e}", exc_info=True)
+            self.stop_event.wait(self.interval)
+    
+    def run_once(self, now=None):
+        """
+        Tổng hợp các khoảng mới của mọi tầng rồi xóa dữ liệu hết hạn
+        
+        Returns:
+            dict: Tên tầng -> số khoảng (theo chuỗi) đã ghi
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self.load_state()
+            written = {}
+            for tier in self.tiers:
+                if self.stop_event.is_set():
+                    break
+                written[tier["name"]] = self._roll_tier(tier, state, now)
+            self._compact(state, now)
+        return written
+    
+    def _roll_tier(self, tier, state, now):
+        """Tổng hợp các khoảng đã kết thúc của một tầng, theo từng đoạn để giới hạn bộ nhớ"""
+        step = tier["step"]
+        ready = (now - self.lag) // step * step
+        watermark = state.get(tier["name"])
+        if watermark is None:
+            first = self.store.first_timestamp()
+            if first is None:
+                return 0
+            watermark = first // step * step
+        
+        # Mỗi đoạn tối thiểu 15 phút dữ liệu gốc, làm tròn theo step
+        chunk = max(step, 900 // step * step)
+        written = 0
+        while watermark < ready and not self.stop_event.is_set():
+            chunk_end = min(watermark + chunk, ready)
+            records = self.store.scan(watermark, chunk_end)
+            if len(records):
+                written += self._write_rollups(tier, records)
+            watermark = chunk_end
+            state[tier["name"]] = watermark
+            self._save_state(state)
+        
+        # Đóng gói (nén) các segment đã qua của tầng
+        self.tier_stores[tier["name"]].flush()
+        return written
+    
+    def _write_rollups(self, tier, records):
+        """Tính min/max/avg/last/p95 theo khoảng của tầng cho mọi chuỗi trong records và ghi vào kho của tầng"""
+        series, buckets, aggregates = bucket_aggregates(
+            records['series'], records['timestamp'], records['value'], tier["step"], ROLLUP_AGGREGATES
+        )
+        tier_store = self.tier_stores[tier["name"]]
+        tier_ids = self._tier_series_ids(tier["name"], tier_store, series)
+        
+        rollups = np.empty(len(series) * len(ROLLUP_AGGREGATES), dtype=RECORD_DTYPE)
+        for position, aggregate in enumerate(ROLLUP_AGGREGATES):
+            chunk = rollups[position * len(series):(position + 1) * len(series)]
+            chunk['series'] = tier_ids[:, position]
+            chunk['timestamp'] = buckets
+            chunk['value'] = aggregates[aggregate]
+        tier_store.append_records(rollups)
+        return len(series)
+    
+    def _tier_series_ids(self, tier_name, tier_store, series):
+        """ID trong kho của tầng của các chuỗi "<chỉ số>:<phép gộp>" ứng với các ID chuỗi gốc"""
+        series_map = self.series_maps[tier_name]
+        largest = int(series.max()) + 1
+        if largest > len(series_map):
+            grown = np.full((largest, len(ROLLUP_AGGREGATES)), -1, dtype=np.int64)
+            grown[:len(series_map)] = series_map
+            series_map = self.series_maps[tier_name] = grown
+        
+        for series_id in np.unique(series[series_map[series, 0] < 0]).tolist():
+            metric, tags = self.store.get_series(series_id)
+            for position, aggregate in enumerate(ROLLUP_AGGREGATES):
+                series_map[series_id, position] = tier_store.get_series_id(f"{metric}:{aggregate}", tags, create=True)
+        return series_map[series]
+    
+    def _compact(self, state, now):
+        """Xóa segment hết hạn của các tầng và dữ liệu gốc đã được mọi tầng tổng hợp"""
+        for tier in self.tiers:
+            self.tier_stores[tier["name"]].delete_before(now - tier["retention"])
+        
+        raw_expiry = now - self.raw_retention
+        for tier in self.tiers:
+            raw_expiry = min(raw_expiry, state.get(tier["name"], 0))
+        self.store.delete_before(raw_expiry)
+    
+    def select_tier(self, resolution, start=None, now=None):
+        """
+        Tầng thô nhất có độ phân giải không lớn hơn resolution và còn dữ liệu từ start,
+        None nếu nên đọc dữ liệu gốc
+        """
+        now = time.time() if now is None else now
+        selected = None
+        for tier in self.tiers:
+            if tier["step"] > resolution:
+                break
+            if start is None or start >= now - tier["retention"]:
+                selected = tier
+        if selected is None and start is not None and start < now - self.raw_retention:
+            # Dữ liệu gốc đã hết hạn: dùng tầng thô nhất còn giữ khoảng thời gian này
+            selected = next((tier for tier in self.tiers if start >= now - tier["retention"]), None)
+        return selected
+    
+    def query(self, metric, tags=None, start=None, end=None, resolution=60, aggregate="avg"):
+        """
+        Các điểm của chuỗi với độ phân giải resolution giây, đọc từ tầng rollup thô nhất đáp ứng được
+        (phần mới hơn mốc đã tổng hợp của tầng được gộp từ dữ liệu gốc)
+        
+        Args:
+            resolution (float): Khoảng cách mong muốn giữa các điểm (giây)
+            aggregate (str): Phép gộp: min, max, avg, last, p95
+        
+        Returns:
+            tuple: (timestamps, values, tên tầng hoặc "raw")
+        """
+        if aggregate not in ROLLUP_AGGREGATES:
+            raise ValueError(f"Phép gộp không hợp lệ: {aggregate}")
+        
+        tier = self.select_tier(resolution, start)
+        if tier is None:
+            timestamps, values = self.store.query_downsampled(metric, tags, start, end, resolution, aggregate)
+            return timestamps, values, "raw"
+        
+        watermark = self.load_state().get(tier["name"])
+        tier_end = end if watermark is None or end is None else min(end, watermark - 1e-6)
+        if watermark is not None:
+            tier_timestamps, tier_values = self.tier_stores[tier["name"]].query(f"{metric}:{aggregate}", tags, start, tier_end)
+        else:
+            tier_timestamps, tier_values = empty_series()
+        
+        # Phần chưa được tổng hợp
+        raw_start = watermark if watermark is not None else start
+        if end is None or raw_start is None or raw_start <= end:
+            raw_timestamps, raw_values = self.store.query_downsampled(
+                metric, tags, raw_start, end, tier["step"], aggregate
+            )
+            tier_timestamps = np.concatenate((tier_timestamps, raw_timestamps))
+            tier_values = np.concatenate((tier_values, raw_values))
+        
+        if tier["step"] < resolution and len(tier_timestamps):
+            # Gộp tiếp các điểm của tầng về đúng resolution (avg không trọng số, p95 lấy giá trị lớn nhất của các khoảng)
+            _, tier_timestamps, merged = bucket_aggregates(
+                np.zeros(len(tier_values), dtype=np.uint32), tier_timestamps, tier_values, resolution,
+                ("max" if aggregate in ("max", "p95") else aggregate,)
+            )
+            tier_values = next(iter(merged.values()))
+        return tier_timestamps, tier_values, tier["name"]
+
+
+# Singleton instance
+metric_rollups = MetricRollups()
@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module lưu trữ chuỗi thời gian (time-series) nhúng, ghi vào file trên đĩa, không cần dịch vụ ngoài.
+Lưu lịch sử các chỉ số AlertMonitor và BandwidthMonitor thu được (CPU, Memory, rx/tx của interface,
+RTT thăm dò TCP) để không bị mất khi khởi động lại và để dashboard vẽ biểu đồ.
+
+Cách lưu:
+- Mỗi chuỗi (tên chỉ số + tags, ví dụ rx_bits {router: 1, interface: ether1}) có một ID,
+  danh sách chuỗi được ghi thêm (append-only) vào series.log.
+- Mỗi khoảng thời gian (segment_seconds) có một file segment. Điểm mới được gom trong bộ đệm
+  và ghi thêm một lần vào file "<start>_<end>.log" (bản ghi nhị phân cố định: series, timestamp, value).
+- Segment đã qua (sau seal_delay) được đóng gói thành file "<start>_<end>.seg": dữ liệu của mỗi chuỗi
+  được nén thành các block (monitoring.metric_codec) kèm chỉ mục vị trí của từng chuỗi, đọc bằng
+  memory-map nên truy vấn một chuỗi chỉ giải nén các block của chuỗi đó trong khoảng thời gian cần.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+from monitoring.metric_codec import encode_series, decode_series, decode_block, block_headers
+
+logger = logging.getLogger('metric_store')
+
+# Thư mục lưu mặc định (tương đối với thư mục gốc của project)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join("data", "metrics")
+
+# Bản ghi trong file .log
+RECORD_DTYPE = np.dtype([('series', '<u4'), ('timestamp', '<f8'), ('value', '<f8')])
+# Điểm dữ liệu không nén
+POINT_DTYPE = np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+# Chỉ mục chuỗi trong file .seg: phiên bản 1 lưu điểm không nén (offset/count tính theo điểm),
+# phiên bản 2 lưu các block nén (offset/size tính theo byte)
+INDEX_DTYPE = np.dtype([('series', '<u4'), ('offset', '<i8'), ('count', '<i8'), ('start', '<f8'), ('end', '<f8')])
+COMPRESSED_INDEX_DTYPE = np.dtype([
+    ('series', '<u4'), ('offset', '<i8'), ('size', '<i8'), ('count', '<i8'), ('start', '<f8'), ('end', '<f8')
+])
+# Header file .seg: magic (theo phiên bản) + số chuỗi trong chỉ mục
+SEGMENT_MAGIC = b'MTSSEG1\0'
+COMPRESSED_SEGMENT_MAGIC = b'MTSSEG2\0'
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('series_count', '<u8')])
+
+# Các phép gộp của truy vấn giảm mẫu
+AGGREGATES = ("avg", "min", "max", "sum", "count", "last", "p95")
+
+
+def empty_series():
+    """Kết quả truy vấn rỗng: (timestamps, values)"""
+    return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+
+
+def bucket_aggregates(series, timestamps, values, step, aggregates):
+    """
+    Gộp các điểm theo (chuỗi, khoảng step giây căn theo epoch), tính đồng thời cho mọi chuỗi
+    
+    Args:
+        series, timestamps, values (ndarray): Các điểm (không cần sắp xếp)
+        step (float): Độ dài mỗi khoảng (giây)
+        aggregates (iterable): Các phép gộp trong AGGREGATES
+    
+    Returns:
+        tuple: (ID chuỗi, thời điểm bắt đầu khoảng, dict phép gộp -> mảng giá trị) của các khoảng có dữ liệu
+    """
+    buckets = np.floor(timestamps / step) * step
+    order = np.lexsort((timestamps, buckets, series))
+    series, buckets, values = series[order], buckets[order], values[order]
+    
+    changed = (series[1:] != series[:-1]) | (buckets[1:] != buckets[:-1])
+    first = np.flatnonzero(np.concatenate(([True], changed)))
+    counts = np.diff(np.append(first, len(values)))
+    
+    result = {}
+    for aggregate in aggregates:
+        if aggregate == "avg":
+            result[aggregate] = np.add.reduceat(values, first) / counts
+        elif aggregate == "min":
+            result[aggregate] = np.minimum.reduceat(values, first)
+        elif aggregate == "max":
+            result[aggregate] = np.maximum.reduceat(values, first)
+        elif aggregate == "sum":
+            result[aggregate] = np.add.reduceat(values, first)
+        elif aggregate == "count":
+            result[aggregate] = counts.astype(np.float64)
+        elif aggregate == "last":
+            result[aggregate] = values[first + counts - 1]
+        elif aggregate == "p95":
+            # Phân vị 95 theo nearest-rank: sắp xếp giá trị trong từng khoảng
+            ranked = values[np.lexsort((values, buckets, series))]
+            result[aggregate] = ranked[first + np.ceil(0.95 * counts).astype(np.int64) - 1]
+        else:
+            raise ValueError(f"Phép gộp không hợp lệ: {aggregate}")
+    return series[first], buckets[first], result
+
+
+class MetricStore:
+    """
+    Kho chuỗi thời gian trên file. Một tiến trình ghi (AlertMonitor), nhiều tiến trình
+    có thể đọc cùng thư mục (ví dụ app.py).
+    """
+    
+    def __init__(self, path=None, segment_seconds=3600, flush_interval=5, flush_size=50000, seal_delay=300):
+        """
+        Khởi tạo
+        
+        Args:
+            path (str): Thư mục lưu dữ liệu (tương đối với thư mục gốc project nếu không phải đường dẫn tuyệt đối)
+            segment_seconds (int): Khoảng thời gian của mỗi file segment
+            flush_interval (float): Thời gian tối đa (giây) điểm mới nằm trong bộ đệm trước khi ghi ra file
+            flush_size (int): Số điểm trong bộ đệm thì ghi ra file ngay
+            seal_delay (float): Thời gian chờ (giây) sau khi segment kết thúc trước khi đóng gói (nhận điểm đến muộn)
+        """
+        self.path = self._resolve_path(path or DEFAULT_PATH)
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.seal_delay = seal_delay
+        self.lock = threading.RLock()
+        self.buffer = []  # Các điểm (series, timestamp, value) chưa ghi ra file
+        self.next_flush = time.monotonic() + flush_interval
+        self._reset_series()
+        self.sealed = {}  # Đường dẫn file .seg -> (mtime, chỉ mục, dữ liệu memory-map)
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "metric_store" của alert_monitor_config.json)"""
+        with self.lock:
+            path = self._resolve_path(config.get("path", DEFAULT_PATH))
+            if path != self.path:
+                self._flush()
+                self.path = path
+                self._reset_series()
+                self.sealed = {}
+            self.segment_seconds = config.get("segment_seconds", self.segment_seconds)
+            self.flush_interval = config.get("flush_interval", self.flush_interval)
+            self.flush_size = config.get("flush_size", self.flush_size)
+            self.seal_delay = config.get("seal_delay", self.seal_delay)
+    
+    @staticmethod
+    def _resolve_path(path):
+        return path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+    
+    def _reset_series(self):
+        self.series_ids = {}  # (metric, tags) -> ID chuỗi
+        self.series_info = []  # ID chuỗi -> (metric, tags)
+        self.series_log_size = 0  # Số byte của series.log đã đọc
+    
+    @staticmethod
+    def _series_key(metric, tags):
+        return metric, tuple(sorted((str(key), str(value)) for key, value in (tags or {}).items()))
+    
+    def _load_series(self):
+        """Đọc các chuỗi mới được thêm vào series.log (bởi tiến trình này hoặc tiến trình ghi khác)"""
+        series_path = os.path.join(self.path, "series.log")
+        try:
+            if os.path.getsize(series_path) <= self.series_log_size:
+                return
+            with open(series_path, 'rb') as f:
+                f.seek(self.series_log_size)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        
+        # Chỉ đọc các dòng đã ghi xong
+        data = data[:data.rfind(b'\n') + 1]
+        self.series_log_size += len(data)
+        for line in data.splitlines():
+            entry = json.loads(line)
+            key = self._series_key(entry["metric"], entry["tags"])
+            self.series_ids[key] = entry["id"]
+            self.series_info.append(key)
+    
+    def _series_id(self, metric, tags, create=False):
+        """ID của chuỗi, tạo mới nếu create (None nếu chưa có)"""
+        key = self._series_key(metric, tags)
+        series_id = self.series_ids.get(key)
+        if series_id is not None:
+            return series_id
+        
+        self._load_series()
+        series_id = self.series_ids.get(key)
+        if series_id is not None or not create:
+            return series_id
+        
+        os.makedirs(self.path, exist_ok=True)
+        series_id = len(self.series_info)
+        line = json.dumps({"id": series_id, "metric": metric, "tags": dict(key[1])}, ensure_ascii=False) + "\n"
+        with open(os.path.join(self.path, "series.log"), 'ab') as f:
+            f.write(line.encode('utf-8'))
+        self.series_log_size += len(line.encode('utf-8'))
+        self.series_ids[key] = series_id
+        self.series_info.append(key)
+        return series_id
+    
+    def get_series_id(self, metric, tags, create=False):
+        """ID của chuỗi, tạo mới nếu create (None nếu chưa có)"""
+        with self.lock:
+            return self._series_id(metric, tags, create)
+    
+    def get_series(self, series_id):
+        """(metric, tags) của chuỗi theo ID, None nếu không có"""
+        with self.lock:
+            if series_id >= len(self.series_info):
+                self._load_series()
+            if series_id >= len(self.series_info):
+                return None
+            metric, tags = self.series_info[series_id]
+            return metric, dict(tags)
+    
+    def series(self, metric=None):
+        """
+        Danh sách chuỗi đang có
+        
+        Args:
+            metric (str): Chỉ lấy chuỗi của chỉ số này
+        
+        Returns:
+            list: Các dict {metric, tags}
+        """
+        with self.lock:
+            self._load_series()
+            return [
+                {"metric": name, "tags": dict(tags)}
+                for name, tags in self.series_info if metric is None or name == metric
+            ]
+    
+    def write(self, metric, tags, value, timestamp=None):
+        """Thêm một điểm (timestamp là epoch giây, mặc định thời điểm hiện tại)"""
+        self.write_many([(metric, tags, value, timestamp)])
+    
+    def write_many(self, points):
+        """Thêm nhiều điểm (metric, tags, value, timestamp)"""
+        now = time.time()
+        with self.lock:
+            for metric, tags, value, timestamp in points:
+                series_id = self._series_id(metric, tags, create=True)
+                self.buffer.append((series_id, now if timestamp is None else timestamp, value))
+            
+            if len(self.buffer) >= self.flush_size or time.monotonic() >= self.next_flush:
+                self._flush()
+    
+    def flush(self):
+        """Ghi các điểm trong bộ đệm ra file và đóng gói các segment đã qua"""
+        with self.lock:
+            self._flush()
+    
+    def close(self):
+        """Ghi nốt dữ liệu trong bộ đệm"""
+        self.flush()
+    
+    def append_records(self, records):
+        """Ghi thẳng một mảng bản ghi (RECORD_DTYPE, ID chuỗi đã có) ra file, dùng cho ghi hàng loạt"""
+        with self.lock:
+            self._write_records(records)
+    
+    def _flush(self):
+        self.next_flush = time.monotonic() + self.flush_interval
+        if self.buffer:
+            records = np.array(self.buffer, dtype=RECORD_DTYPE)
+            self.buffer = []
+            self._write_records(records)
+        
+        self._seal_due()
+    
+    def _write_records(self, records):
+        """Ghi thêm vào file .log của từng segment (một lần ghi cho mỗi segment)"""
+        if not len(records):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        starts = (records['timestamp'] // self.segment_seconds).astype(np.int64) * self.segment_seconds
+        for start in np.unique(starts):
+            path = self._segment_path(int(start), int(start) + self.segment_seconds, ".log")
+            with open(path, 'ab') as f:
+                f.write(records[starts == start].tobytes())
+    
+    def delete_before(self, timestamp):
+        """
+        Xóa các segment kết thúc trước timestamp (dữ liệu hết hạn lưu trữ)
+        
+        Returns:
+            int: Số file đã xóa
+        """
+        removed = 0
+        with self.lock:
+            for _, end, _, path in self._segments():
+                if end > timestamp:
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                self.sealed.pop(path, None)
+        if removed:
+            logger.info(f"Đã xóa {removed} segment hết hạn trong {self.path}")
+        return removed
+    
+    def first_timestamp(self):
+        """Thời điểm bắt đầu của segment cũ nhất, None nếu chưa có dữ liệu"""
+        with self.lock:
+            segments = self._segments()
+        return segments[0][0] if segments else None
+    
+    def _segment_path(self, start, end, extension):
+        return os.path.join(self.path, f"{start}_{end}{extension}")
+    
+    def _segments(self, start=None, end=None):
+        """
+        Các file segment có dữ liệu trong khoảng [start, end]
+        
+        Returns:
+            list: Các tuple (bắt đầu, kết thúc, phần mở rộng, đường dẫn), theo thứ tự thời gian
+        """
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        
+        segments = []
+        for name in names:
+            stem, extension = os.path.splitext(name)
+            if extension not in (".log", ".seg") or "_" not in stem:
+                continue
+            try:
+                segment_start, segment_end = (int(part) for part in stem.split("_"))
+            except ValueError:
+                continue
+            if (start is not None and segment_end <= start) or (end is not None and segment_start > end):
+                continue
+            segments.append((segment_start, segment_end, extension, os.path.join(self.path, name)))
+        return sorted(segments)
+    
+    def _seal_due(self):
+        """Đóng gói các segment .log đã kết thúc quá seal_delay"""
+        deadline = time.time() - self.seal_delay
+        for start, end, extension, path in self._segments():
+            if extension == ".log" and end <= deadline:
+                try:
+                    self._seal(start, end)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Lỗi khi đóng gói segment {path}: {e}")
+    
+    def _seal(self, start, end):
+        """Gộp file .log (và file .seg cũ nếu có điểm đến muộn) thành file .seg"""
+        log_path = self._segment_path(start, end, ".log")
+        segment_path = self._segment_path(start, end, ".seg")
+        
+        records = np.fromfile(log_path, dtype=RECORD_DTYPE, count=os.path.getsize(log_path) // RECORD_DTYPE.itemsize)
+        if os.path.exists(segment_path):
+            records = np.concatenate((self._read_sealed_records(segment_path), records))
+        
+        self._write_sealed(segment_path, records)
+        os.remove(log_path)
+        logger.debug(f"Đã đóng gói segment {os.path.basename(segment_path)} ({len(records)} điểm)")
+    
+    def _read_sealed_records(self, path):
+        """Toàn bộ điểm của file .seg dưới dạng bản ghi"""
+        compressed, index, data = self._open_sealed(path)
+        records = np.empty(int(index['count'].sum()), dtype=RECORD_DTYPE)
+        records['series'] = np.repeat(index['series'], index['count'])
+        if not compressed:
+            records['timestamp'] = data['timestamp']
+            records['value'] = data['value']
+            return records
+        
+        position = 0
+        for entry in index:
+            timestamps, values = decode_series(data[entry['offset']:entry['offset'] + entry['size']])
+            records['timestamp'][position:position + len(values)] = timestamps
+            records['value'][position:position + len(values)] = values
+            position += len(values)
+        return records
+    
+    def _write_sealed(self, path, records):
+        """Ghi file .seg: header, chỉ mục chuỗi, các block nén của từng chuỗi (theo thứ tự thời gian)"""
+        records = records[np.lexsort((records['timestamp'], records['series']))]
+        series, offsets = np.unique(records['series'], return_index=True)
+        counts = np.diff(np.append(offsets, len(records)))
+        
+        index = np.zeros(len(series), dtype=COMPRESSED_INDEX_DTYPE)
+        index['series'] = series
+        index['count'] = counts
+        index['start'] = records['timestamp'][offsets]
+        index['end'] = records['timestamp'][offsets + counts - 1]
+        
+        blocks = []
+        position = 0
+        for entry, offset, count in zip(index, offsets, counts):
+            chunk = records[offset:offset + count]
+            encoded = encode_series(chunk['timestamp'], chunk['value'])
+            entry['offset'], entry['size'] = position, len(encoded)
+            blocks.append(encoded)
+            position += len(encoded)
+        
+        header = np.array([(COMPRESSED_SEGMENT_MAGIC, len(index))], dtype=HEADER_DTYPE)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(index.tobytes())
+            f.writelines(blocks)
+        os.replace(temporary_path, path)
+        self.sealed.pop(path, None)
+    
+    def _open_sealed(self, path):
+        """
+        Chỉ mục và dữ liệu (memory-map) của file .seg, được cache theo thời điểm sửa file
+        
+        Returns:
+            tuple: (nén hay không, chỉ mục, dữ liệu: bytes các block nén hoặc mảng điểm không nén)
+        """
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.sealed.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        header = data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header['magic'] == COMPRESSED_SEGMENT_MAGIC.rstrip(b'\0'):
+            compressed, index_dtype = True, COMPRESSED_INDEX_DTYPE
+        elif header['magic'] == SEGMENT_MAGIC.rstrip(b'\0'):
+            compressed, index_dtype = False, INDEX_DTYPE
+        else:
+            raise ValueError(f"File segment không hợp lệ: {path}")
+        
+        index_end = HEADER_DTYPE.itemsize + int(header['series_count']) * index_dtype.itemsize
+        index = np.array(data[HEADER_DTYPE.itemsize:index_end].view(index_dtype))
+        body = data[index_end:] if compressed else data[index_end:].view(POINT_DTYPE)
+        self.sealed[path] = (mtime, (compressed, index, body))
+        return compressed, index, body
+    
+    def query(self, metric, tags=None, start=None, end=None):
+        """
+        Các điểm của một chuỗi trong khoảng thời gian
+        
+        Args:
+            metric (str): Tên chỉ số (cpu_load, memory_percent, rx_bits, tx_bits, rtt_ms, ...)
+            tags (dict): Tags của chuỗi (ví dụ {"router": 1, "interface": "ether1"})
+            start, end (float): Khoảng thời gian (epoch giây), None là không giới hạn
+        
+        Returns:
+            tuple: (timestamps, values) là mảng NumPy theo thứ tự thời gian
+        """
+        with self.lock:
+            if self.buffer:
+                self._flush()
+            series_id = self._series_id(metric, tags)
+            if series_id is None:
+                return empty_series()
+            
+            parts = []
+            for _, _, extension, path in self._segments(start, end):
+                try:
+                    points = self._read_segment(path, extension, series_id, start, end)
+                except FileNotFoundError:
+                    # Segment vừa được đóng gói bởi tiến trình ghi
+                    continue
+                if len(points):
+                    parts.append(points)
+        
+        if not parts:
+            return empty_series()
+        
+        points = np.concatenate(parts)
+        mask = np.ones(len(points), dtype=bool)
+        if start is not None:
+            mask &= points['timestamp'] >= start
+        if end is not None:
+            mask &= points['timestamp'] <= end
+        points = points[mask]
+        points = points[np.argsort(points['timestamp'], kind='stable')]
+        return points['timestamp'].copy(), points['value'].copy()
+    
+    def _sealed_entry(self, path, series_id):
+        """(nén hay không, mục chỉ mục, dữ liệu) của chuỗi trong file .seg, None nếu không có"""
+        compressed, index, data = self._open_sealed(path)
+        position = np.searchsorted(index['series'], series_id)
+        if position >= len(index) or index['series'][position] != series_id:
+            return None
+        return compressed, index[position], data
+    
+    def _read_segment(self, path, extension, series_id, start=None, end=None):
+        """Các điểm của chuỗi trong một file segment (với file nén chỉ giải nén block trong khoảng [start, end])"""
+        if extension == ".seg":
+            sealed = self._sealed_entry(path, series_id)
+            if sealed is None:
+                return np.empty(0, dtype=POINT_DTYPE)
+            compressed, entry, data = sealed
+            offset = int(entry['offset'])
+            if not compressed:
+                return np.array(data[offset:offset + int(entry['count'])])
+            
+            timestamps, values = decode_series(data[offset:offset + int(entry['size'])], start, end)
+            points = np.empty(len(values), dtype=POINT_DTYPE)
+            points['timestamp'] = timestamps
+            points['value'] = values
+            return points
+        
+        size = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        if not size:
+            return np.empty(0, dtype=POINT_DTYPE)
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(size,))
+        records = records[records['series'] == series_id]
+        points = np.empty(len(records), dtype=POINT_DTYPE)
+        points['timestamp'] = records['timestamp']
+        points['value'] = records['value']
+        return points
+    
+    def aggregate(self, metric, tags=None, start=None, end=None):
+        """
+        Các giá trị tổng hợp của chuỗi trong khoảng thời gian. Block nén nằm trọn trong khoảng
+        được tính từ header (không giải nén), chỉ block ở hai đầu khoảng cần giải nén.
+        
+        Returns:
+            dict: {count, min, max, sum, avg}, min/max/avg là None nếu không có điểm
+        """
+        count, total = 0, 0.0
+        minimum, maximum = np.inf, -np.inf
+        
+        def add(values):
+            nonlocal count, total, minimum, maximum
+            if len(values):
+                count += len(values)
+                total += float(values.sum())
+                minimum = min(minimum, float(values.min()))
+                maximum = max(maximum, float(values.max()))
+        
+        with self.lock:
+            if self.buffer:
+                self._flush()
+            series_id = self._series_id(metric, tags)
+            segments = self._segments(start, end) if series_id is not None else []
+            
+            for _, _, extension, path in segments:
+                try:
+                    sealed = self._sealed_entry(path, series_id) if extension == ".seg" else None
+                    if sealed is None or not sealed[0]:
+                        points = self._read_segment(path, extension, series_id)
+                        inside = np.ones(len(points), dtype=bool)
+                        if start is not None:
+                            inside &= points['timestamp'] >= start
+                        if end is not None:
+                            inside &= points['timestamp'] <= end
+                        add(points['value'][inside])
+                        continue
+                    
+                    _, entry, data = sealed
+                    blocks = data[int(entry['offset']):int(entry['offset']) + int(entry['size'])]
+                    for offset, header in block_headers(blocks):
+                        if (start is not None and header['end'] < start) or (end is not None and header['start'] > end):
+                            continue
+                        if (start is None or header['start'] >= start) and (end is None or header['end'] <= end):
+                            count += int(header['count'])
+                            total += float(header['sum'])
+                            minimum = min(minimum, float(header['min']))
+                            maximum = max(maximum, float(header['max']))
+                            continue
+                        timestamps, values, _ = decode_block(blocks, offset)
+                        inside = np.ones(len(values), dtype=bool)
+                        if start is not None:
+                            inside &= timestamps >= start
+                        if end is not None:
+                            inside &= timestamps <= end
+                        add(values[inside])
+                except FileNotFoundError:
+                    continue
+        
+        if not count:
+            return {"count": 0, "min": None, "max": None, "sum": 0.0, "avg": None}
+        return {"count": count, "min": minimum, "max": maximum, "sum": total, "avg": total / count}
+    
+    def scan(self, start, end):
+        """
+        Tất cả điểm của mọi chuỗi trong khoảng [start, end)
+        
+        Returns:
+            ndarray: Các bản ghi RECORD_DTYPE (không sắp xếp)
+        """
+        parts = []
+        with self.lock:
+            if self.buffer:
+                self._flush()
+            
+            for _, _, extension, path in self._segments(start, end):
+                if extension == ".log":
+                    size = os.path.getsize(path) // RECORD_DTYPE.itemsize
+                    if size:
+                        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(size,))
+                        parts.append(np.array(records[(records['timestamp'] >= start) & (records['timestamp'] < end)]))
+                    continue
+                
+                compressed, index, data = self._open_sealed(path)
+                for entry in index[(index['end'] >= start) & (index['start'] < end)]:
+                    offset = int(entry['offset'])
+                    if compressed:
+                        timestamps, values = decode_series(data[offset:offset + int(entry['size'])], start, end)
+                    else:
+                        points = data[offset:offset + int(entry['count'])]
+                        timestamps, values = points['timestamp'], points['value']
+                    inside = (timestamps >= start) & (timestamps < end)
+                    records = np.empty(int(inside.sum()), dtype=RECORD_DTYPE)
+                    records['series'] = entry['series']
+                    records['timestamp'] = timestamps[inside]
+                    records['value'] = values[inside]
+                    parts.append(records)
+        
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+    
+    def query_downsampled(self, metric, tags=None, start=None, end=None, step=60, aggregate="avg"):
+        """
+        Các điểm của chuỗi gộp theo từng khoảng step giây (căn theo epoch)
+        
+        Args:
+            step (float): Độ dài mỗi khoảng (giây)
+            aggregate (str): Phép gộp: avg, min, max, sum, count, last, p95
+        
+        Returns:
+            tuple: (thời điểm bắt đầu của các khoảng có dữ liệu, giá trị gộp)
+        """
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Phép gộp không hợp lệ: {aggregate}")
+        
+        timestamps, values = self.query(metric, tags, start, end)
+        if not len(timestamps):
+            return empty_series()
+        
+        _, bucket_starts, result = bucket_aggregates(
+            np.zeros(len(values), dtype=np.uint32), timestamps, values, step, (aggregate,)
+        )
+        return bucket_starts, result[aggregate]
+
+
+# Singleton instance
+metric_store = MetricStore()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module cache thông tin router (tên, địa chỉ, cổng API...) lấy từ danh sách /connections.
+Giúp các bước kiểm tra tra cứu tên/địa chỉ router mà không cần gọi thêm API cho từng router.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import api_client
+
+logger = logging.getLogger('router_metadata')
+
+
+class RouterMetadataCache:
+    """
+    Cache thông tin router theo ID, được nạp từ danh sách kết nối.
+    Cache được làm mới khi hết hạn (TTL) hoặc mỗi khi danh sách router được tải lại.
+    """
+    
+    def __init__(self, ttl=300, client=None):
+        """
+        Khởi tạo cache
+        
+        Args:
+            ttl (int): Thời gian (giây) trước khi cache bị coi là cũ và được tải lại khi tra cứu
+            client (ApiClient): Client API dùng để tải danh sách router (mặc định dùng client dùng chung)
+        """
+        self.ttl = ttl
+        self.client = client or api_client
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()  # Chỉ một thread tải lại danh sách khi cache hết hạn
+        self.routers = {}  # router_id -> thông tin router
+        self.fingerprint = None
+        self.updated_at = None
+    
+    def update(self, routers):
+        """
+        Nạp cache từ danh sách router vừa lấy được
+        
+        Returns:
+            bool: True nếu danh sách router thay đổi so với lần nạp trước
+        """
+        fingerprint = hashlib.sha1(json.dumps(routers, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        
+        with self.lock:
+            changed = fingerprint != self.fingerprint
+            if changed:
+                self.routers = {router.get('id'): router for router in routers if router.get('id')}
+                self.fingerprint = fingerprint
+            self.updated_at = time.monotonic()
+        
+        if changed:
+            logger.info(f"Đã cập nhật cache thông tin router ({len(self.routers)} router)")
+        return changed
+    
+    def refresh(self, timeout=None):
+        """
+        Tải lại danh sách router từ API và cập nhật cache
+        
+        Returns:
+            list: Danh sách router, hoặc None nếu không tải được
+        """
+        try:
+            response = self.client.get("/connections", timeout=timeout)
+            if response.status_code == 200:
+                routers = response.json()
+                self.update(routers)
+                return routers
+            logger.error(f"Lỗi khi lấy danh sách router: {response.status_code}")
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy danh sách router: {e}")
+        return None
+    
+    def is_stale(self):
+        """Kiểm tra cache đã hết hạn chưa"""
+        return self.updated_at is None or time.monotonic() - self.updated_at >= self.ttl
+    
+    def get(self, router_id, refresh=True):
+        """
+        Lấy thông tin router theo ID
+        
+        Args:
+            router_id: ID router
+            refresh (bool): Tải lại danh sách nếu cache đã hết hạn
+        """
+        if refresh and self.is_stale() and self.refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self.refresh_lock.release()
+        
+        with self.lock:
+            return self.routers.get(router_id)
+    
+    def get_all(self):
+        """Danh sách thông tin tất cả router trong cache (không tải lại)"""
+        with self.lock:
+            return list(self.routers.values())
+    
+    def get_name(self, router_id, refresh=True):
+        """Lấy tên router, trả về 'Router #<id>' nếu không có trong cache"""
+        router = self.get(router_id, refresh)
+        if router:
+            return router.get('name', f'Router #{router_id}')
+        return f"Router #{router_id}"
+    
+    def get_address(self, router_id, refresh=True):
+        """Lấy địa chỉ IP/hostname của router, None nếu không có trong cache"""
+        router = self.get(router_id, refresh)
+        return router.get('address') if router else None
+
+
+# Singleton instance
+router_metadata = RouterMetadataCache()
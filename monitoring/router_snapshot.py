@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module thu thập snapshot dữ liệu của router trong mỗi chu kỳ giám sát.
+Mỗi snapshot gồm trạng thái kết nối, tài nguyên, interfaces (kèm bộ đếm rxBytes/txBytes)
+và các phần tùy chọn (firewall, DHCP, VPN, wireless). Tất cả các bước kiểm tra của
+AlertMonitor và BandwidthMonitor đánh giá trên cùng một snapshot thay vì tự gọi API riêng.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import api_client
+
+logger = logging.getLogger('router_snapshot')
+
+# Endpoint trả về toàn bộ snapshot trong một request (nếu API hỗ trợ)
+SNAPSHOT_PATH = "/routers/{router_id}/snapshot"
+
+# Đường dẫn API của từng phần khi phải lấy riêng lẻ
+SECTION_PATHS = {
+    "status": "/connections/{router_id}/status",
+    "resources": "/routers/{router_id}/resources",
+    "interfaces": "/routers/{router_id}/interfaces",
+    "firewall": "/routers/{router_id}/firewall",
+    "dhcp": "/routers/{router_id}/dhcp",
+    "vpn": "/routers/{router_id}/vpn",
+    "wireless": "/routers/{router_id}/wireless",
+}
+
+
+def is_json_content_type(content_type):
+    """Kiểm tra Content-Type của phản hồi có phải JSON không (SPA catch-all của server Node trả text/html)"""
+    return "json" in (content_type or "").lower()
+
+
+def build_snapshot(router_id, sections, errors=None):
+    """
+    Tạo snapshot từ dữ liệu các phần đã lấy được
+    
+    Args:
+        router_id: ID router
+        sections (dict): Tên phần -> dữ liệu JSON
+        errors (dict): Tên phần -> mô tả lỗi của các phần không lấy được
+    """
+    status = sections.get("status")
+    return {
+        "router_id": router_id,
+        "timestamp": time.time(),
+        "connected": status.get("connected", False) if status is not None else None,
+        "sections": sections,
+        "errors": errors or {},
+    }
+
+
+class RouterSnapshotFetcher:
+    """
+    Lấy snapshot của router: dùng một request tới SNAPSHOT_PATH khi API hỗ trợ,
+    nếu không thì lấy từng phần một lần duy nhất trong chu kỳ.
+    Snapshot gần nhất của mỗi router được giữ lại để các monitor khác dùng chung.
+    """
+    
+    def __init__(self, client=None):
+        """Khởi tạo fetcher"""
+        self.client = client or api_client
+        self.lock = threading.Lock()
+        self.snapshots = {}  # router_id -> snapshot gần nhất
+        self.snapshot_endpoint_supported = None  # None = chưa biết
+    
+    def fetch(self, router_id, sections, timeout=None):
+        """
+        Lấy snapshot mới của router
+        
+        Args:
+            router_id: ID router
+            sections (list): Các phần cần lấy, "status" luôn được lấy đầu tiên
+            timeout (float): Timeout cho mỗi request
+        
+        Returns:
+            dict: Snapshot (xem build_snapshot)
+        """
+        sections = self.normalize_sections(sections)
+        
+        snapshot = None
+        if self.snapshot_endpoint_supported is not False:
+            snapshot = self._fetch_combined(router_id, sections, timeout)
+        if snapshot is None:
+            snapshot = self._fetch_sections(router_id, sections, timeout)
+        
+        self.store(snapshot)
+        return snapshot
+    
+    def get(self, router_id, sections, max_age, timeout=None):
+        """Trả về snapshot đã lưu nếu đủ mới và có đủ các phần, nếu không thì lấy mới"""
+        snapshot = self.get_cached(router_id, sections, max_age)
+        if snapshot is not None:
+            return snapshot
+        return self.fetch(router_id, sections, timeout)
+    
+    def get_cached(self, router_id, sections, max_age):
+        """
+        Trả về snapshot đã lưu nếu chưa quá max_age giây và chứa đủ các phần yêu cầu.
+        Router mất kết nối chỉ cần có phần "status".
+        """
+        with self.lock:
+            snapshot = self.snapshots.get(router_id)
+        
+        if snapshot is None or time.time() - snapshot["timestamp"] > max_age:
+            return None
+        if snapshot["connected"] is False and "status" in snapshot["sections"]:
+            return snapshot
+        if all(section in snapshot["sections"] for section in sections):
+            return snapshot
+        return None
+    
+    def store(self, snapshot):
+        """Lưu snapshot (dùng cho cả snapshot lấy bằng engine asyncio)"""
+        with self.lock:
+            self.snapshots[snapshot["router_id"]] = snapshot
+    
+    def section_path(self, section, router_id):
+        """Đường dẫn API của một phần"""
+        return SECTION_PATHS[section].format(router_id=router_id)
+    
+    def combined_request(self, router_id, sections):
+        """Đường dẫn và tham số cho request lấy toàn bộ snapshot"""
+        return SNAPSHOT_PATH.format(router_id=router_id), {"sections": ",".join(sections)}
+    
+    def mark_combined_unsupported(self):
+        """Ghi nhận API không có endpoint snapshot, các lần sau lấy từng phần"""
+        if self.snapshot_endpoint_supported is not False:
+            logger.info("API không hỗ trợ endpoint snapshot, chuyển sang lấy từng phần")
+        self.snapshot_endpoint_supported = False
+    
+    def parse_combined(self, router_id, sections, data):
+        """
+        Tạo snapshot từ phản hồi của endpoint snapshot.
+        Phản hồi không phải object JSON (ví dụ trang HTML của SPA catch-all với mã 200) được coi như
+        API không có endpoint snapshot: trả về None để lấy từng phần.
+        """
+        if not isinstance(data, dict):
+            self.mark_combined_unsupported()
+            return None
+        self.snapshot_endpoint_supported = True
+        return build_snapshot(router_id, {name: data[name] for name in sections if data.get(name) is not None})
+    
+    def normalize_sections(self, sections):
+        """Loại bỏ phần trùng lặp và đưa "status" lên đầu"""
+        ordered = ["status"]
+        for section in sections:
+            if section not in ordered:
+                ordered.append(section)
+        return ordered
+    
+    def _fetch_combined(self, router_id, sections, timeout):
+        """
+        Lấy snapshot bằng một request, trả về None nếu API không hỗ trợ endpoint snapshot.
+        Khi lỗi khác, trả về snapshot rỗng (trạng thái kết nối không xác định) thay vì thử lại từng phần.
+        """
+        path, params = self.combined_request(router_id, sections)
+        try:
+            response = self.client.get(path, timeout=timeout, params=params)
+            if response.status_code == 404:
+                self.mark_combined_unsupported()
+                return None
+            if response.status_code == 200:
+                data = None
+                if is_json_content_type(response.headers.get("Content-Type")):
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        pass
+                return self.parse_combined(router_id, sections, data)
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+        
+        logger.error(f"Lỗi khi lấy snapshot router #{router_id}: {error}")
+        return build_snapshot(router_id, {}, {"snapshot": error})
+    
+    def _fetch_sections(self, router_id, sections, timeout):
+        """Lấy từng phần của snapshot, bỏ qua các phần còn lại nếu router mất kết nối"""
+        data = {}
+        errors = {}
+        
+        for section in sections:
+            try:
+                response = self.client.get(self.section_path(section, router_id), timeout=timeout)
+                if response.status_code == 200:
+                    data[section] = response.json()
+                else:
+                    errors[section] = f"HTTP {response.status_code}"
+            except Exception as e:
+                errors[section] = str(e)
+            
+            if section in errors:
+                logger.error(f"Lỗi khi lấy thông tin {section} router #{router_id}: {errors[section]}")
+            
+            # Không cần lấy dữ liệu khác khi router không kết nối
+            if section == "status" and not data.get("status", {}).get("connected", False):
+                break
+        
+        return build_snapshot(router_id, data, errors)
+
+
+# Singleton instance
+router_snapshots = RouterSnapshotFetcher()
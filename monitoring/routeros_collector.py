@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module thu thập dữ liệu trực tiếp từ router qua RouterOS API (cổng 8728) bằng thư viện routeros_api,
+không đi qua API Node.js. Mỗi router có một phiên API đã đăng nhập được giữ lại giữa các lần kiểm tra.
+Dữ liệu được chuyển sang cùng định dạng snapshot với RouterSnapshotFetcher để AlertMonitor
+có thể dùng làm nguồn dữ liệu thay thế (cấu hình "data_source": "routeros").
+
+Thông tin đăng nhập:
+    Tên đăng nhập lấy từ bản ghi kết nối, nếu không có thì dùng MIKROTIK_USERNAME.
+    Mật khẩu không được API Node.js trả về, lấy từ biến môi trường MIKROTIK_PASSWORD_<router_id>
+    hoặc MIKROTIK_PASSWORD.
+"""
+
+import os
+import sys
+import logging
+import threading
+
+import routeros_api
+from routeros_api.exceptions import (RouterOsApiError, RouterOsApiConnectionError, RouterOsApiCommunicationError,
+                                     RouterOsApiParsingError)
+from dotenv import load_dotenv
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.router_metadata import router_metadata
+from monitoring.router_snapshot import router_snapshots, build_snapshot
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+logger = logging.getLogger('routeros_collector')
+
+# Cổng RouterOS API mặc định khi bản ghi kết nối không có cổng
+DEFAULT_API_PORT = 8728
+
+# Loại interface được coi là kết nối VPN
+VPN_INTERFACE_TYPES = ("pptp", "l2tp", "sstp", "ovpn", "pppoe", "wg", "ipip", "gre", "eoip")
+
+
+def to_int(value, default=0):
+    """Chuyển giá trị chuỗi của RouterOS sang số nguyên"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def to_bool(value):
+    """Chuyển giá trị 'true'/'yes' của RouterOS sang bool"""
+    return str(value).lower() in ("true", "yes")
+
+
+class RouterOSLoginError(RouterOsApiError):
+    """Router từ chối đăng nhập (sai tên đăng nhập/mật khẩu hoặc tài khoản không có quyền API)"""
+
+
+def router_message(error):
+    """Thông báo lỗi (=message=) router trả về cho một lệnh bị !trap"""
+    message = error.original_message
+    return message.decode('utf-8', 'replace') if isinstance(message, bytes) else message
+
+
+def error_message(error):
+    """
+    Mô tả lỗi RouterOS API để ghi log và lưu vào snapshot: tên lớp lỗi kèm thông báo của router.
+    Không dùng str() của lỗi trả về từ router vì chuỗi đó chứa cả câu lệnh đã gửi
+    (với /login là cả mật khẩu), cũng như của lỗi phân tích câu trả lời (chứa nguyên câu trả lời).
+    """
+    if isinstance(error, RouterOsApiCommunicationError):
+        message = router_message(error)
+    elif isinstance(error, RouterOsApiParsingError):
+        message = None
+    else:
+        message = str(error)
+    return f"{type(error).__name__}: {message}" if message else type(error).__name__
+
+
+def parse_signal(value):
+    """Lấy cường độ tín hiệu (dBm) từ chuỗi dạng '-65' hoặc '-65@HT20-7'"""
+    return to_int(str(value or '').split('@')[0], None)
+
+
+def interface_record(interface):
+    """Chuyển một bản ghi /interface sang định dạng của API Node.js"""
+    return {
+        "id": interface.get('id', ''),
+        "name": interface.get('name', ''),
+        "type": interface.get('type', 'unknown'),
+        "mtu": to_int(interface.get('mtu')),
+        "actualMtu": to_int(interface.get('actual-mtu')),
+        "macAddress": interface.get('mac-address', ''),
+        "running": to_bool(interface.get('running')),
+        "disabled": to_bool(interface.get('disabled')),
+        "rxBytes": to_int(interface.get('rx-byte')),
+        "txBytes": to_int(interface.get('tx-byte')),
+        "rxPackets": to_int(interface.get('rx-packet')),
+        "txPackets": to_int(interface.get('tx-packet')),
+    }
+
+
+class RouterOSSession:
+    """Một phiên RouterOS API đã đăng nhập tới router, chỉ một thread dùng tại một thời điểm"""
+    
+    def __init__(self, host, port, username, password, timeout=10, use_ssl=False, plaintext_login=True):
+        """Khởi tạo phiên (chưa kết nối)"""
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self.pool = routeros_api.RouterOsApiPool(host, username=username, password=password, port=port,
+                                                 plaintext_login=plaintext_login, use_ssl=use_ssl)
+        self.pool.set_timeout(timeout)
+    
+    def api(self):
+        """
+        API của phiên, kết nối và đăng nhập lại nếu phiên đã bị đóng
+        
+        Raises:
+            RouterOSLoginError: Router từ chối đăng nhập
+        """
+        if self.pool.connected:
+            return self.pool.api
+        try:
+            return self.pool.get_api()
+        except RouterOsApiCommunicationError as e:
+            # Lỗi trả về cho lệnh /login: đóng socket đã mở, không giữ lại lỗi gốc (chứa mật khẩu)
+            self.pool.disconnect()
+            raise RouterOSLoginError(router_message(e)) from None
+    
+    def print(self, path, **queries):
+        """Chạy lệnh print trên menu path, kết nối (và đăng nhập) lại nếu phiên đã bị đóng"""
+        return self.api().get_resource(path).get(**queries)
+    
+    def call(self, path, command, **arguments):
+        """Chạy lệnh command (ví dụ monitor) trên menu path"""
+        return self.api().get_resource(path).call(command, arguments)
+    
+    def is_connected(self):
+        """Phiên đang mở"""
+        return self.pool.connected
+    
+    def close(self):
+        """Đóng phiên"""
+        if self.pool.connected:
+            self.pool.disconnect()
+
+
+class RouterOSCollector:
+    """
+    Giữ pool phiên RouterOS API (một phiên cho mỗi router) và lấy snapshot trực tiếp từ router.
+    Các router được thu thập song song từ nhiều thread, các lệnh trên cùng một router chạy tuần tự.
+    """
+    
+    def __init__(self, timeout=10, use_ssl=False, plaintext_login=True, metadata=None, snapshots=None):
+        """
+        Khởi tạo collector
+        
+        Args:
+            timeout (float): Timeout của socket API (giây)
+            use_ssl (bool): Dùng API-SSL (cổng 8729)
+            plaintext_login (bool): Đăng nhập kiểu mới (RouterOS >= 6.43), False để dùng challenge MD5
+            metadata (RouterMetadataCache): Nguồn địa chỉ/cổng router (mặc định cache dùng chung)
+            snapshots (RouterSnapshotFetcher): Nơi lưu snapshot để các monitor khác dùng chung
+        """
+        self.timeout = timeout
+        self.use_ssl = use_ssl
+        self.plaintext_login = plaintext_login
+        self.metadata = metadata or router_metadata
+        self.snapshots = snapshots or router_snapshots
+        self.lock = threading.Lock()
+        self.sessions = {}  # router_id -> RouterOSSession
+        
+        # Hàm lấy dữ liệu của từng phần snapshot
+        self.section_readers = {
+            "resources": self._read_resources,
+            "interfaces": self._read_interfaces,
+            "firewall": self._read_firewall,
+            "dhcp": self._read_dhcp,
+            "vpn": self._read_vpn,
+            "wireless": self._read_wireless,
+        }
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "routeros" của alert_monitor_config.json)"""
+        self.timeout = config.get("timeout", self.timeout)
+        self.use_ssl = config.get("use_ssl", self.use_ssl)
+        self.plaintext_login = config.get("plaintext_login", self.plaintext_login)
+    
+    def get_endpoint(self, router_id):
+        """Địa chỉ và cổng API của router, None nếu không có địa chỉ router"""
+        router = self.metadata.get(router_id, refresh=False)
+        if not router or not router.get('address'):
+            return None
+        return router['address'], to_int(router.get('port'), 0) or (8729 if self.use_ssl else DEFAULT_API_PORT)
+    
+    def create_session(self, router_id):
+        """
+        Tạo phiên mới (chưa kết nối) tới router, không đưa vào pool
+        
+        Returns:
+            RouterOSSession: Phiên, hoặc None nếu không có địa chỉ router
+        """
+        endpoint = self.get_endpoint(router_id)
+        if endpoint is None:
+            return None
+        
+        router = self.metadata.get(router_id, refresh=False)
+        username = router.get('username') or os.getenv("MIKROTIK_USERNAME", "admin")
+        password = os.getenv(f"MIKROTIK_PASSWORD_{router_id}", os.getenv("MIKROTIK_PASSWORD", ""))
+        return RouterOSSession(endpoint[0], endpoint[1], username, password, timeout=self.timeout,
+                               use_ssl=self.use_ssl, plaintext_login=self.plaintext_login)
+    
+    def get_session(self, router_id):
+        """
+        Lấy phiên của router trong pool, tạo mới nếu chưa có hoặc địa chỉ router đã thay đổi
+        
+        Returns:
+            RouterOSSession: Phiên, hoặc None nếu không có địa chỉ router
+        """
+        endpoint = self.get_endpoint(router_id)
+        if endpoint is None:
+            return None
+        
+        with self.lock:
+            session = self.sessions.get(router_id)
+            if session is not None and (session.host, session.port) == endpoint:
+                return session
+            if session is not None:
+                session.close()
+            
+            session = self.sessions[router_id] = self.create_session(router_id)
+            return session
+    
+    def fetch(self, router_id, sections, timeout=None):
+        """
+        Lấy snapshot trực tiếp từ router, cùng định dạng với RouterSnapshotFetcher.fetch
+        
+        Args:
+            router_id: ID router
+            sections (list): Các phần cần lấy ("status" luôn được lấy)
+            timeout (float): Không dùng (timeout được đặt theo phiên), giữ để cùng chữ ký với RouterSnapshotFetcher
+        
+        Returns:
+            dict: Snapshot
+        """
+        sections = self.snapshots.normalize_sections(sections)
+        session = self.get_session(router_id)
+        if session is None:
+            snapshot = build_snapshot(router_id, {}, {"status": "Không có địa chỉ router"})
+            self.snapshots.store(snapshot)
+            return snapshot
+        
+        data = {}
+        errors = {}
+        with session.lock:
+            for section in sections:
+                try:
+                    if section == "status":
+                        # Lệnh nhẹ để kiểm tra phiên còn hoạt động (tự kết nối lại nếu cần)
+                        session.print('/system/identity')
+                        data["status"] = {"connected": True}
+                    else:
+                        data[section] = self.section_readers[section](session)
+                except RouterOSLoginError as e:
+                    # Router trả lời nhưng từ chối đăng nhập: lỗi cấu hình, không phải mất kết nối.
+                    # Không có phần "status" nên trạng thái kết nối là không xác định (None)
+                    errors["auth"] = error_message(e)
+                    break
+                except (RouterOsApiError, OSError) as e:
+                    errors[section] = error_message(e)
+                    
+                    # Lỗi socket (timeout, từ chối kết nối) hoặc lỗi làm phiên bị đóng: router mất kết nối
+                    if isinstance(e, (RouterOsApiConnectionError, OSError)) or not session.is_connected():
+                        session.close()
+                        data["status"] = {"connected": False}
+                        break
+        
+        for section, error in errors.items():
+            if section == "auth":
+                logger.error(f"Router #{router_id} từ chối đăng nhập qua RouterOS API: {error}")
+            else:
+                logger.error(f"Lỗi khi lấy {section} router #{router_id} qua RouterOS API: {error}")
+        
+        snapshot = build_snapshot(router_id, data, errors)
+        self.snapshots.store(snapshot)
+        return snapshot
+    
+    def forget(self, router_ids):
+        """Đóng phiên của các router không còn trong danh sách"""
+        with self.lock:
+            for router_id in [router_id for router_id in self.sessions if router_id not in router_ids]:
+                self.sessions.pop(router_id).close()
+    
+    def close_all(self):
+        """Đóng tất cả phiên"""
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+    
+    def get_session_count(self):
+        """Số phiên đang mở"""
+        with self.lock:
+            return sum(1 for session in self.sessions.values() if session.is_connected())
+    
+    def _read_resources(self, session):
+        """Tài nguyên hệ thống, cùng trường với API Node.js (kèm memoryUsed/memoryTotal)"""
+        resource = (session.print('/system/resource') or [{}])[0]
+        free_memory = to_int(resource.get('free-memory'))
+        total_memory = to_int(resource.get('total-memory'))
+        return {
+            "cpuLoad": to_int(resource.get('cpu-load')),
+            "cpuCount": to_int(resource.get('cpu-count'), 1),
+            "uptime": resource.get('uptime', '0s'),
+            "version": resource.get('version', 'Unknown'),
+            "freeMemory": free_memory,
+            "totalMemory": total_memory,
+            "memoryUsed": total_memory - free_memory,
+            "memoryTotal": total_memory,
+            "freeHdd": to_int(resource.get('free-hdd-space')),
+            "totalHdd": to_int(resource.get('total-hdd-space')),
+            "boardName": resource.get('board-name', 'Unknown'),
+            "architecture": resource.get('architecture-name', 'Unknown'),
+        }
+    
+    def _read_interfaces(self, session):
+        """Danh sách interface kèm bộ đếm byte/packet và tốc độ đàm phán ("rate") của cổng ethernet đang chạy"""
+        interfaces = [interface_record(interface) for interface in session.print('/interface')]
+        
+        ethernet = [interface["name"] for interface in interfaces if interface["type"] == "ether" and interface["running"]]
+        if ethernet:
+            rates = self._read_link_rates(session, ethernet)
+            for interface in interfaces:
+                if interface["name"] in rates:
+                    interface["rate"] = rates[interface["name"]]
+        return interfaces
+    
+    def _read_link_rates(self, session, names):
+        """Tốc độ đàm phán của các cổng ethernet (một lệnh monitor cho tất cả cổng), ví dụ {"ether1": "1Gbps"}"""
+        try:
+            results = session.call('/interface/ethernet', 'monitor', numbers=','.join(names), once='')
+        except RouterOsApiCommunicationError as e:
+            # Router không hỗ trợ monitor (ví dụ CHR), dùng tốc độ ước tính
+            logger.debug(f"Không lấy được tốc độ đàm phán: {error_message(e)}")
+            return {}
+        return {result.get('name'): result['rate'] for result in results if result.get('rate')}
+    
+    def _read_firewall(self, session):
+        """Rule filter và NAT"""
+        def rules(path):
+            return [{
+                "id": rule.get('id', ''),
+                "chain": rule.get('chain', ''),
+                "action": rule.get('action', ''),
+                "srcAddress": rule.get('src-address', ''),
+                "dstAddress": rule.get('dst-address', ''),
+                "protocol": rule.get('protocol', ''),
+                "disabled": to_bool(rule.get('disabled')),
+                "comment": rule.get('comment', ''),
+            } for rule in session.print(path)]
+        
+        return {"filterRules": rules('/ip/firewall/filter'), "natRules": rules('/ip/firewall/nat')}
+    
+    def _read_dhcp(self, session):
+        """DHCP server"""
+        return {"servers": [{
+            "name": server.get('name', ''),
+            "interface": server.get('interface', ''),
+            "disabled": to_bool(server.get('disabled')),
+            "invalid": to_bool(server.get('invalid')),
+        } for server in session.print('/ip/dhcp-server')]}
+    
+    def _read_vpn(self, session):
+        """Interface VPN (PPP, tunnel)"""
+        interfaces = [interface_record(interface) for interface in session.print('/interface')]
+        return {"interfaces": [interface for interface in interfaces if interface["type"].startswith(VPN_INTERFACE_TYPES)]}
+    
+    def _read_wireless(self, session):
+        """Client wireless trong bảng đăng ký"""
+        return {"clients": [{
+            "interface": client.get('interface', ''),
+            "macAddress": client.get('mac-address', ''),
+            "signalStrength": parse_signal(client.get('signal-strength')),
+            "uptime": client.get('uptime', ''),
+        } for client in session.print('/interface/wireless/registration-table')]}
+
+
+# Singleton instance
+routeros_collector = RouterOSCollector()
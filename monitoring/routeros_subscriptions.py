@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module nhận sự kiện thay đổi từ router qua lệnh "listen" của RouterOS API.
+Mỗi router có một kết nối riêng (ngoài phiên dùng để lấy snapshot) đăng ký theo dõi
+menu /interface và /log; router đẩy về bản ghi interface mỗi khi thuộc tính thay đổi
+(ví dụ cờ running) và các dòng log mới, AlertMonitor không cần lấy lại toàn bộ
+danh sách interface sau mỗi chu kỳ. Khi kết nối bị ngắt, AlertMonitor quay lại kiểm tra
+interface bằng polling cho đến khi đăng ký lại được.
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+
+from routeros_api import base_api, sentence
+from routeros_api.exceptions import RouterOsApiError
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.routeros_collector import routeros_collector, interface_record, error_message
+
+logger = logging.getLogger('routeros_subscriptions')
+
+# Tag của các lệnh trên kết nối đăng ký -> loại sự kiện
+SEED_TAG = "interface-print"  # Lấy trạng thái hiện tại trước khi nhận thay đổi
+LISTEN_TAGS = {"interface": "/interface/listen", "log": "/log/listen"}
+
+
+class RouterSubscription:
+    """Kết nối đăng ký của một router, đọc sự kiện trong thread riêng"""
+    
+    def __init__(self, router_id, session, on_event):
+        """
+        Args:
+            router_id: ID router
+            session (RouterOSSession): Phiên riêng cho kết nối đăng ký (chưa kết nối)
+            on_event: Hàm (router_id, loại sự kiện, dữ liệu) nhận sự kiện
+        """
+        self.router_id = router_id
+        self.session = session
+        self.on_event = on_event
+        self.active = False  # Đã lấy trạng thái ban đầu và đang nhận sự kiện
+        self.stopped = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name=f"routeros-listen-{router_id}")
+        self.thread.daemon = True
+    
+    def start(self):
+        self.thread.start()
+    
+    def stop(self):
+        """Dừng đăng ký: đóng socket để thread đang chờ dữ liệu thoát ra"""
+        self.stopped = True
+        try:
+            self.session.pool.socket.socket.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+    
+    def is_alive(self):
+        return self.thread.is_alive()
+    
+    def _run(self):
+        """Đăng nhập, gửi các lệnh listen và chuyển từng câu trả lời thành sự kiện"""
+        try:
+            self.session.api()
+            
+            # Chờ sự kiện không giới hạn thời gian, router mất kết nối được phát hiện qua TCP keepalive
+            self.session.pool.socket.settimeout(None)
+            connection = base_api.Connection(self.session.pool.socket)
+            connection.send_sentence([b'/interface/print', f'.tag={SEED_TAG}'.encode()])
+            for tag, command in LISTEN_TAGS.items():
+                connection.send_sentence([command.encode(), f'.tag={tag}'.encode()])
+            
+            while not self.stopped:
+                self._handle(sentence.ResponseSentence.parse(connection.receive_sentence()))
+        except (RouterOsApiError, OSError) as e:
+            if not self.stopped:
+                # Không dùng str(e): lỗi trả về từ router chứa cả câu lệnh đã gửi (kể cả mật khẩu khi đăng nhập)
+                self.error = error_message(e)
+        finally:
+            self.session.close()
+            if self.active and not self.stopped:
+                self.active = False
+                self.on_event(self.router_id, "state", {"active": False, "error": self.error})
+    
+    def _handle(self, response):
+        """Xử lý một câu trả lời của router"""
+        tag = (response.tag or b'').decode()
+        record = {key.decode().lstrip('.'): value.decode('utf-8', 'replace')
+                  for key, value in response.attributes.items()}
+        
+        if response.type == b're':
+            if tag in (SEED_TAG, "interface"):
+                self.on_event(self.router_id, "interface", dict(interface_record(record), dead=record.get('dead') == 'yes'))
+            elif tag == "log":
+                self.on_event(self.router_id, "log", record)
+        elif response.type == b'done' and tag == SEED_TAG:
+            self.active = True
+            self.on_event(self.router_id, "state", {"active": True, "error": None})
+        elif response.type in (b'trap', b'fatal') or tag in LISTEN_TAGS:
+            # Lệnh listen chỉ kết thúc khi bị hủy hoặc lỗi
+            raise RouterOsApiError(f"Đăng ký {tag or 'router'} bị ngắt: {record.get('message', response.type.decode())}")
+
+
+class RouterOSSubscriptions:
+    """
+    Quản lý kết nối đăng ký của tất cả router (một thread cho mỗi router, thread chủ yếu
+    chờ dữ liệu trên socket). Kết nối bị ngắt được thử lại sau retry_interval.
+    """
+    
+    def __init__(self, retry_interval=60, collector=None):
+        """
+        Khởi tạo
+        
+        Args:
+            retry_interval (float): Thời gian chờ (giây) trước khi đăng ký lại router bị ngắt
+            collector (RouterOSCollector): Nguồn địa chỉ và thông tin đăng nhập router
+        """
+        self.retry_interval = retry_interval
+        self.collector = collector or routeros_collector
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # router_id -> RouterSubscription
+        self.retry_at = {}  # router_id -> thời điểm được đăng ký lại (time.monotonic())
+        self.listeners = []  # Hàm callback(router_id, loại sự kiện, dữ liệu)
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "subscriptions" của alert_monitor_config.json)"""
+        self.retry_interval = config.get("retry_interval", self.retry_interval)
+    
+    def add_listener(self, callback):
+        """
+        Đăng ký hàm nhận sự kiện (gọi từ thread của kết nối đăng ký). Loại sự kiện:
+        "interface" (bản ghi interface, "dead" nếu interface bị xóa), "log" (dòng log mới),
+        "state" ({"active": bool, "error": lỗi} khi đăng ký bắt đầu hoặc bị ngắt)
+        """
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Hủy đăng ký hàm callback"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def sync(self, router_ids):
+        """
+        Đồng bộ với danh sách router: đăng ký router mới, đăng ký lại router bị ngắt
+        đã hết thời gian chờ và dừng đăng ký của router không còn trong danh sách
+        """
+        router_ids = set(router_ids)
+        now = time.monotonic()
+        
+        with self.lock:
+            for router_id in [router_id for router_id in self.subscriptions if router_id not in router_ids]:
+                self.subscriptions.pop(router_id).stop()
+                self.retry_at.pop(router_id, None)
+            
+            for router_id in router_ids:
+                subscription = self.subscriptions.get(router_id)
+                if subscription is not None and subscription.is_alive():
+                    continue
+                if subscription is not None and router_id not in self.retry_at:
+                    logger.info(f"Đăng ký sự kiện router #{router_id} không hoạt động ({subscription.error}), "
+                                   f"thử lại sau {self.retry_interval}s")
+                    self.retry_at[router_id] = now + self.retry_interval
+                if now < self.retry_at.get(router_id, 0):
+                    continue
+                
+                session = self.collector.create_session(router_id)
+                if session is None:
+                    continue
+                self.retry_at.pop(router_id, None)
+                subscription = self.subscriptions[router_id] = RouterSubscription(router_id, session, self._dispatch)
+                subscription.start()
+    
+    def is_active(self, router_id):
+        """Router đang nhận sự kiện qua đăng ký"""
+        subscription = self.subscriptions.get(router_id)
+        return subscription is not None and subscription.active
+    
+    def stop_all(self):
+        """Dừng tất cả đăng ký"""
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, {}
+            self.retry_at = {}
+        for subscription in subscriptions.values():
+            subscription.stop()
+    
+    def get_states(self):
+        """
+        Trạng thái đăng ký của các router
+        
+        Returns:
+            dict: router_id -> {active, error}
+        """
+        with self.lock:
+            return {
+                router_id: {"active": subscription.active, "error": subscription.error}
+                for router_id, subscription in self.subscriptions.items()
+            }
+    
+    def _dispatch(self, router_id, kind, data):
+        """Chuyển sự kiện cho các listener"""
+        if kind == "state":
+            if data["active"]:
+                logger.info(f"Đã đăng ký nhận sự kiện interface/log của router #{router_id}")
+            else:
+                logger.warning(f"Đăng ký sự kiện router #{router_id} bị ngắt: {data['error']}")
+        
+        for listener in list(self.listeners):
+            try:
+                listener(router_id, kind, data)
+            except Exception as e:
+                logger.error(f"Lỗi trong listener của đăng ký sự kiện: {e}", exc_info=True)
+
+
+# Singleton instance
+routeros_subscriptions = RouterOSSubscriptions()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module thăm dò khả năng kết nối TCP tới cổng API của router (mặc định 8728).
+Chạy trên một event loop asyncio riêng nên có thể thăm dò hàng nghìn router cùng lúc,
+ghi lại RTT và trạng thái kết nối của từng router, giữ RTT dưới dạng chuỗi thời gian
+và báo cho AlertMonitor khi router chuyển trạng thái (tín hiệu liveness nhanh,
+không phụ thuộc vào API Node.js).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Thêm thư mục gốc vào đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.router_metadata import router_metadata
+from monitoring.routeros_collector import DEFAULT_API_PORT, to_int
+
+logger = logging.getLogger('tcp_prober')
+
+
+class TcpProber:
+    """
+    Thăm dò định kỳ bằng TCP connect tới tất cả router trong cache thông tin router.
+    Số kết nối đồng thời bị giới hạn bởi max_concurrency (cần nhỏ hơn giới hạn file descriptor của tiến trình).
+    """
+    
+    def __init__(self, interval=5, timeout=2, max_concurrency=1000, history_size=720, metadata=None):
+        """
+        Khởi tạo prober
+        
+        Args:
+            interval (float): Chu kỳ thăm dò (giây)
+            timeout (float): Timeout của mỗi lần kết nối (giây)
+            max_concurrency (int): Số kết nối TCP đồng thời tối đa
+            history_size (int): Số điểm RTT giữ lại cho mỗi router
+            metadata (RouterMetadataCache): Nguồn danh sách router (mặc định cache dùng chung)
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.history_size = history_size
+        self.metadata = metadata or router_metadata
+        self.lock = threading.Lock()
+        self.status = {}  # router_id -> kết quả thăm dò gần nhất
+        self.rtt_history = {}  # router_id -> deque các điểm (timestamp, rtt_ms hoặc None nếu không kết nối được)
+        self.listeners = []  # Hàm callback(router_id, reachable) khi router đổi trạng thái
+        self.metric_store = None  # MetricStore lưu lịch sử RTT (AlertMonitor gán khi bật "metric_store")
+        self.active = False
+        self.loop = None
+        self.wakeup = None
+        self.thread = None
+    
+    def configure(self, config):
+        """Cập nhật tham số từ cấu hình (khối "tcp_prober" của alert_monitor_config.json)"""
+        self.interval = config.get("interval", self.interval)
+        self.timeout = config.get("timeout", self.timeout)
+        self.max_concurrency = config.get("max_concurrency", self.max_concurrency)
+        self.history_size = config.get("history_size", self.history_size)
+    
+    def add_listener(self, callback):
+        """Đăng ký hàm được gọi (từ thread của prober) khi một router đổi trạng thái kết nối"""
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Hủy đăng ký hàm callback"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def start(self):
+        """Bắt đầu thăm dò định kỳ trong thread riêng"""
+        if self.active:
+            return
+        
+        self.active = True
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="tcp-prober")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Đã bắt đầu thăm dò TCP (chu kỳ {self.interval}s, timeout {self.timeout}s)")
+    
+    def stop(self):
+        """Dừng thăm dò"""
+        if not self.active:
+            return
+        
+        self.active = False
+        if self.loop and self.wakeup:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        logger.info("Đã dừng thăm dò TCP")
+    
+    def get_targets(self):
+        """
+        Danh sách (router_id, địa chỉ, cổng) của các router có địa chỉ trong cache.
+        Cổng trống hoặc không phải số được thay bằng cổng API mặc định.
+        """
+        targets = []
+        for router in self.metadata.get_all():
+            if router.get('id') and router.get('address'):
+                targets.append((router['id'], router['address'], to_int(router.get('port'), 0) or DEFAULT_API_PORT))
+        return targets
+    
+    async def probe(self, host, port):
+        """
+        Thử kết nối TCP tới host:port
+        
+        Returns:
+            float: RTT (mili giây) nếu kết nối được, None nếu không
+        """
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        
+        rtt = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return rtt
+    
+    async def probe_all(self, targets):
+        """
+        Thăm dò đồng thời danh sách router và ghi nhận kết quả
+        
+        Args:
+            targets (list): Các tuple (router_id, địa chỉ, cổng)
+        
+        Returns:
+            dict: router_id -> RTT (mili giây) hoặc None
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def probe_target(host, port):
+            async with semaphore:
+                return await self.probe(host, port)
+        
+        rtts = await asyncio.gather(*(probe_target(host, port) for _, host, port in targets))
+        results = {router_id: rtt for (router_id, _, _), rtt in zip(targets, rtts)}
+        self.record(results)
+        return results
+    
+    def probe_all_sync(self, targets=None):
+        """Thăm dò một lần (chặn đến khi xong), dùng khi không chạy thăm dò định kỳ"""
+        return asyncio.run(self.probe_all(self.get_targets() if targets is None else targets))
+    
+    def record(self, results, timestamp=None):
+        """Ghi nhận kết quả thăm dò và báo cho các listener khi router đổi trạng thái"""
+        timestamp = time.time() if timestamp is None else timestamp
+        changes = []
+        
+        with self.lock:
+            for router_id, rtt in results.items():
+                reachable = rtt is not None
+                previous = self.status.get(router_id)
+                
+                self.status[router_id] = {
+                    "reachable": reachable,
+                    "rtt": rtt,
+                    "checked_at": timestamp,
+                    "failures": 0 if reachable else (previous["failures"] + 1 if previous else 1)
+                }
+                
+                history = self.rtt_history.get(router_id)
+                if history is None or history.maxlen != self.history_size:
+                    history = self.rtt_history[router_id] = deque(history or (), maxlen=self.history_size)
+                history.append((timestamp, rtt))
+                
+                if previous is not None and previous["reachable"] != reachable:
+                    changes.append((router_id, reachable))
+        
+        if self.metric_store is not None:
+            self.metric_store.write_many(
+                ("rtt_ms", {"router": router_id}, rtt, timestamp) for router_id, rtt in results.items() if rtt is not None
+            )
+        
+        for router_id, reachable in changes:
+            logger.info(f"Router #{router_id} {'kết nối được' if reachable else 'không kết nối được'} qua TCP")
+            for listener in list(self.listeners):
+                try:
+                    listener(router_id, reachable)
+                except Exception as e:
+                    logger.error(f"Lỗi trong listener của prober: {e}")
+    
+    def forget(self, router_ids):
+        """Bỏ kết quả và chuỗi RTT của các router không còn trong danh sách"""
+        with self.lock:
+            for router_id in [router_id for router_id in self.status if router_id not in router_ids]:
+                del self.status[router_id]
+                self.rtt_history.pop(router_id, None)
+    
+    def get_status(self, router_id):
+        """Kết quả thăm dò gần nhất của router: {reachable, rtt, checked_at, failures} hoặc None"""
+        with self.lock:
+            status = self.status.get(router_id)
+            return dict(status) if status else None
+    
+    def get_all_status(self):
+        """Kết quả thăm dò gần nhất của tất cả router"""
+        with self.lock:
+            return {router_id: dict(status) for router_id, status in self.status.items()}
+    
+    def is_reachable(self, router_id, max_age=None):
+        """
+        Router có kết nối được qua TCP không theo lần thăm dò gần nhất
+        
+        Returns:
+            bool: True/False, hoặc None nếu chưa có kết quả đủ mới (mặc định 3 chu kỳ)
+        """
+        status = self.get_status(router_id)
+        max_age = self.interval * 3 if max_age is None else max_age
+        if status is None or time.time() - status["checked_at"] > max_age:
+            return None
+        return status["reachable"]
+    
+    def get_rtt_series(self, router_id, since=None):
+        """
+        Chuỗi RTT của router
+        
+        Args:
+            since (float): Chỉ lấy các điểm sau thời điểm này (time.time())
+        
+        Returns:
+            list: Các tuple (timestamp, rtt_ms), rtt_ms là None khi không kết nối được
+        """
+        with self.lock:
+            history = list(self.rtt_history.get(router_id, ()))
+        if since is not None:
+            history = [point for point in history if point[0] > since]
+        return history
+    
+    async def _run(self):
+        """Vòng lặp thăm dò định kỳ"""
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        
+        while self.active:
+            started = time.monotonic()
+            try:
+                targets = self.get_targets()
+                self.forget({router_id for router_id, _, _ in targets})
+                if targets:
+                    results = await self.probe_all(targets)
+                    unreachable = sum(1 for rtt in results.values() if rtt is None)
+                    logger.debug(f"Đã thăm dò {len(targets)} router trong {time.monotonic() - started:.2f}s, "
+                                 f"{unreachable} không kết nối được")
+            except Exception as e:
+                logger.error(f"Lỗi khi thăm dò TCP: {e}", exc_info=True)
+            
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=max(0, self.interval - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                pass
+
+
+# Singleton instance
+tcp_prober = TcpProber()
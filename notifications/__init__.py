@@ -6,5 +6,6 @@ Package notifications - Hệ thống thông báo cho MikroTik Monitor
 """
 
 from notifications.notification_service import notification_service, send_alert
+from notifications.dispatch_queue import DeliveryHandle
 
-__all__ = ['notification_service', 'send_alert']
\ No newline at end of file
+__all__ = ['notification_service', 'send_alert', 'DeliveryHandle']
\ No newline at end of file
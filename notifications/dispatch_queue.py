@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module hàng đợi gửi thông báo bất đồng bộ.
+Mỗi kênh (email, sms) có một hàng đợi giới hạn và một nhóm worker riêng, nên các lệnh gọi
+SendGrid/Twilio chậm không chặn thread giám sát và một kênh chậm không ảnh hưởng kênh khác.
+Mỗi lần gửi cảnh báo trả về DeliveryHandle để theo dõi kết quả của từng người nhận.
+"""
+
+import time
+import queue
+import atexit
+import logging
+import threading
+import statistics
+from collections import deque
+from itertools import count
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('dispatch_queue')
+
+# Số mẫu độ trễ gần nhất giữ lại cho mỗi kênh
+LATENCY_WINDOW = 1000
+
+_handle_ids = count(1)
+
+
+def _percentile(values, percent):
+    """Phân vị percent (nội suy tuyến tính) của danh sách không rỗng"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class DeliveryHandle:
+    """
+    Kết quả gửi một cảnh báo, được cập nhật dần khi các worker gửi xong từng người nhận.
+    result() trả về dict cùng dạng với kết quả gửi đồng bộ trước đây:
+    {"status": ..., "channels": {kênh: {"recipients": {người nhận: "success"/"failed"/"dropped"}}}}
+    """
+    
+    def __init__(self, device_name=None, alert_type=None, status="queued"):
+        self.id = next(_handle_ids)
+        self.device_name = device_name
+        self.alert_type = alert_type
+        self.created_at = time.time()
+        self.status = status
+        self.channels = {}
+        self.extra = {}
+        self.pending = 0
+        self.sealed = False  # Đã đưa hết các lượt gửi vào hàng đợi
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if status != "queued":
+            self.finished.set()
+    
+    @classmethod
+    def completed(cls, result, device_name=None, alert_type=None):
+        """Handle đã hoàn tất ngay (cảnh báo bị tắt, không có người nhận, lỗi cấu hình...)"""
+        handle = cls(device_name, alert_type, status=result.get("status", "sent"))
+        handle.channels = result.get("channels", {})
+        handle.extra = {key: value for key, value in result.items() if key not in ("status", "channels")}
+        return handle
+    
+    def set_channel_result(self, channel, result):
+        """Ghi kết quả cả kênh (ví dụ không có người nhận)"""
+        with self.lock:
+            self.channels[channel] = result
+    
+    def add_recipient(self, channel, count=1):
+        """Đăng ký người nhận của một lượt gửi sắp được đưa vào hàng đợi (count người nếu gửi gộp)"""
+        with self.lock:
+            self.channels.setdefault(channel, {"recipients": {}})
+            self.pending += count
+    
+    def record(self, channel, recipient, outcome):
+        """Ghi kết quả gửi cho một người nhận (hoặc danh sách người nhận của một lượt gửi gộp)"""
+        recipients = recipient if isinstance(recipient, (list, tuple)) else [recipient]
+        with self.lock:
+            results = self.channels.setdefault(channel, {"recipients": {}}).setdefault("recipients", {})
+            for name in recipients:
+                results[name] = outcome
+            self.pending -= len(recipients)
+            if self.sealed and self.pending <= 0 and self.status == "queued":
+                self._finish()
+    
+    def seal(self):
+        """Đánh dấu đã đưa hết các lượt gửi vào hàng đợi (hoàn tất ngay nếu không còn lượt nào chờ)"""
+        with self.lock:
+            self.sealed = True
+            if self.pending <= 0 and self.status == "queued":
+                self._finish()
+    
+    def _finish(self):
+        outcomes = [
+            outcome
+            for channel_result in self.channels.values()
+            for outcome in channel_result.get("recipients", {}).values()
+        ]
+        if outcomes and all(outcome == "success" for outcome in outcomes):
+            self.status = "sent"
+        elif any(outcome == "success" for outcome in outcomes):
+            self.status = "partial"
+        elif outcomes:
+            self.status = "failed"
+        else:
+            self.status = "sent"
+        self.finished.set()
+    
+    def done(self):
+        """True nếu mọi lượt gửi đã có kết quả"""
+        return self.finished.is_set()
+    
+    def wait(self, timeout=None):
+        """Chờ đến khi mọi lượt gửi có kết quả, trả về True nếu đã hoàn tất"""
+        return self.finished.wait(timeout)
+    
+    def result(self, timeout=None):
+        """Kết quả gửi (chờ tối đa timeout giây; status "queued" nếu chưa xong)"""
+        self.wait(timeout)
+        with self.lock:
+            result = dict(self.extra)
+            result["status"] = self.status
+            result["channels"] = {
+                channel: {
+                    key: dict(value) if isinstance(value, dict) else value
+                    for key, value in channel_result.items()
+                }
+                for channel, channel_result in self.channels.items()
+            }
+            return result
+    
+    def __repr__(self):
+        return f"<DeliveryHandle #{self.id} {self.alert_type} {self.device_name}: {self.status}>"
+
+
+class _Channel:
+    """Hàng đợi, worker và số liệu của một kênh"""
+    
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.threads = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # Từ lúc vào hàng đợi đến khi gửi xong
+        self.send_times = deque(maxlen=LATENCY_WINDOW)  # Thời gian gọi nhà cung cấp
+
+
+class DispatchQueue:
+    """
+    Hàng đợi gửi thông báo với nhóm worker riêng cho mỗi kênh.
+    Worker được tạo khi có lượt gửi đầu tiên của kênh; shutdown() chờ gửi hết các lượt trong
+    hàng đợi trong thời hạn cho phép, các lượt còn lại được ghi là "dropped".
+    """
+    
+    def __init__(self, workers=None, max_queue=1000, shutdown_timeout=10):
+        """
+        Khởi tạo
+        
+        Args:
+            workers (dict): Số worker của mỗi kênh (kênh không có trong dict dùng 1 worker)
+            max_queue (int): Số lượt gửi tối đa chờ trong hàng đợi của mỗi kênh, vượt quá sẽ bị bỏ
+            shutdown_timeout (float): Thời hạn mặc định (giây) để gửi hết hàng đợi khi dừng
+        """
+        self.workers = dict(workers or {"email": 2, "sms": 2})
+        self.max_queue = max_queue
+        self.shutdown_timeout = shutdown_timeout
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.accepting = True
+        atexit.register(self.shutdown)
+    
+    def configure(self, config):
+        """Cập nhật tham số từ khối "dispatch" của notification_config.json (áp dụng cho kênh tạo mới)"""
+        with self.lock:
+            self.workers.update(config.get("workers", {}))
+            self.max_queue = config.get("max_queue", self.max_queue)
+            self.shutdown_timeout = config.get("shutdown_timeout", self.shutdown_timeout)
+    
+    def _channel(self, name):
+        """Kênh đang chạy (tạo hàng đợi và worker nếu chưa có)"""
+        with self.lock:
+            channel = self.channels.get(name)
+            if channel is None:
+                channel = self.channels[name] = _Channel(name, max(1, int(self.workers.get(name, 1))), self.max_queue)
+            alive = [thread for thread in channel.threads if thread.is_alive()]
+            for index in range(len(alive), channel.workers):
+                thread = threading.Thread(target=self._worker, args=(channel,), name=f"notify-{name}-{index}")
+                thread.daemon = True
+                thread.start()
+                alive.append(thread)
+            channel.threads = alive
+            return channel
+    
+    def submit(self, channel_name, handle, recipient, send, *args):
+        """
+        Đưa một lượt gửi vào hàng đợi của kênh (không chặn)
+        
+        Args:
+            channel_name (str): Tên kênh ("email", "sms")
+            handle (DeliveryHandle): Handle nhận kết quả (None nếu kết quả do hàm gửi tự ghi, ví dụ outbox)
+            recipient (str | list): Người nhận (khóa kết quả trong handle), hoặc danh sách người nhận
+                của một lượt gửi gộp (cùng một kết quả)
+            send (callable): Hàm gửi, trả về True nếu thành công
+            *args: Tham số của hàm gửi
+        
+        Returns:
+            bool: False nếu lượt gửi bị bỏ (hàng đợi đầy hoặc đang dừng)
+        """
+        if handle is not None:
+            handle.add_recipient(channel_name, len(recipient) if isinstance(recipient, (list, tuple)) else 1)
+        channel = self._channel(channel_name)
+        if not self.accepting:
+            self._drop(channel, handle, recipient, "đang dừng hàng đợi gửi thông báo")
+            return False
+        try:
+            channel.queue.put_nowait((time.monotonic(), handle, recipient, send, args))
+            return True
+        except queue.Full:
+            self._drop(channel, handle, recipient, f"hàng đợi đầy ({self.max_queue})")
+            return False
+    
+    def _drop(self, channel, handle, recipient, reason):
+        with self.lock:
+            channel.dropped += 1
+        logger.warning(f"Bỏ thông báo {channel.name} đến {recipient}: {reason}")
+        if handle is not None:
+            handle.record(channel.name, recipient, "dropped")
+    
+    def _worker(self, channel):
+        """Lấy lần lượt các lượt gửi của kênh và gọi nhà cung cấp"""
+        while True:
+            job = channel.queue.get()
+            if job is None:
+                channel.queue.task_done()
+                return
+            
+            queued_at, handle, recipient, send, args = job
+            with self.lock:
+                channel.in_flight += 1
+            started = time.monotonic()
+            try:
+                success = bool(send(*args))
+            except Exception as e:
+                logger.error(f"Lỗi khi gửi thông báo {channel.name} đến {recipient}: {e}")
+                success = False
+            finished = time.monotonic()
+            
+            with self.lock:
+                channel.in_flight -= 1
+                channel.latencies.append(finished - queued_at)
+                channel.send_times.append(finished - started)
+                if success:
+                    channel.sent += 1
+                else:
+                    channel.failed += 1
+            if handle is not None:
+                handle.record(channel.name, recipient, "success" if success else "failed")
+            channel.queue.task_done()
+    
+    def free_slots(self, channel_name):
+        """Số lượt gửi còn đưa thêm được vào hàng đợi của kênh mà không bị bỏ"""
+        channel = self._channel(channel_name)
+        return max(0, channel.queue.maxsize - channel.queue.qsize())
+    
+    def get_metrics(self):
+        """
+        Số liệu của mỗi kênh: độ sâu hàng đợi, số đang gửi, số gửi thành công/thất bại/bị bỏ,
+        độ trễ (giây, từ lúc vào hàng đợi đến khi gửi xong) trung bình/p95/lớn nhất của các lượt gần đây
+        """
+        metrics = {}
+        with self.lock:
+            for name, channel in self.channels.items():
+                latencies = list(channel.latencies)
+                send_times = list(channel.send_times)
+                metrics[name] = {
+                    "queue_depth": channel.queue.qsize(),
+                    "in_flight": channel.in_flight,
+                    "workers": channel.workers,
+                    "sent": channel.sent,
+                    "failed": channel.failed,
+                    "dropped": channel.dropped,
+                    "latency_avg": statistics.fmean(latencies) if latencies else None,
+                    "latency_p95": _percentile(latencies, 95) if latencies else None,
+                    "latency_max": max(latencies) if latencies else None,
+                    "send_time_avg": statistics.fmean(send_times) if send_times else None
+                }
+        return metrics
+    
+    def drain(self, timeout=None):
+        """
+        Chờ gửi hết các lượt đang có trong hàng đợi (không dừng worker)
+        
+        Returns:
+            bool: True nếu hàng đợi của mọi kênh đã trống trước thời hạn
+        """
+        deadline = time.monotonic() + (self.shutdown_timeout if timeout is None else timeout)
+        with self.lock:
+            channels = list(self.channels.values())
+        for channel in channels:
+            while channel.queue.unfinished_tasks:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+        return True
+    
+    def shutdown(self, timeout=None):
+        """
+        Ngừng nhận lượt gửi mới, chờ gửi hết hàng đợi trong thời hạn rồi dừng worker.
+        Các lượt chưa kịp gửi được ghi là "dropped". Hàng đợi nhận lại lượt gửi mới sau khi dừng xong.
+        
+        Returns:
+            bool: True nếu gửi hết trước thời hạn
+        """
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        self.accepting = False
+        try:
+            drained = self.drain(timeout)
+            
+            with self.lock:
+                channels = list(self.channels.values())
+            for channel in channels:
+                # Bỏ các lượt chưa gửi kịp
+                while True:
+                    try:
+                        job = channel.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is not None:
+                        self._drop(channel, job[1], job[2], f"quá thời hạn dừng {timeout}s")
+                    channel.queue.task_done()
+                
+                # Dừng worker (worker đang gửi dở được chờ thêm tối đa 1 giây)
+                for _ in channel.threads:
+                    channel.queue.put(None)
+                for thread in channel.threads:
+                    thread.join(timeout=1)
+                channel.threads = [thread for thread in channel.threads if thread.is_alive()]
+            
+            if not drained:
+                logger.warning(f"Hàng đợi gửi thông báo chưa gửi hết sau {timeout}s")
+            return drained
+        finally:
+            self.accepting = True
+
+
+# Singleton instance
+dispatch_queue = DispatchQueue()
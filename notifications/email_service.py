@@ -6,13 +6,20 @@ Module gửi thông báo qua email sử dụng SendGrid API
 """
 
 import os
+import re
 import sys
+import html
+import json
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from dotenv import load_dotenv
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, TemplateError, TemplateNotFound, select_autoescape
+
+from notifications.provider_clients import get_sendgrid_client
 
 # Tải các biến môi trường
 load_dotenv()
@@ -26,6 +33,13 @@ logger = logging.getLogger('email_service')
 
 # Thư mục chứa templates email
 TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+# Thư mục lưu bytecode đã biên dịch của templates (giữ giữa các lần khởi động)
+BYTECODE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache', 'templates')
+# Số nội dung email đã render được ghi nhớ
+RENDER_CACHE_SIZE = 256
+
+# Số người nhận tối đa trong một request v3/mail/send (giới hạn personalizations của SendGrid)
+MAX_PERSONALIZATIONS = 1000
 
 class EmailService:
     """Dịch vụ gửi email sử dụng SendGrid API"""
@@ -41,11 +55,69 @@ class EmailService:
             os.makedirs(TEMPLATE_DIR)
             logger.info(f"Đã tạo thư mục templates: {TEMPLATE_DIR}")
         
-        # Khởi tạo Jinja2 environment
+        # Khởi tạo Jinja2 environment (template .txt là phần văn bản thuần nên không escape HTML)
         self.jinja_env = Environment(
             loader=FileSystemLoader(TEMPLATE_DIR),
-            autoescape=True
+            autoescape=select_autoescape(default=True, disabled_extensions=('txt',)),
+            bytecode_cache=self._bytecode_cache()
         )
+        
+        # Nội dung đã render theo hash của template và dữ liệu
+        self.render_cache = OrderedDict()
+        self.render_lock = threading.Lock()
+        self._precompile()
+    
+    def _bytecode_cache(self):
+        """Cache bytecode trên đĩa, None nếu không tạo được thư mục cache"""
+        try:
+            os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+            return FileSystemBytecodeCache(BYTECODE_CACHE_DIR)
+        except OSError as e:
+            logger.warning(f"Không dùng được cache bytecode template {BYTECODE_CACHE_DIR}: {e}")
+            return None
+    
+    def _precompile(self):
+        """Biên dịch trước mọi template email (nạp từ cache bytecode nếu đã có)"""
+        for name in self.jinja_env.list_templates(extensions=('html', 'txt')):
+            try:
+                self.jinja_env.get_template(name)
+            except TemplateError as e:
+                logger.error(f"Lỗi khi biên dịch template {name}: {e}")
+    
+    def render(self, template_name, context=None):
+        """
+        Render template email thành phần HTML và phần văn bản thuần. Phần văn bản lấy từ template
+        cùng tên đuôi .txt nếu có, nếu không thì chuyển từ HTML. Kết quả được ghi nhớ theo hash
+        của tên template và dữ liệu (render lại nếu template thay đổi trên đĩa).
+        
+        Returns:
+            tuple: (html, text)
+        """
+        context = context or {}
+        template = self.jinja_env.get_template(template_name)
+        key = hashlib.sha256(
+            json.dumps([template_name, context], sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        
+        with self.render_lock:
+            cached = self.render_cache.get(key)
+            if cached is not None and cached[0] is template:
+                self.render_cache.move_to_end(key)
+                return cached[1], cached[2]
+        
+        html_content = template.render(**context)
+        try:
+            text_template = self.jinja_env.get_template(os.path.splitext(template_name)[0] + '.txt')
+            text_content = text_template.render(**context)
+        except TemplateNotFound:
+            text_content = html_to_text(html_content)
+        
+        with self.render_lock:
+            self.render_cache[key] = (template, html_content, text_content)
+            self.render_cache.move_to_end(key)
+            while len(self.render_cache) > RENDER_CACHE_SIZE:
+                self.render_cache.popitem(last=False)
+        return html_content, text_content
     
     def send_email(self, to_email, subject, template_name, context=None, from_email="mikrotik-monitor@example.com"):
         """
@@ -69,35 +141,83 @@ class EmailService:
             context = {}
 
         try:
-            # Render template
-            template = self.jinja_env.get_template(template_name)
-            html_content = template.render(**context)
+            # Render template (phần HTML và phần văn bản thuần)
+            html_content, text_content = self.render(template_name, context)
             
             # Tạo message
             message = Mail(
                 from_email=Email(from_email),
                 to_emails=To(to_email),
                 subject=subject,
+                plain_text_content=Content("text/plain", text_content),
                 html_content=Content("text/html", html_content)
             )
 
-            # Gửi email
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            
-            # Kiểm tra kết quả
-            if response.status_code >= 200 and response.status_code < 300:
-                logger.info(f"Đã gửi email thành công đến {to_email}")
-                return True
-            else:
-                logger.error(f"Gửi email thất bại: {response.status_code} - {response.body}")
-                return False
+            return self._send_message(message, to_email)
                 
         except Exception as e:
             logger.error(f"Lỗi khi gửi email: {e}")
             return False
     
-    def send_alert_email(self, to_email, device_name, alert_type, alert_message, details=None):
+    def send_email_batch(self, to_emails, subject, template_name, context=None, from_email="mikrotik-monitor@example.com"):
+        """
+        Gửi cùng một email cho nhiều người nhận: template chỉ render một lần, mỗi request SendGrid
+        chứa tối đa MAX_PERSONALIZATIONS người nhận, mỗi người một personalization riêng
+        (người nhận không thấy địa chỉ của nhau)
+        
+        Args:
+            to_emails (list): Email người nhận
+            subject (str): Tiêu đề email
+            template_name (str): Tên file template trong thư mục templates
+            context (dict): Dữ liệu để render template
+            from_email (str): Email người gửi
+            
+        Returns:
+            dict: Email người nhận -> True nếu request chứa người nhận đó được SendGrid chấp nhận
+        """
+        to_emails = list(dict.fromkeys(to_emails))
+        if not self.api_key:
+            logger.error("Không thể gửi email: Thiếu SENDGRID_API_KEY")
+            return {email: False for email in to_emails}
+        
+        try:
+            html_content, text_content = self.render(template_name, context)
+        except Exception as e:
+            logger.error(f"Lỗi khi render template email {template_name}: {e}")
+            return {email: False for email in to_emails}
+        
+        results = {}
+        for start in range(0, len(to_emails), MAX_PERSONALIZATIONS):
+            batch = to_emails[start:start + MAX_PERSONALIZATIONS]
+            try:
+                message = Mail(
+                    from_email=Email(from_email),
+                    to_emails=[To(email) for email in batch],
+                    subject=subject,
+                    plain_text_content=Content("text/plain", text_content),
+                    html_content=Content("text/html", html_content),
+                    is_multiple=True
+                )
+                success = self._send_message(message, f"{len(batch)} người nhận")
+            except Exception as e:
+                logger.error(f"Lỗi khi gửi email: {e}")
+                success = False
+            results.update((email, success) for email in batch)
+        return results
+    
+    def _send_message(self, message, description):
+        """Gửi message qua client SendGrid dùng chung (giữ kết nối giữa các lượt gửi)"""
+        response = get_sendgrid_client(self.api_key).send(message)
+        
+        # Kiểm tra kết quả
+        if response.status_code >= 200 and response.status_code < 300:
+            logger.info(f"Đã gửi email thành công đến {description}")
+            return True
+        else:
+            logger.error(f"Gửi email thất bại: {response.status_code} - {response.text}")
+            return False
+    
+    def send_alert_email(self, to_email, device_name, alert_type, alert_message, details=None, created_at=None):
         """
         Gửi email cảnh báo
         
@@ -107,24 +227,51 @@ class EmailService:
             alert_type (str): Loại cảnh báo
             alert_message (str): Nội dung cảnh báo
             details (dict): Chi tiết bổ sung về cảnh báo
+            created_at (float): Thời điểm phát sinh cảnh báo (epoch giây, mặc định lúc gửi)
             
         Returns:
             bool: True nếu gửi thành công, False nếu thất bại
         """
+        subject, context = self._alert_content(device_name, alert_type, alert_message, details, created_at)
+        return self.send_email(to_email, subject, "alert_email.html", context)
+    
+    def send_alert_email_batch(self, to_emails, device_name, alert_type, alert_message, details=None, created_at=None):
+        """
+        Gửi email cảnh báo cho nhiều người nhận trong một request SendGrid (nội dung render một lần)
+        
+        Returns:
+            dict: Email người nhận -> True nếu gửi thành công
+        """
+        subject, context = self._alert_content(device_name, alert_type, alert_message, details, created_at)
+        return self.send_email_batch(to_emails, subject, "alert_email.html", context)
+    
+    def _alert_content(self, device_name, alert_type, alert_message, details=None, created_at=None):
+        """Tiêu đề và dữ liệu template của email cảnh báo"""
         subject = f"[CẢNH BÁO] {alert_type} - {device_name}"
         
         if details is None:
             details = {}
-            
+        
+        # Thời điểm của cảnh báo (không phải lúc gửi lại) để nội dung giống nhau giữa các lần thử
+        alert_time = datetime.fromtimestamp(created_at) if created_at is not None else datetime.now()
         context = {
             'device_name': device_name,
             'alert_type': alert_type,
             'alert_message': alert_message,
             'details': details,
-            'timestamp': 'lúc ' + datetime.now().strftime('%H:%M:%S ngày %d/%m/%Y')
+            'timestamp': 'lúc ' + alert_time.strftime('%H:%M:%S ngày %d/%m/%Y')
         }
-        
-        return self.send_email(to_email, subject, "alert_email.html", context)
+        return subject, context
+
+
+def html_to_text(html_content):
+    """Chuyển nội dung HTML thành văn bản thuần (bỏ head/style, thẻ và dòng trống thừa)"""
+    text = re.sub(r'(?is)<(head|style|script)\b.*?</\1>', '', html_content)
+    text = re.sub(r'(?i)<br\s*/?>|</(p|div|h[1-6]|tr|li|table)>', '\n', text)
+    text = re.sub(r'(?i)</t[dh]>', '\t', text)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
 
 
 # Singleton instance
@@ -9,11 +9,15 @@ import os
 import sys
 import logging
 import json
+import time
 from datetime import datetime
 
 # Import các dịch vụ thông báo
-from notifications.email_service import email_service
+from notifications.email_service import email_service, MAX_PERSONALIZATIONS
 from notifications.sms_service import sms_service
+from notifications.dispatch_queue import dispatch_queue, DeliveryHandle
+from notifications.outbox import NotificationOutbox
+from notifications.provider_clients import close_clients
 
 # Cấu hình logging
 logging.basicConfig(
@@ -29,18 +33,23 @@ class NotificationService:
     """
     Dịch vụ quản lý thông báo tổng hợp cho hệ thống giám sát MikroTik.
     Hỗ trợ nhiều phương thức thông báo: Email, SMS.
+    Các lượt gửi được đưa vào hàng đợi của từng kênh và gửi trong worker nền; khi bật outbox,
+    mỗi lượt được lưu vào SQLite trước và được thử lại nếu gửi thất bại.
     """
     
     def __init__(self):
         """Khởi tạo dịch vụ thông báo"""
         self.config = self._load_config()
+        self.dispatch = dispatch_queue
+        self.outbox = None
+        self._configure_delivery()
         
         # Tạo thư mục config nếu chưa tồn tại
         config_dir = os.path.dirname(CONFIG_FILE)
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
             logger.info(f"Đã tạo thư mục cấu hình: {config_dir}")
-            
+        
         # Tạo file cấu hình mẫu nếu chưa tồn tại
         if not os.path.exists(CONFIG_FILE):
             self._create_default_config()
@@ -49,10 +58,18 @@ class NotificationService:
         """Đọc cấu hình từ file JSON"""
         if not os.path.exists(CONFIG_FILE):
             return self._get_default_config()
-            
+        
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
+            
+            # Bổ sung các mục và loại cảnh báo mới có trong cấu hình mặc định nhưng chưa có trong file đã lưu
+            defaults = self._get_default_config()
+            for key, value in defaults.items():
+                config.setdefault(key, value)
+            for alert_type, alert_config in defaults["alert_types"].items():
+                config["alert_types"].setdefault(alert_type, alert_config)
+            
             logger.info("Đã tải cấu hình thông báo")
             return config
         except Exception as e:
@@ -77,13 +94,27 @@ class NotificationService:
             "channels": {
                 "email": {
                     "enabled": True,
-                    "recipients": []
+                    "recipients": [],
+                    "batch": True  # Một request SendGrid cho mọi người nhận của cảnh báo
                 },
                 "sms": {
                     "enabled": True,
                     "recipients": []
                 }
             },
+            "dispatch": {
+                "workers": {"email": 2, "sms": 2},  # Số worker gửi của mỗi kênh
+                "max_queue": 1000,  # Số lượt gửi tối đa chờ trong hàng đợi mỗi kênh
+                "shutdown_timeout": 10  # Thời hạn gửi hết hàng đợi khi dừng (giây)
+            },
+            "outbox": {
+                "enabled": True,  # Lưu các lượt gửi vào SQLite, thử lại khi thất bại
+                "path": "data/notifications/outbox.db",
+                "max_attempts": 6,  # Quá số lần này chuyển sang dead-letter
+                "base_delay": 10,  # Chờ trước lần thử lại đầu tiên (giây), gấp đôi sau mỗi lần
+                "max_delay": 1800,
+                "retention": 604800  # Giữ các lượt đã gửi xong hoặc dead 7 ngày
+            },
             "alert_types": {
                 "connection_lost": {
                     "enabled": True,
@@ -111,6 +142,42 @@ class NotificationService:
                     "message": "Interface ngừng hoạt động",
                     "priority": "high"
                 },
+                "bandwidth_saturation": {
+                    "enabled": True,
+                    "channels": ["email"],
+                    "message": "Dự báo băng thông sắp bão hòa",
+                    "priority": "medium"
+                },
+                "high_bandwidth": {
+                    "enabled": True,
+                    "channels": ["email"],
+                    "message": "Sử dụng băng thông cao",
+                    "priority": "medium"
+                },
+                "firewall_change": {
+                    "enabled": True,
+                    "channels": ["email"],
+                    "message": "Cấu hình firewall thay đổi",
+                    "priority": "high"
+                },
+                "dhcp_server_down": {
+                    "enabled": True,
+                    "channels": ["email", "sms"],
+                    "message": "DHCP server ngừng hoạt động",
+                    "priority": "high"
+                },
+                "vpn_connection_failed": {
+                    "enabled": True,
+                    "channels": ["email"],
+                    "message": "Kết nối VPN thất bại",
+                    "priority": "medium"
+                },
+                "wireless_interference": {
+                    "enabled": True,
+                    "channels": ["email"],
+                    "message": "Phát hiện nhiễu sóng wireless",
+                    "priority": "low"
+                },
                 "custom": {
                     "enabled": True,
                     "channels": ["email"],
@@ -119,6 +186,20 @@ class NotificationService:
             }
         }
     
+    def _configure_delivery(self):
+        """Áp dụng cấu hình hàng đợi gửi và outbox"""
+        self.dispatch.configure(self.config.get("dispatch", {}))
+        outbox_config = self.config.get("outbox", {})
+        if not outbox_config.get("enabled", False):
+            self.outbox = None
+            return
+        if self.outbox is None:
+            self.outbox = NotificationOutbox(
+                senders={"email": self._send_email_payload, "sms": self._send_sms_payload},
+                dispatch=self.dispatch
+            )
+        self.outbox.configure(outbox_config)
+    
     def _create_default_config(self):
         """Tạo file cấu hình mặc định"""
         self.config = self._get_default_config()
@@ -181,78 +262,129 @@ class NotificationService:
     
     def send_alert(self, device_name, alert_type, message=None, details=None):
         """
-        Gửi thông báo cảnh báo theo cấu hình
+        Gửi thông báo cảnh báo theo cấu hình. Các lượt gửi được đưa vào hàng đợi của từng kênh
+        và hàm trả về ngay, không chờ SendGrid/Twilio.
         
         Args:
             device_name (str): Tên thiết bị MikroTik
             alert_type (str): Loại cảnh báo (phải tồn tại trong cấu hình)
             message (str, optional): Nội dung thông báo tùy chỉnh. Nếu không cung cấp, sẽ sử dụng mặc định
             details (dict, optional): Chi tiết bổ sung về cảnh báo
-            
+        
         Returns:
-            dict: Kết quả gửi thông báo cho từng kênh
+            DeliveryHandle: Handle theo dõi kết quả; handle.result(timeout) trả về kết quả gửi cho từng kênh
         """
         # Kiểm tra xem thông báo có được bật không
         if not self.config["enabled"]:
             logger.info("Thông báo đã bị tắt, bỏ qua gửi cảnh báo")
-            return {"status": "disabled"}
+            return DeliveryHandle.completed({"status": "disabled"}, device_name, alert_type)
         
         # Kiểm tra loại cảnh báo có được hỗ trợ không
         if alert_type not in self.config["alert_types"]:
             logger.error(f"Loại cảnh báo không được hỗ trợ: {alert_type}")
-            return {"status": "error", "message": f"Unsupported alert type: {alert_type}"}
+            return DeliveryHandle.completed(
+                {"status": "error", "message": f"Unsupported alert type: {alert_type}"}, device_name, alert_type
+            )
         
         # Kiểm tra xem loại cảnh báo có được bật không
         alert_config = self.config["alert_types"][alert_type]
         if not alert_config["enabled"]:
             logger.info(f"Cảnh báo loại {alert_type} đã bị tắt, bỏ qua gửi")
-            return {"status": "alert_type_disabled"}
+            return DeliveryHandle.completed({"status": "alert_type_disabled"}, device_name, alert_type)
         
         # Lấy nội dung thông báo
         alert_message = message if message else alert_config.get("message", f"Cảnh báo: {alert_type}")
         
-        # Kết quả gửi thông báo
-        results = {"status": "sent", "channels": {}}
+        handle = DeliveryHandle(device_name, alert_type)
+        payload = {
+            "device_name": device_name,
+            "alert_type": alert_type,
+            "alert_message": alert_message,
+            "details": details,
+            "created_at": time.time()
+        }
         
-        # Gửi thông báo qua các kênh được cấu hình
+        # Các lượt gửi (kênh, người nhận) theo các kênh được cấu hình
+        deliveries = []
         for channel in alert_config["channels"]:
-            if channel == "email" and self.config["channels"]["email"]["enabled"]:
-                email_results = self._send_email_alerts(device_name, alert_type, alert_message, details)
-                results["channels"]["email"] = email_results
-            
-            if channel == "sms" and self.config["channels"]["sms"]["enabled"]:
-                sms_results = self._send_sms_alerts(device_name, alert_type, alert_message)
-                results["channels"]["sms"] = sms_results
-        
-        return results
-    
-    def _send_email_alerts(self, device_name, alert_type, alert_message, details=None):
-        """Gửi cảnh báo qua email cho tất cả người nhận"""
-        recipients = self.config["channels"]["email"]["recipients"]
-        if not recipients:
-            logger.warning("Không có người nhận email được cấu hình")
-            return {"status": "no_recipients"}
+            if channel in ("email", "sms") and self.config["channels"][channel]["enabled"]:
+                recipients = self.config["channels"][channel]["recipients"]
+                if not recipients:
+                    logger.warning(f"Không có người nhận {channel} được cấu hình")
+                    handle.set_channel_result(channel, {"status": "no_recipients"})
+                elif channel == "email" and self.config["channels"]["email"].get("batch", False):
+                    # Gộp người nhận email thành các lượt gửi tối đa MAX_PERSONALIZATIONS người
+                    for start in range(0, len(recipients), MAX_PERSONALIZATIONS):
+                        batch = recipients[start:start + MAX_PERSONALIZATIONS]
+                        deliveries.append((channel, ", ".join(batch), dict(payload, recipients=batch)))
+                else:
+                    deliveries.extend((channel, recipient, payload) for recipient in recipients)
         
-        results = {"recipients": {}}
-        for email in recipients:
-            success = email_service.send_alert_email(email, device_name, alert_type, alert_message, details)
-            results["recipients"][email] = "success" if success else "failed"
+        if self.outbox:
+            # Lưu vào outbox trước, thread của outbox đưa vào hàng đợi gửi và thử lại khi thất bại
+            self.outbox.enqueue(handle, deliveries)
+        else:
+            senders = {"email": self._send_email_payload, "sms": self._send_sms_payload}
+            for channel, recipient, payload in deliveries:
+                self.dispatch.submit(
+                    channel, handle, payload.get("recipients") or recipient, senders[channel], recipient, payload
+                )
         
-        return results
+        handle.seal()
+        return handle
     
-    def _send_sms_alerts(self, device_name, alert_type, alert_message):
-        """Gửi cảnh báo qua SMS cho tất cả người nhận"""
-        recipients = self.config["channels"]["sms"]["recipients"]
-        if not recipients:
-            logger.warning("Không có người nhận SMS được cấu hình")
-            return {"status": "no_recipients"}
-        
-        results = {"recipients": {}}
-        for phone in recipients:
-            success = sms_service.send_alert_sms(phone, device_name, alert_type, alert_message)
-            results["recipients"][phone] = "success" if success else "failed"
-        
-        return results
+    def _send_email_payload(self, email, payload):
+        """Gửi một lượt cảnh báo qua email (chạy trong worker của hàng đợi), gửi gộp nếu payload có danh sách người nhận"""
+        if payload.get("recipients"):
+            results = email_service.send_alert_email_batch(
+                payload["recipients"], payload["device_name"], payload["alert_type"], payload["alert_message"],
+                payload.get("details"), payload.get("created_at")
+            )
+            return all(results.values())
+        return email_service.send_alert_email(
+            email, payload["device_name"], payload["alert_type"], payload["alert_message"], payload.get("details"),
+            payload.get("created_at")
+        )
+    
+    def _send_sms_payload(self, phone, payload):
+        """Gửi một lượt cảnh báo qua SMS (chạy trong worker của hàng đợi)"""
+        return sms_service.send_alert_sms(phone, payload["device_name"], payload["alert_type"], payload["alert_message"])
+    
+    def start(self):
+        """Gửi tiếp các lượt còn trong outbox từ lần chạy trước"""
+        if self.outbox:
+            self.outbox.start()
+    
+    def get_dispatch_metrics(self):
+        """
+        Độ sâu hàng đợi, độ trễ và số lượt gửi thành công/thất bại/bị bỏ của từng kênh,
+        kèm số lượt theo trạng thái trong outbox (khóa "outbox") nếu bật
+        """
+        metrics = self.dispatch.get_metrics()
+        if self.outbox:
+            metrics["outbox"] = self.outbox.get_stats()
+        return metrics
+    
+    def get_dead_letters(self, limit=100):
+        """Các lượt gửi đã thất bại quá số lần thử (rỗng nếu không bật outbox)"""
+        return self.outbox.get_dead_letters(limit) if self.outbox else []
+    
+    def retry_dead_letters(self, ids=None):
+        """Gửi lại các lượt dead (tất cả hoặc theo ID), trả về số lượt được đưa lại vào outbox"""
+        return self.outbox.retry_dead(ids) if self.outbox else 0
+    
+    def shutdown(self, timeout=None):
+        """
+        Gửi hết các thông báo trong hàng đợi (tối đa timeout giây, mặc định theo cấu hình) rồi dừng worker
+        và đóng kết nối tới các nhà cung cấp.
+        Với outbox, các lượt chưa gửi kịp được giữ lại và gửi tiếp ở lần khởi động sau.
+        """
+        if self.outbox:
+            drained = self.outbox.stop(timeout)
+        else:
+            drained = self.dispatch.shutdown(timeout)
+        close_clients()
+        return drained
     
     def get_config(self):
         """Trả về cấu hình hiện tại"""
@@ -261,6 +393,7 @@ class NotificationService:
     def update_config(self, new_config):
         """Cập nhật toàn bộ cấu hình"""
         self.config = new_config
+        self._configure_delivery()
         return self._save_config()
 
 
@@ -269,5 +402,5 @@ notification_service = NotificationService()
 
 # Hàm tiện ích để sử dụng trong các module khác
 def send_alert(device_name, alert_type, message=None, details=None):
-    """Hàm tiện ích để gửi cảnh báo"""
+    """Hàm tiện ích để gửi cảnh báo (không chặn, trả về DeliveryHandle)"""
     return notification_service.send_alert(device_name, alert_type, message, details)
\ No newline at end of file
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module outbox bền vững cho thông báo.
+Mỗi lượt gửi (một người nhận trên một kênh) được ghi vào SQLite (chế độ WAL) trước khi gửi.
+Thread bơm lấy các lượt đến hạn đưa vào hàng đợi gửi theo số chỗ trống của từng kênh, nên khi
+có bão cảnh báo các lượt chờ nằm trong outbox thay vì bị bỏ. Lượt gửi thất bại được thử lại với
+backoff lũy thừa có jitter, quá max_attempts lần thì chuyển sang trạng thái dead (dead-letter).
+Các lượt chưa gửi xong (kể cả đang gửi dở khi tiến trình dừng) được gửi tiếp khi khởi động lại.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+
+from notifications.dispatch_queue import dispatch_queue
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('notification_outbox')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join("data", "notifications", "outbox.db")
+
+# Trạng thái của một lượt gửi
+PENDING = "pending"  # Chờ đến hạn gửi (lần đầu hoặc thử lại)
+SENDING = "sending"  # Đã đưa vào hàng đợi gửi
+DELIVERED = "delivered"
+DEAD = "dead"  # Thất bại quá số lần thử
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, channel, next_attempt);
+"""
+
+
+class NotificationOutbox:
+    """
+    Outbox SQLite cho các lượt gửi thông báo, gửi qua DispatchQueue với thử lại và dead-letter.
+    Hàm gửi của mỗi kênh nhận (người nhận, payload dict) và trả về True nếu gửi thành công.
+    """
+    
+    def __init__(self, path=None, senders=None, dispatch=None, max_attempts=6, base_delay=10,
+                 max_delay=1800, poll_interval=5, retention=7 * 86400):
+        """
+        Khởi tạo
+        
+        Args:
+            path (str): File SQLite (tương đối theo thư mục gốc của dự án)
+            senders (dict): Tên kênh -> hàm gửi(recipient, payload)
+            dispatch (DispatchQueue): Hàng đợi gửi (mặc định hàng đợi dùng chung)
+            max_attempts (int): Số lần gửi tối đa trước khi chuyển sang dead
+            base_delay (float): Thời gian chờ trước lần thử lại đầu tiên (giây), gấp đôi sau mỗi lần
+            max_delay (float): Thời gian chờ tối đa giữa hai lần thử (giây)
+            poll_interval (float): Chu kỳ kiểm tra các lượt đến hạn (giây)
+            retention (float): Thời gian giữ các lượt đã gửi xong hoặc dead (giây)
+        """
+        self.path = self._resolve_path(path or DEFAULT_PATH)
+        self.senders = dict(senders or {})
+        self.dispatch = dispatch or dispatch_queue
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.retention = retention
+        
+        self.local = threading.local()  # Mỗi thread một kết nối SQLite
+        self.lock = threading.Lock()
+        self.handles = {}  # ID lượt gửi -> DeliveryHandle (chỉ các lượt tạo trong tiến trình này)
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_purge = 0
+        self.initialized = False
+    
+    def configure(self, config):
+        """Cập nhật tham số từ khối "outbox" của notification_config.json"""
+        with self.lock:
+            path = self._resolve_path(config.get("path", DEFAULT_PATH))
+            if path != self.path:
+                self.path = path
+                self.local = threading.local()
+                self.initialized = False
+            self.max_attempts = config.get("max_attempts", self.max_attempts)
+            self.base_delay = config.get("base_delay", self.base_delay)
+            self.max_delay = config.get("max_delay", self.max_delay)
+            self.poll_interval = config.get("poll_interval", self.poll_interval)
+            self.retention = config.get("retention", self.retention)
+    
+    @staticmethod
+    def _resolve_path(path):
+        return path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+    
+    def _connection(self):
+        """Kết nối SQLite của thread hiện tại (tạo bảng ở lần đầu)"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            if not self.initialized:
+                connection.executescript(SCHEMA)
+                self.initialized = True
+            self.local.connection = connection
+        return connection
+    
+    def enqueue(self, handle, deliveries):
+        """
+        Ghi các lượt gửi của một cảnh báo vào outbox (một transaction) và đánh thức thread bơm.
+        Chỉ ghi vào SQLite, không chờ gửi.
+        
+        Args:
+            handle (DeliveryHandle): Handle nhận kết quả cuối cùng (gửi được hoặc dead) của từng người nhận
+            deliveries (list): Các tuple (kênh, người nhận, payload dict); lượt gửi gộp có danh sách
+                người nhận trong payload["recipients"]
+        
+        Returns:
+            list: ID của các lượt gửi
+        """
+        now = time.time()
+        connection = self._connection()
+        ids = []
+        with self.lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for channel, recipient, payload in deliveries:
+                    cursor = connection.execute(
+                        "INSERT INTO outbox (channel, recipient, payload, status, next_attempt, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (channel, recipient, json.dumps(payload, ensure_ascii=False, default=str), PENDING, now, now, now)
+                    )
+                    ids.append(cursor.lastrowid)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            
+            if handle is not None:
+                for row_id, (channel, recipient, payload) in zip(ids, deliveries):
+                    handle.add_recipient(channel, len(payload.get("recipients") or [recipient]))
+                    self.handles[row_id] = handle
+        
+        self.start()
+        self.wake_event.set()
+        return ids
+    
+    def start(self):
+        """Bắt đầu thread bơm, gửi tiếp các lượt còn dở từ lần chạy trước"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            # Các lượt đang gửi khi tiến trình trước dừng được gửi lại (at-least-once)
+            resumed = self._connection().execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?", (PENDING, time.time(), SENDING)
+            ).rowcount
+            pending = self._connection().execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+            
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="notification-outbox")
+            self.thread.daemon = True
+            self.thread.start()
+        if pending:
+            logger.info(f"Outbox có {pending} lượt gửi đang chờ ({resumed} lượt gửi dở được gửi lại)")
+    
+    def stop(self, timeout=None):
+        """
+        Dừng thread bơm, gửi nốt hàng đợi trong thời hạn; các lượt chưa gửi vẫn nằm trong outbox
+        
+        Returns:
+            bool: True nếu hàng đợi gửi đã trống trước thời hạn
+        """
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        self.thread = None
+        
+        drained = self.dispatch.shutdown(timeout)
+        with self.lock:
+            # Lượt bị bỏ khỏi hàng đợi khi quá thời hạn: chờ lần khởi động sau
+            self._connection().execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?", (PENDING, time.time(), SENDING)
+            )
+        return drained
+    
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                next_due = self._pump()
+                self._purge()
+            except Exception as e:
+                logger.error(f"Lỗi trong thread outbox: {e}", exc_info=True)
+                next_due = None
+            
+            delay = self.poll_interval if next_due is None else min(self.poll_interval, max(0.0, next_due - time.time()))
+            self.wake_event.wait(delay)
+            self.wake_event.clear()
+    
+    def _pump(self):
+        """
+        Đưa các lượt đến hạn vào hàng đợi gửi (không vượt số chỗ trống của kênh)
+        
+        Returns:
+            float: Thời điểm đến hạn sớm nhất của các lượt còn chờ, None nếu không còn
+        """
+        now = time.time()
+        connection = self._connection()
+        for channel in self.senders:
+            free = self.dispatch.free_slots(channel)
+            if not free:
+                continue
+            
+            with self.lock:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = connection.execute(
+                        "SELECT id, recipient, payload, attempts FROM outbox "
+                        "WHERE status = ? AND channel = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                        (PENDING, channel, now, free)
+                    ).fetchall()
+                    connection.executemany(
+                        "UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?",
+                        [(SENDING, now, row[0]) for row in rows]
+                    )
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+            
+            for row_id, recipient, payload, attempts in rows:
+                if not self.dispatch.submit(channel, None, recipient, self._deliver, row_id, channel, recipient,
+                                            json.loads(payload), attempts):
+                    self._update(row_id, PENDING, attempts, now + self.poll_interval)
+        
+        row = connection.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = ?", (PENDING,)).fetchone()
+        return row[0]
+    
+    def _deliver(self, row_id, channel, recipient, payload, attempts):
+        """Gửi một lượt (chạy trong worker của hàng đợi) và ghi kết quả vào outbox"""
+        error = None
+        try:
+            success = bool(self.senders[channel](recipient, payload))
+            if not success:
+                error = "Nhà cung cấp từ chối hoặc lỗi gửi"
+        except Exception as e:
+            success = False
+            error = str(e)
+        
+        attempts += 1
+        recipients = payload.get("recipients") or recipient
+        if success:
+            self._update(row_id, DELIVERED, attempts)
+            self._finish(row_id, channel, recipients, "success")
+        elif attempts >= self.max_attempts:
+            self._update(row_id, DEAD, attempts, error=error)
+            logger.error(f"Thông báo {channel} đến {recipient} thất bại sau {attempts} lần, chuyển sang dead: {error}")
+            self._finish(row_id, channel, recipients, "failed")
+        else:
+            delay = self.retry_delay(attempts)
+            self._update(row_id, PENDING, attempts, time.time() + delay, error)
+            logger.warning(f"Gửi {channel} đến {recipient} thất bại (lần {attempts}/{self.max_attempts}), "
+                           f"thử lại sau {delay:.0f}s: {error}")
+        
+        # Hàng đợi vừa trống một chỗ: bơm tiếp các lượt đang chờ
+        self.wake_event.set()
+        return success
+    
+    def retry_delay(self, attempts):
+        """Thời gian chờ trước lần thử tiếp theo: backoff lũy thừa, nửa cố định nửa ngẫu nhiên (jitter)"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _update(self, row_id, status, attempts, next_attempt=None, error=None):
+        now = time.time()
+        with self.lock:
+            self._connection().execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt = COALESCE(?, next_attempt), "
+                "updated_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt, now, error, row_id)
+            )
+    
+    def _finish(self, row_id, channel, recipient, outcome):
+        with self.lock:
+            handle = self.handles.pop(row_id, None)
+        if handle is not None:
+            handle.record(channel, recipient, outcome)
+    
+    def _purge(self):
+        """Xóa các lượt đã gửi xong hoặc dead quá thời gian lưu (tối đa mỗi giờ một lần)"""
+        now = time.time()
+        if now - self.last_purge < 3600:
+            return
+        self.last_purge = now
+        with self.lock:
+            deleted = self._connection().execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?", (DELIVERED, DEAD, now - self.retention)
+            ).rowcount
+        if deleted:
+            logger.info(f"Đã xóa {deleted} lượt gửi cũ khỏi outbox")
+    
+    def get_stats(self):
+        """Số lượt gửi theo trạng thái và tuổi (giây) của lượt chờ lâu nhất"""
+        connection = self._connection()
+        stats = {status: 0 for status in (PENDING, SENDING, DELIVERED, DEAD)}
+        for status, total in connection.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+            stats[status] = total
+        oldest = connection.execute(
+            "SELECT MIN(created_at) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+        ).fetchone()[0]
+        stats["oldest_pending_age"] = time.time() - oldest if oldest is not None else None
+        return stats
+    
+    def get_dead_letters(self, limit=100):
+        """Các lượt gửi dead gần nhất"""
+        rows = self._connection().execute(
+            "SELECT id, channel, recipient, payload, attempts, created_at, updated_at, last_error FROM outbox "
+            "WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (DEAD, limit)
+        ).fetchall()
+        return [
+            {
+                "id": row_id, "channel": channel, "recipient": recipient, "payload": json.loads(payload),
+                "attempts": attempts, "created_at": created_at, "failed_at": updated_at, "last_error": error
+            }
+            for row_id, channel, recipient, payload, attempts, created_at, updated_at, error in rows
+        ]
+    
+    def retry_dead(self, ids=None):
+        """Đưa các lượt dead (tất cả hoặc theo ID) về trạng thái chờ gửi với số lần thử làm lại từ đầu"""
+        now = time.time()
+        query = "UPDATE outbox SET status = ?, attempts = 0, next_attempt = ?, updated_at = ? WHERE status = ?"
+        params = [PENDING, now, now, DEAD]
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return 0
+            query += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += ids
+        with self.lock:
+            count = self._connection().execute(query, params).rowcount
+        if count:
+            self.start()
+            self.wake_event.set()
+        return count
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module client dùng chung cho các nhà cung cấp thông báo (SendGrid, Twilio).
+Mỗi bộ thông tin xác thực có một client sống lâu với requests.Session và pool kết nối
+(keep-alive), dùng chung giữa các lượt gửi và các worker thay vì tạo client, kết nối TCP
+và bắt tay TLS mới cho mỗi email/SMS.
+Địa chỉ API có thể đổi qua biến môi trường SENDGRID_API_HOST và TWILIO_API_BASE_URL
+(ví dụ trỏ tới endpoint giả lập khi thử nghiệm).
+"""
+
+import os
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('provider_clients')
+
+SENDGRID_HOST = "https://api.sendgrid.com"
+TWILIO_API_HOST = "https://api.twilio.com"
+
+# Số kết nối giữ trong pool của mỗi client (nên không nhỏ hơn số worker gửi của kênh)
+POOL_SIZE = 10
+# Timeout mỗi request (giây)
+TIMEOUT = 10
+
+
+class SendGridClient:
+    """
+    Client gửi mail SendGrid (v3/mail/send) qua một requests.Session dùng chung, an toàn khi
+    gọi từ nhiều thread. Thay cho SendGridAPIClient (mỗi request mở kết nối mới qua urllib).
+    """
+    
+    def __init__(self, api_key, host=None, timeout=TIMEOUT, pool_size=POOL_SIZE):
+        """
+        Khởi tạo
+        
+        Args:
+            api_key (str): SendGrid API key
+            host (str): Địa chỉ API (mặc định SENDGRID_API_HOST hoặc api.sendgrid.com)
+            timeout (float): Timeout mỗi request (giây)
+            pool_size (int): Số kết nối giữ trong pool
+        """
+        self.url = (host or os.environ.get("SENDGRID_API_HOST", SENDGRID_HOST)).rstrip("/") + "/v3/mail/send"
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json",
+            "User-Agent": "mikrotik-monitor"
+        })
+    
+    def send(self, message):
+        """
+        Gửi mail
+        
+        Args:
+            message (Mail | dict): Mail của sendgrid.helpers.mail hoặc payload JSON của v3/mail/send
+        
+        Returns:
+            requests.Response: Phản hồi của SendGrid (status_code, text)
+        """
+        payload = message if isinstance(message, dict) else message.get()
+        return self.session.post(self.url, json=payload, timeout=self.timeout)
+    
+    def close(self):
+        self.session.close()
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """
+    TwilioHttpClient với pool kết nối cho cả http/https; nếu có base_url thì chuyển các request
+    tới api.twilio.com sang địa chỉ đó
+    """
+    
+    def __init__(self, base_url=None, timeout=TIMEOUT, pool_size=POOL_SIZE):
+        super().__init__(pool_connections=True, timeout=timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.base_url = base_url.rstrip("/") if base_url else None
+    
+    def request(self, method, url, *args, **kwargs):
+        if self.base_url and url.startswith(TWILIO_API_HOST):
+            url = self.base_url + url[len(TWILIO_API_HOST):]
+        return super().request(method, url, *args, **kwargs)
+    
+    def close(self):
+        self.session.close()
+
+
+def build_twilio_client(account_sid, auth_token, base_url=None, timeout=TIMEOUT, pool_size=POOL_SIZE):
+    """Tạo Twilio Client mới với pool kết nối riêng (base_url mặc định theo TWILIO_API_BASE_URL)"""
+    http_client = PooledTwilioHttpClient(base_url or os.environ.get("TWILIO_API_BASE_URL"), timeout, pool_size)
+    return Client(account_sid, auth_token, http_client=http_client)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(key, factory):
+    """Client dùng chung theo key (tạo ở lần gọi đầu)"""
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+            logger.info(f"Đã tạo client {key[0]} dùng chung")
+        return client
+
+
+def get_sendgrid_client(api_key, host=None):
+    """SendGridClient dùng chung của API key"""
+    host = host or os.environ.get("SENDGRID_API_HOST", SENDGRID_HOST)
+    return _shared(("sendgrid", api_key, host), lambda: SendGridClient(api_key, host))
+
+
+def get_twilio_client(account_sid, auth_token, base_url=None):
+    """Twilio Client dùng chung của tài khoản"""
+    base_url = base_url or os.environ.get("TWILIO_API_BASE_URL")
+    return _shared(("twilio", account_sid, auth_token, base_url),
+                   lambda: build_twilio_client(account_sid, auth_token, base_url))
+
+
+def close_clients():
+    """Đóng các kết nối của mọi client dùng chung"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        if isinstance(client, Client):
+            client.http_client.close()
+        else:
+            client.close()
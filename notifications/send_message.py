@@ -7,7 +7,8 @@ Module cung cấp hàm tiện ích để gửi SMS qua Twilio API
 
 import os
 from dotenv import load_dotenv
-from twilio.rest import Client
+
+from notifications.provider_clients import get_twilio_client
 
 # Tải biến môi trường từ file .env
 load_dotenv()
@@ -43,8 +44,8 @@ def send_twilio_message(to_phone_number: str, message: str) -> None:
         
         raise ValueError(f"Thiếu các biến môi trường Twilio: {', '.join(missing)}")
     
-    # Khởi tạo client Twilio
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    # Client Twilio dùng chung giữa các lần gọi
+    client = get_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
     # Gửi tin nhắn SMS
     try:
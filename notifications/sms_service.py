@@ -10,9 +10,10 @@ import sys
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 
+from notifications.provider_clients import get_twilio_client
+
 # Tải các biến môi trường
 load_dotenv()
 
@@ -58,8 +59,8 @@ class SMSService:
             return False
         
         try:
-            # Khởi tạo Twilio client
-            client = Client(self.account_sid, self.auth_token)
+            # Twilio client dùng chung (giữ kết nối giữa các lượt gửi)
+            client = get_twilio_client(self.account_sid, self.auth_token)
             
             # Gửi tin nhắn
             message_result = client.messages.create(
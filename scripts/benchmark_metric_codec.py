@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Đo hiệu quả nén và tốc độ của codec Gorilla (monitoring/metric_codec.py) trên dữ liệu
+giống RouterOS: bộ đếm rx-byte của interface (tăng dần theo lưu lượng ngày/đêm), tốc độ rx
+bits/s tính từ bộ đếm, cpu-load (số nguyên %), memory (%) và RTT thăm dò TCP (ms),
+lấy mẫu mỗi interval giây với độ lệch thời gian ngẫu nhiên của polling.
+
+Báo cáo cho mỗi loại chuỗi: số byte mỗi điểm (so với 16 byte timestamp + float64 không nén),
+tốc độ nén và giải nén (điểm/giây).
+
+Sử dụng:
+  python benchmark_metric_codec.py
+  python benchmark_metric_codec.py --samples 8640 --series 50 --interval 10 --jitter 0.05
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from monitoring.metric_codec import encode_series, decode_series, TIMESTAMP_RESOLUTION
+
+
+def generate_series(kind, samples, interval, jitter, rng):
+    """
+    Sinh một chuỗi (timestamps, values) giống dữ liệu thu từ RouterOS
+    
+    Args:
+        kind (str): counter, rate, cpu, memory hoặc rtt
+        samples (int): Số điểm
+        interval (float): Chu kỳ polling (giây)
+        jitter (float): Độ lệch tối đa (giây) của thời điểm lấy mẫu
+        rng (Generator): Bộ sinh số ngẫu nhiên
+    """
+    start = float(int(time.time()) - samples * interval)
+    timestamps = start + np.arange(samples) * interval + rng.uniform(0, jitter, samples)
+    
+    # Lưu lượng theo chu kỳ ngày/đêm (bits/s) với dao động ngẫu nhiên
+    hours = (timestamps % 86400) / 3600
+    traffic = 2e8 * (0.6 + 0.4 * np.sin((hours - 9) / 24 * 2 * np.pi)) * rng.lognormal(0, 0.3, samples)
+    
+    if kind == "counter":
+        # Bộ đếm rx-byte 64 bit của interface
+        values = np.cumsum(np.round(traffic * interval / 8)) + 10 ** 12
+    elif kind == "rate":
+        # Tốc độ bits/s tính từ hiệu hai lần đọc bộ đếm byte
+        counter = np.cumsum(np.round(traffic * interval / 8))
+        values = np.diff(counter, prepend=0) * 8 / np.diff(timestamps, prepend=timestamps[0] - interval)
+    elif kind == "cpu":
+        values = np.clip(np.round(10 + 30 * traffic / 4e8 + rng.normal(0, 3, samples)), 0, 100)
+    elif kind == "memory":
+        # Memory thay đổi chậm theo từng bước trang bộ nhớ
+        used = 300 * 1024 * 1024 + np.cumsum(rng.choice([-4096, 0, 0, 0, 4096], samples))
+        values = used / (1024 * 1024 * 1024) * 100
+    elif kind == "rtt":
+        values = np.round(rng.gamma(4, 2, samples), 3)
+    else:
+        raise ValueError(f"Loại chuỗi không hợp lệ: {kind}")
+    return timestamps, values.astype(np.float64)
+
+
+def benchmark(kind, args, rng):
+    """Nén/giải nén args.series chuỗi cùng loại, trả về (byte mỗi điểm, điểm/giây khi nén, khi giải nén)"""
+    series = [generate_series(kind, args.samples, args.interval, args.jitter, rng) for _ in range(args.series)]
+    total = args.samples * args.series
+    
+    started = time.perf_counter()
+    encoded = [encode_series(timestamps, values) for timestamps, values in series]
+    encode_time = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    decoded = [decode_series(data) for data in encoded]
+    decode_time = time.perf_counter() - started
+    
+    # Kiểm tra giải nén đúng (timestamp được làm tròn theo TIMESTAMP_RESOLUTION)
+    for (timestamps, values), (decoded_timestamps, decoded_values) in zip(series, decoded):
+        if not np.array_equal(values.view(np.uint64), decoded_values.view(np.uint64)) or \
+                np.abs(decoded_timestamps - timestamps).max() > 0.5 / TIMESTAMP_RESOLUTION + 1e-6:
+            raise AssertionError(f"Giải nén chuỗi {kind} không khớp dữ liệu gốc")
+    
+    size = sum(len(data) for data in encoded)
+    return size / total, total / encode_time, total / decode_time
+
+
+def parse_arguments():
+    """Phân tích tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description='Đo hiệu quả nén của codec chuỗi chỉ số')
+    parser.add_argument('--samples', type=int, default=8640, help='Số điểm mỗi chuỗi (mặc định 1 ngày với chu kỳ 10s)')
+    parser.add_argument('--series', type=int, default=20, help='Số chuỗi mỗi loại')
+    parser.add_argument('--interval', type=float, default=10, help='Chu kỳ polling (giây)')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Độ lệch tối đa của thời điểm lấy mẫu (giây)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed của bộ sinh số ngẫu nhiên')
+    return parser.parse_args()
+
+
+def main():
+    """Hàm chính"""
+    args = parse_arguments()
+    rng = np.random.default_rng(args.seed)
+    
+    print(f"{args.series} chuỗi x {args.samples} điểm mỗi loại, chu kỳ {args.interval}s, lệch tối đa {args.jitter}s")
+    print(f"{'Loại':<10}{'byte/điểm':>12}{'tỉ lệ nén':>12}{'nén (điểm/s)':>16}{'giải nén (điểm/s)':>20}")
+    for kind in ("counter", "rate", "cpu", "memory", "rtt"):
+        bytes_per_sample, encode_rate, decode_rate = benchmark(kind, args, rng)
+        print(f"{kind:<10}{bytes_per_sample:>12.2f}{16 / bytes_per_sample:>11.1f}x"
+              f"{encode_rate:>16,.0f}{decode_rate:>20,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+So sánh thông lượng gửi thông báo khi tạo client mới cho mỗi lượt gửi (cách cũ: SendGridAPIClient
+và Twilio Client mới mỗi email/SMS) với client dùng chung có pool kết nối
+(notifications/provider_clients.py), trên server SendGrid/Twilio giả lập chạy cục bộ.
+
+Báo cáo số lượt gửi mỗi giây và số kết nối mới server nhận được cho mỗi cách.
+Dùng --rtt để giả lập độ trễ mạng tới nhà cung cấp và --tls để tính cả bắt tay TLS.
+
+Sử dụng:
+  python benchmark_provider_clients.py
+  python benchmark_provider_clients.py --messages 400 --workers 4 --rtt 20 --tls
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_provider_server import FakeProviderServer
+
+API_KEY = "SG.fake-key"
+ACCOUNT_SID = "AC" + "0" * 32
+AUTH_TOKEN = "fake-token"
+
+
+def build_mail(index):
+    """Mail cảnh báo mẫu"""
+    from sendgrid.helpers.mail import Mail, Email, To, Content
+    return Mail(
+        from_email=Email("mikrotik-monitor@example.com"),
+        to_emails=To(f"admin{index}@example.com"),
+        subject="[CẢNH BÁO] connection_lost - Router1",
+        html_content=Content("text/html", "<p>Mất kết nối đến thiết bị Router1</p>")
+    )
+
+
+def make_senders(url):
+    """Các cách gửi cần so sánh: tên -> hàm gửi(index)"""
+    from sendgrid import SendGridAPIClient
+    from notifications.provider_clients import SendGridClient, build_twilio_client
+    
+    def sendgrid_per_message(index):
+        response = SendGridAPIClient(API_KEY, host=url).send(build_mail(index))
+        assert response.status_code == 202
+    
+    shared_sendgrid = SendGridClient(API_KEY, host=url)
+    
+    def sendgrid_shared(index):
+        response = shared_sendgrid.send(build_mail(index))
+        assert response.status_code == 202
+    
+    def twilio_per_message(index):
+        client = build_twilio_client(ACCOUNT_SID, AUTH_TOKEN, base_url=url)
+        client.messages.create(body="Mất kết nối đến Router1", from_="+15005550006", to=f"+8490{index:07d}")
+    
+    shared_twilio = build_twilio_client(ACCOUNT_SID, AUTH_TOKEN, base_url=url)
+    
+    def twilio_shared(index):
+        shared_twilio.messages.create(body="Mất kết nối đến Router1", from_="+15005550006", to=f"+8490{index:07d}")
+    
+    return [
+        ("sendgrid mỗi lượt một client", sendgrid_per_message),
+        ("sendgrid client dùng chung", sendgrid_shared),
+        ("twilio mỗi lượt một client", twilio_per_message),
+        ("twilio client dùng chung", twilio_shared),
+    ]
+
+
+def run(send, messages, workers):
+    """Gửi messages lượt với workers thread, trả về thời gian (giây)"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(send, range(messages)))
+    return time.perf_counter() - started
+
+
+def parse_arguments():
+    """Phân tích tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description='So sánh client mới mỗi lượt gửi với client dùng chung')
+    parser.add_argument('--messages', type=int, default=200, help='Số lượt gửi mỗi cách')
+    parser.add_argument('--workers', type=int, default=2, help='Số thread gửi (như số worker của kênh)')
+    parser.add_argument('--rtt', type=float, default=10, help='Độ trễ mạng giả lập (ms)')
+    parser.add_argument('--tls', action='store_true', help='Dùng HTTPS với chứng chỉ tự ký')
+    return parser.parse_args()
+
+
+def main():
+    """Hàm chính"""
+    args = parse_arguments()
+    server = FakeProviderServer(rtt=args.rtt / 1000, tls=args.tls).start()
+    if server.certfile:
+        # Tin cậy chứng chỉ tự ký cho cả urllib (SendGridAPIClient) và requests
+        os.environ["SSL_CERT_FILE"] = server.certfile
+        os.environ["REQUESTS_CA_BUNDLE"] = server.certfile
+    
+    print(f"{args.messages} lượt gửi mỗi cách, {args.workers} thread, RTT giả lập {args.rtt}ms, "
+          f"{'HTTPS' if args.tls else 'HTTP'} ({server.url})")
+    print(f"{'Cách gửi':<32}{'lượt/giây':>12}{'kết nối mới':>14}")
+    try:
+        for name, send in make_senders(server.url):
+            send(0)  # Khởi động (import, tạo kết nối đầu tiên của client dùng chung)
+            server.reset_counters()
+            elapsed = run(send, args.messages, args.workers)
+            counters = server.reset_counters()
+            print(f"{name:<32}{args.messages / elapsed:>12,.1f}{counters.get('connections', 0):>14}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Server giả lập API của SendGrid (POST /v3/mail/send) và Twilio (POST /2010-04-01/Accounts/<sid>/Messages.json)
+để thử nghiệm và đo hiệu năng gửi thông báo mà không gửi thật.
+
+Giữ kết nối HTTP/1.1 (keep-alive) như API thật và đếm số kết nối mới, số request của mỗi nhà cung cấp.
+Tùy chọn --rtt giả lập độ trễ mạng: mỗi request chờ 1 RTT, mỗi kết nối mới chờ thêm 1 RTT (TCP)
+và 1 RTT nữa cho bắt tay TLS nếu bật --tls (chứng chỉ tự ký tạo bằng openssl).
+
+Sử dụng:
+  python fake_provider_server.py --port 8025
+  python fake_provider_server.py --port 8443 --tls --rtt 20
+  SENDGRID_API_HOST=http://127.0.0.1:8025 TWILIO_API_BASE_URL=http://127.0.0.1:8025 python test_notification.py
+"""
+
+import os
+import ssl
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def generate_certificate(directory):
+    """Tạo chứng chỉ tự ký cho localhost/127.0.0.1, trả về (certfile, keyfile)"""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+        "-keyout", keyfile, "-out", certfile, "-subj", "/CN=localhost",
+        "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    """Xử lý request của SendGrid và Twilio giả lập"""
+    
+    protocol_version = "HTTP/1.1"
+    # Gửi header và nội dung phản hồi trong một lần ghi, tắt Nagle như server API thật
+    # (tránh độ trễ delayed ACK trên kết nối được dùng lại)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        server = self.server
+        server.count("connections")
+        if server.ssl_context:
+            # TCP + bắt tay TLS
+            time.sleep(2 * server.rtt)
+            self.request = server.ssl_context.wrap_socket(self.request, server_side=True)
+        else:
+            time.sleep(server.rtt)
+        super().setup()
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.rtt)
+        
+        if self.path == "/v3/mail/send":
+            self.server.count("sendgrid")
+            payload = json.loads(body or b"{}")
+            recipients = sum(len(item.get("to", [])) for item in payload.get("personalizations", []))
+            self.server.count("sendgrid_recipients", recipients)
+            self._reply(202, b"")
+        elif self.path.startswith("/2010-04-01/Accounts/") and self.path.endswith("/Messages.json"):
+            self.server.count("twilio")
+            account_sid = self.path.split("/")[3]
+            fields = dict(pair.split("=", 1) for pair in body.decode().split("&") if "=" in pair)
+            self._reply(201, json.dumps({
+                "sid": "SM" + uuid.uuid4().hex,
+                "account_sid": account_sid,
+                "status": "queued",
+                "to": fields.get("To"),
+                "from": fields.get("From"),
+                "body": fields.get("Body")
+            }).encode())
+        else:
+            self._reply(404, b'{"message": "not found"}')
+    
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """Server giả lập chạy trong thread nền"""
+    
+    daemon_threads = True
+    
+    def __init__(self, host="127.0.0.1", port=0, rtt=0.0, tls=False):
+        """
+        Args:
+            host (str): Địa chỉ lắng nghe
+            port (int): Cổng (0 để chọn cổng trống)
+            rtt (float): Độ trễ mạng giả lập (giây)
+            tls (bool): Dùng HTTPS với chứng chỉ tự ký
+        """
+        super().__init__((host, port), ProviderHandler)
+        self.rtt = rtt
+        self.counters = {}
+        self.counter_lock = threading.Lock()
+        self.ssl_context = None
+        self.certfile = None
+        if tls:
+            self.cert_dir = tempfile.mkdtemp(prefix="fake-provider-")
+            self.certfile, keyfile = generate_certificate(self.cert_dir)
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(self.certfile, keyfile)
+        self.thread = None
+    
+    @property
+    def url(self):
+        scheme = "https" if self.ssl_context else "http"
+        return f"{scheme}://127.0.0.1:{self.server_address[1]}"
+    
+    def count(self, name, amount=1):
+        with self.counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def reset_counters(self):
+        with self.counter_lock:
+            counters, self.counters = self.counters, {}
+        return counters
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-provider")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_arguments():
+    """Phân tích tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description='Server giả lập API SendGrid và Twilio')
+    parser.add_argument('--host', default='127.0.0.1', help='Địa chỉ lắng nghe')
+    parser.add_argument('--port', type=int, default=8025, help='Cổng lắng nghe')
+    parser.add_argument('--rtt', type=float, default=0, help='Độ trễ mạng giả lập (ms)')
+    parser.add_argument('--tls', action='store_true', help='Dùng HTTPS với chứng chỉ tự ký')
+    return parser.parse_args()
+
+
+def main():
+    """Hàm chính"""
+    args = parse_arguments()
+    server = FakeProviderServer(args.host, args.port, args.rtt / 1000, args.tls)
+    print(f"Server giả lập SendGrid/Twilio đang chạy tại {server.url}")
+    if server.certfile:
+        print(f"Chứng chỉ tự ký: {server.certfile} (đặt SSL_CERT_FILE và REQUESTS_CA_BUNDLE để tin cậy)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Thống kê: {server.counters}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
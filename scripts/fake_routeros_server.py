@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Server RouterOS API giả lập để thử nghiệm collector RouterOS (không cần router thật)
+
+Hỗ trợ đăng nhập (kiểu mới và challenge MD5), lệnh print trên các menu mà collector dùng
+(/system/identity, /system/resource, /interface, /ip/firewall/filter, /ip/firewall/nat,
+/ip/dhcp-server, /interface/wireless/registration-table, /log) với dữ liệu mẫu,
+lệnh listen (đẩy bản ghi khi dữ liệu thay đổi qua update()/add_log()) và /cancel.
+
+Sử dụng:
+  python fake_routeros_server.py --port 8728 --username admin --password secret
+  python fake_routeros_server.py --routers 100 --port 18728
+"""
+
+import sys
+import time
+import random
+import socket
+import hashlib
+import argparse
+import binascii
+import threading
+import socketserver
+from pathlib import Path
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from routeros_api.base_api import encode_length, decode_length
+
+
+def default_state(name="FakeRouter"):
+    """Dữ liệu mẫu của một router"""
+    return {
+        "/system/identity": [{"name": name}],
+        "/system/resource": [{
+            "cpu-load": "12", "cpu-count": "4", "uptime": "1w2d3h", "version": "7.14 (stable)",
+            "free-memory": str(700 * 1024 * 1024), "total-memory": str(1024 * 1024 * 1024),
+            "free-hdd-space": str(100 * 1024 * 1024), "total-hdd-space": str(128 * 1024 * 1024),
+            "board-name": "CCR2004-16G-2S+", "architecture-name": "arm64",
+        }],
+        "/interface": [
+            {".id": "*1", "name": "ether1", "type": "ether", "mtu": "1500", "running": "true", "disabled": "false",
+             "rx-byte": "1000000", "tx-byte": "500000", "rx-packet": "1000", "tx-packet": "800"},
+            {".id": "*2", "name": "ether2", "type": "ether", "mtu": "1500", "running": "true", "disabled": "false",
+             "rx-byte": "2000000", "tx-byte": "700000", "rx-packet": "2000", "tx-packet": "900"},
+            {".id": "*3", "name": "wlan1", "type": "wlan", "mtu": "1500", "running": "true", "disabled": "false",
+             "rx-byte": "300000", "tx-byte": "900000", "rx-packet": "400", "tx-packet": "700"},
+            {".id": "*4", "name": "l2tp-out1", "type": "l2tp-out", "mtu": "1450", "running": "true", "disabled": "false",
+             "rx-byte": "0", "tx-byte": "0", "rx-packet": "0", "tx-packet": "0"},
+        ],
+        "/interface/ethernet": [
+            {".id": "*1", "name": "ether1", "speed": "1Gbps", "rate": "1Gbps"},
+            {".id": "*2", "name": "ether2", "speed": "1Gbps", "rate": "100Mbps"},
+        ],
+        "/ip/firewall/filter": [
+            {".id": "*1", "chain": "input", "action": "accept", "protocol": "icmp", "disabled": "false"},
+            {".id": "*2", "chain": "input", "action": "drop", "src-address": "10.0.0.0/8", "disabled": "false"},
+        ],
+        "/ip/firewall/nat": [
+            {".id": "*1", "chain": "srcnat", "action": "masquerade", "disabled": "false"},
+        ],
+        "/ip/dhcp-server": [
+            {".id": "*1", "name": "dhcp1", "interface": "ether2", "disabled": "false", "invalid": "false"},
+        ],
+        "/interface/wireless/registration-table": [
+            {".id": "*1", "interface": "wlan1", "mac-address": "AA:BB:CC:00:00:01", "signal-strength": "-62@HT20-7"},
+        ],
+        "/log": [
+            {".id": "*1", "time": "00:00:01", "topics": "system,info", "message": "router rebooted"},
+        ],
+    }
+
+
+class FakeRouterOSHandler(socketserver.BaseRequestHandler):
+    """Xử lý một kết nối API: đọc từng câu lệnh và trả lời theo dữ liệu của server"""
+    
+    def setup(self):
+        self.authenticated = False
+        self.challenge = None
+        self.send_lock = threading.Lock()
+        with self.server.lock:
+            self.server.connections.add(self.request)
+    
+    def finish(self):
+        with self.server.lock:
+            self.server.connections.discard(self.request)
+            self.server.listeners = [listener for listener in self.server.listeners if listener[0] is not self]
+    
+    def handle(self):
+        while True:
+            try:
+                words = self.read_sentence()
+            except (ConnectionError, OSError, IndexError):
+                return
+            if not words:
+                continue
+            
+            command = words[0].decode()
+            attributes = {}
+            tag = None
+            for word in words[1:]:
+                text = word.decode()
+                if text.startswith('.tag='):
+                    tag = text[5:]
+                elif text.startswith('='):
+                    key, _, value = text[1:].partition('=')
+                    attributes[key] = value
+            
+            try:
+                self.dispatch(command, attributes, tag)
+            except OSError:
+                return
+    
+    def dispatch(self, command, attributes, tag):
+        """Chạy một câu lệnh"""
+        server = self.server
+        server.command_count += 1
+        
+        if command == '/login':
+            self.login(attributes, tag)
+            return
+        
+        if not self.authenticated:
+            self.send('!trap', {"message": "not logged in"}, tag)
+            self.send('!done', {}, tag)
+            return
+        
+        if server.latency:
+            time.sleep(server.latency)
+        
+        menu, _, action = command.rpartition('/')
+        if action == 'print' and menu in server.state:
+            with server.lock:
+                rows = [dict(row) for row in server.state[menu]]
+            for row in rows:
+                self.send('!re', row, tag)
+            self.send('!done', {}, tag)
+        elif command == '/interface/ethernet/monitor':
+            # Trạng thái liên kết của các cổng trong "numbers" (chỉ hỗ trợ "once")
+            names = attributes.get('numbers', '').split(',')
+            with server.lock:
+                ports = {row['name']: dict(row) for row in server.state['/interface/ethernet']}
+            for name in names:
+                if name in ports:
+                    self.send('!re', {"name": name, "status": "link-ok", "rate": ports[name]['rate']}, tag)
+            self.send('!done', {}, tag)
+        elif action == 'listen' and menu in server.state:
+            # Không trả lời !done: các bản ghi thay đổi được đẩy về đến khi lệnh bị hủy
+            with server.lock:
+                server.listeners.append((self, menu, tag))
+        elif command == '/cancel':
+            self.cancel(attributes.get('tag'))
+            self.send('!done', {}, tag)
+        else:
+            self.send('!trap', {"message": "no such command"}, tag)
+            self.send('!done', {}, tag)
+    
+    def cancel(self, listen_tag):
+        """Hủy lệnh listen có tag listen_tag (hoặc tất cả lệnh listen của kết nối)"""
+        with self.server.lock:
+            cancelled = [listener for listener in self.server.listeners
+                         if listener[0] is self and listen_tag in (None, listener[2])]
+            self.server.listeners = [listener for listener in self.server.listeners if listener not in cancelled]
+        for _, _, tag in cancelled:
+            self.send('!trap', {"category": "2", "message": "interrupted"}, tag)
+            self.send('!done', {}, tag)
+    
+    def login(self, attributes, tag):
+        """Đăng nhập kiểu mới (name/password) hoặc challenge MD5 (name/response)"""
+        server = self.server
+        if 'password' in attributes:
+            ok = attributes.get('name') == server.username and attributes['password'] == server.password
+        elif 'response' in attributes and self.challenge:
+            digest = hashlib.md5(b'\x00' + server.password.encode() + self.challenge).hexdigest()
+            ok = attributes.get('name') == server.username and attributes['response'] == '00' + digest
+        else:
+            self.challenge = bytes(random.getrandbits(8) for _ in range(16))
+            self.send('!done', {"ret": binascii.hexlify(self.challenge).decode()}, tag)
+            return
+        
+        if ok:
+            self.authenticated = True
+            server.login_count += 1
+            self.send('!done', {}, tag)
+        else:
+            self.send('!trap', {"message": "invalid user name or password (6)"}, tag)
+            self.send('!done', {}, tag)
+    
+    def send(self, reply, attributes, tag=None):
+        """Gửi một câu trả lời"""
+        words = [reply.encode()]
+        words += [f"={key}={value}".encode() for key, value in attributes.items()]
+        if tag is not None:
+            words.append(f".tag={tag}".encode())
+        data = b''.join(encode_length(len(word)) + word for word in words + [b''])
+        with self.send_lock:
+            self.request.sendall(data)
+    
+    def read_sentence(self):
+        """Đọc một câu lệnh (danh sách word, kết thúc bằng word rỗng)"""
+        words = []
+        while True:
+            length = decode_length(self.read_exact)
+            if length == 0:
+                return words
+            words.append(self.read_exact(length))
+    
+    def read_exact(self, length):
+        data = b''
+        while len(data) < length:
+            chunk = self.request.recv(length - len(data))
+            if not chunk:
+                raise ConnectionError("Kết nối đã đóng")
+            data += chunk
+        return data
+
+
+class FakeRouterOSServer(socketserver.ThreadingTCPServer):
+    """Server giả lập một router, chạy trong thread riêng khi dùng start()"""
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, host='127.0.0.1', port=0, username='admin', password='', name='FakeRouter', latency=0.0):
+        super().__init__((host, port), FakeRouterOSHandler)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.state = default_state(name)
+        self.login_count = 0
+        self.command_count = 0
+        self.connections = set()  # Socket của các kết nối API đang mở
+        self.listeners = []  # Các lệnh listen đang chạy: (handler, menu, tag)
+        self.thread = None
+    
+    @property
+    def port(self):
+        return self.server_address[1]
+    
+    def start(self):
+        """Chạy server trong thread nền"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Dừng server và đóng các kết nối đang mở (như khi router mất kết nối)"""
+        self.shutdown()
+        self.server_close()
+        self.drop_connections()
+    
+    def drop_connections(self):
+        """Đóng các kết nối API đang mở, server vẫn nhận kết nối mới"""
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def update(self, menu, match, **values):
+        """Cập nhật các bản ghi của menu có trường khớp với match, ví dụ update('/interface', {'name': 'ether1'}, running='false')"""
+        with self.lock:
+            changed = []
+            for row in self.state[menu]:
+                if all(row.get(key) == value for key, value in match.items()):
+                    row.update(values)
+                    changed.append(dict(row))
+        self.publish(menu, changed)
+    
+    def add_log(self, message, topics="system,info"):
+        """Thêm một dòng log (được đẩy tới các lệnh /log/listen)"""
+        with self.lock:
+            logs = self.state["/log"]
+            entry = {".id": f"*{len(logs) + 1:X}", "time": time.strftime("%H:%M:%S"), "topics": topics, "message": message}
+            logs.append(entry)
+        self.publish("/log", [dict(entry)])
+    
+    def publish(self, menu, rows):
+        """Gửi các bản ghi thay đổi tới các lệnh listen trên menu"""
+        with self.lock:
+            listeners = [listener for listener in self.listeners if listener[1] == menu]
+        for handler, _, tag in listeners:
+            for row in rows:
+                try:
+                    handler.send('!re', row, tag)
+                except OSError:
+                    break
+
+
+def parse_arguments():
+    """Phân tích tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description='Server RouterOS API giả lập')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Địa chỉ lắng nghe')
+    parser.add_argument('--port', type=int, default=8728, help='Cổng lắng nghe (router đầu tiên)')
+    parser.add_argument('--routers', type=int, default=1, help='Số router giả lập (mỗi router một cổng liên tiếp)')
+    parser.add_argument('--username', type=str, default='admin', help='Tên đăng nhập')
+    parser.add_argument('--password', type=str, default='', help='Mật khẩu')
+    parser.add_argument('--latency', type=float, default=0.0, help='Độ trễ giả lập cho mỗi lệnh (giây)')
+    return parser.parse_args()
+
+
+def main():
+    """Hàm chính - chạy các server giả lập đến khi bị dừng"""
+    args = parse_arguments()
+    
+    servers = []
+    for index in range(args.routers):
+        server = FakeRouterOSServer(args.host, args.port + index, args.username, args.password,
+                                    name=f"FakeRouter{index + 1}", latency=args.latency)
+        servers.append(server.start())
+        print(f"Router giả lập FakeRouter{index + 1} đang lắng nghe tại {args.host}:{server.port}")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Đang dừng...")
+    finally:
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
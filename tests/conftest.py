@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Cấu hình pytest: thêm thư mục gốc vào sys.path để import các module của dự án"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra dự báo băng thông: độ dốc, EWMA, thời gian đến khi bão hòa và lọc interface cũ"""
+
+import time
+
+import numpy as np
+import pytest
+
+from monitoring.bandwidth_forecast import BandwidthForecaster, forecast_arrays
+from monitoring.bandwidth_history import BandwidthHistory
+
+
+def ewma(values, alpha):
+    level = values[0]
+    for value in values[1:]:
+        level = alpha * value + (1 - alpha) * level
+    return level
+
+
+class FakeMonitor:
+    """BandwidthMonitor giả lập: lịch sử băng thông thật và tốc độ tối đa cố định"""
+    
+    def __init__(self, speeds):
+        self.bandwidth_history = BandwidthHistory(capacity=20)
+        self.speeds = speeds
+    
+    def get_max_speeds(self, keys):
+        return [self.speeds.get(key) for key in keys]
+
+
+def test_linear_ramp_slope_ewma_and_eta():
+    timestamps = np.arange(10, dtype=np.float64)[None, :] * 60 + 1.7e9
+    rx = (np.arange(10) * 1e6 + 10e6)[None, :]
+    tx = np.full((1, 10), 1e6)
+    result = forecast_arrays(timestamps, rx, tx, np.array([10]), np.array([100e6]), ewma_alpha=0.5)
+    
+    # rx tăng 1 Mbps mỗi phút
+    assert result["rx_slope"][0] == pytest.approx(1e6 / 60)
+    assert result["tx_slope"][0] == pytest.approx(0, abs=1e-9)
+    assert result["rx_ewma"][0] == pytest.approx(ewma(rx[0].tolist(), 0.5))
+    assert result["tx_ewma"][0] == pytest.approx(1e6)
+    assert result["utilization"][0] == pytest.approx(result["rx_ewma"][0] / 100e6)
+    expected_eta = (95e6 - result["rx_ewma"][0]) / (1e6 / 60)
+    assert result["time_to_saturation"][0] == pytest.approx(expected_eta)
+
+
+def test_padding_unknown_speed_and_saturated_rows():
+    columns = 6
+    timestamps = np.tile(np.arange(columns, dtype=np.float64), (3, 1))
+    rx = np.array([
+        [999e6, 999e6, 1e6, 2e6, 3e6, 4e6],  # Hai cột đầu là phần đệm, chỉ 4 mẫu hợp lệ
+        [1e6, 2e6, 3e6, 4e6, 5e6, 6e6],
+        [96e6] * columns,
+    ])
+    tx = np.zeros((3, columns))
+    counts = np.array([4, 6, 6])
+    speeds = np.array([100e6, np.nan, 100e6])
+    result = forecast_arrays(timestamps, rx, tx, counts, speeds, ewma_alpha=0.3)
+    
+    assert result["rx_slope"][0] == pytest.approx(1e6)
+    assert result["rx_ewma"][0] == pytest.approx(ewma([1e6, 2e6, 3e6, 4e6], 0.3))
+    # Không biết tốc độ tối đa: không dự báo bão hòa
+    assert np.isinf(result["time_to_saturation"][1])
+    assert np.isnan(result["utilization"][1])
+    # Đã vượt ngưỡng bão hòa
+    assert result["time_to_saturation"][2] == 0
+
+
+def test_forecaster_skips_short_and_stale_histories():
+    monitor = FakeMonitor({"1_ether1": 100e6, "1_ether2": 100e6, "2_ether1": 100e6})
+    now = time.time()
+    history = monitor.bandwidth_history
+    for step in range(10):
+        history.append("1_ether1", now - 90 + step * 10, 10e6 + step * 1e6, 1e6)
+        history.append("2_ether1", now - 7200 + step * 10, 10e6, 1e6)
+    for step in range(3):
+        history.append("1_ether2", now - 20 + step * 10, 5e6, 1e6)
+    
+    forecaster = BandwidthForecaster(monitor, min_samples=5, ewma_alpha=0.3, max_age=600)
+    forecasts = forecaster.run()
+    
+    # 1_ether2 chưa đủ mẫu, 2_ether1 không có mẫu mới trong max_age
+    assert set(forecasts) == {"1_ether1"}
+    forecast = forecaster.get_forecast(1, "ether1")
+    assert forecast["router_id"] == 1 and forecast["interface"] == "ether1"
+    assert forecast["samples"] == 10
+    assert forecast["rx_slope"] == pytest.approx(1e5)
+    assert 0 < forecast["time_to_saturation"] < 1000
+    assert forecaster.get_forecasts(router_id=2) == []
+    assert forecaster.get_saturating(1000) == [forecast]
+    assert forecaster.get_saturating(1) == []
+
+
+def test_forecaster_clears_results_when_nothing_is_fresh():
+    monitor = FakeMonitor({"1_ether1": 100e6})
+    for step in range(6):
+        monitor.bandwidth_history.append("1_ether1", 1000 + step, 1e6, 1e6)
+    
+    forecaster = BandwidthForecaster(monitor, min_samples=5)
+    assert set(forecaster.run()) == {"1_ether1"}
+    assert forecaster.run(max_age=60) == {}
+    assert forecaster.get_forecasts() == []
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra sketch phân vị băng thông: sai số tương đối, gộp sketch và cửa sổ ngày/tháng"""
+
+import time
+import random
+
+import numpy as np
+import pytest
+
+from monitoring.bandwidth_percentile import QuantileSketch, BandwidthPercentiles, RELATIVE_ACCURACY
+
+
+def heavy_tailed_mix(seed=7):
+    """9.700 mẫu 5-20 kbps và 300 mẫu 50-100 Mbps (p95 thật khoảng 19,7 kbps)"""
+    rng = random.Random(seed)
+    values = [rng.uniform(5e3, 20e3) for _ in range(9700)] + [rng.uniform(50e6, 100e6) for _ in range(300)]
+    rng.shuffle(values)
+    return values
+
+
+def assert_within_accuracy(sketch, values, quantile):
+    # Sketch trả về giá trị đại diện của bucket chứa mẫu có hạng q * (n - 1)
+    expected = float(np.quantile(values, quantile, method="lower"))
+    assert sketch.quantile(quantile) == pytest.approx(expected, rel=RELATIVE_ACCURACY * 1.001)
+
+
+@pytest.mark.parametrize("quantile", [0.5, 0.9, 0.95, 0.97, 0.99, 1.0])
+def test_heavy_tailed_mix_stays_within_relative_accuracy(quantile):
+    values = heavy_tailed_mix()
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    assert_within_accuracy(sketch, values, quantile)
+
+
+def test_merged_sketches_keep_accuracy():
+    values = heavy_tailed_mix()
+    parts = [QuantileSketch() for _ in range(4)]
+    for index, value in enumerate(values):
+        parts[index % 4].add(value)
+    
+    merged = QuantileSketch()
+    for part in parts:
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert_within_accuracy(merged, values, 0.95)
+    
+    restored = QuantileSketch.from_dict(merged.to_dict())
+    assert restored.quantile(0.95) == merged.quantile(0.95)
+
+
+def test_zero_values_and_bin_limit():
+    sketch = QuantileSketch(max_bins=8)
+    for value in [0, 0, 0] + [10 ** exponent for exponent in range(1, 10)]:
+        sketch.add(value)
+    
+    assert sketch.quantile(0) == 0
+    assert len(sketch.bins) <= 8
+    # Bucket thấp bị gộp khi vượt max_bins, phân vị cao vẫn chính xác
+    assert sketch.quantile(1.0) == pytest.approx(1e9, rel=RELATIVE_ACCURACY)
+    assert QuantileSketch().quantile(0.95) is None
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_windows_and_router_aggregation():
+    percentiles = BandwidthPercentiles(retain=2)
+    now = time.time()
+    for step in range(100):
+        percentiles.add("1_ether1", now, 1e6 * (step + 1), 1e5)
+        percentiles.add("1_ether2", now, 2e6, 2e5)
+        percentiles.add("2_ether1", now, 50e6, 5e6)
+    
+    result = percentiles.percentile("1_ether1", 0.95)
+    assert result["samples"] == 100
+    assert result["rx"] == pytest.approx(95e6, rel=RELATIVE_ACCURACY)
+    assert result["tx"] == pytest.approx(1e5, rel=RELATIVE_ACCURACY)
+    
+    router = percentiles.percentile(percentiles.router_keys(1), 0.5, window="daily")
+    assert router["samples"] == 200
+    assert sorted(percentiles.router_keys(1)) == ["1_ether1", "1_ether2"]
+    
+    with pytest.raises(ValueError):
+        percentiles.merged(["1_ether1"], window="weekly")
+
+
+def test_old_periods_are_dropped():
+    percentiles = BandwidthPercentiles(retain=2)
+    for month in (1, 2, 3):
+        timestamp = time.mktime((2026, month, 15, 12, 0, 0, 0, 0, -1))
+        percentiles.add("1_ether1", timestamp, 1e6, 1e6)
+    assert percentiles.periods("1_ether1") == ["2026-02", "2026-03"]
+    assert percentiles.percentile("1_ether1", period="2026-01")["rx"] is None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra lập lịch các bước kiểm tra: độ lệch pha, gộp bước kiểm tra và bỏ mục cũ trong heap"""
+
+from monitoring.check_scheduler import CheckScheduler, router_phase
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+def pop_all(scheduler, now):
+    return {router_id: (sorted(checks), due_at) for router_id, checks, due_at in scheduler.pop_due(now)}
+
+
+def test_router_phase_is_stable_and_in_range():
+    phases = [router_phase(router_id) for router_id in range(1, 200)]
+    assert all(0 <= phase < 1 for phase in phases)
+    assert router_phase(7) == router_phase("7")
+    assert len(set(phases)) == len(phases)
+
+
+def test_first_run_follows_router_phase():
+    scheduler = CheckScheduler(clock=FakeClock())
+    scheduler.sync([1, 2], {"connection": 60, "resources": 300})
+    
+    # Lần chạy đầu của mọi bước kiểm tra nằm trong chu kỳ cơ sở, tại độ lệch pha của router
+    due = pop_all(scheduler, 60)
+    for router_id in (1, 2):
+        assert due[router_id] == (["connection", "resources"], router_phase(router_id) * 60)
+
+
+def test_multiple_intervals_coalesce():
+    scheduler = CheckScheduler(clock=FakeClock())
+    scheduler.sync([1], {"connection": 60, "resources": 120})
+    phase = router_phase(1) * 60
+    
+    assert pop_all(scheduler, phase)[1][0] == ["connection", "resources"]
+    assert pop_all(scheduler, phase + 60)[1][0] == ["connection"]
+    assert pop_all(scheduler, phase + 120)[1][0] == ["connection", "resources"]
+
+
+def test_missed_runs_are_skipped():
+    scheduler = CheckScheduler(clock=FakeClock())
+    scheduler.sync([1], {"connection": 60})
+    phase = router_phase(1) * 60
+    
+    # Quá tải 10 chu kỳ: chỉ chạy một lần rồi xếp lịch tiếp từ thời điểm hiện tại
+    assert list(pop_all(scheduler, phase + 600)) == [1]
+    assert pop_all(scheduler, phase + 600) == {}
+    assert scheduler.next_due() == phase + 660
+
+
+def test_rescheduled_entries_discard_stale_heap_items():
+    scheduler = CheckScheduler(clock=FakeClock())
+    scheduler.sync([1], {"connection": 60})
+    phase = router_phase(1) * 60
+    pop_all(scheduler, phase)
+    
+    # Đổi chu kỳ: mục cũ (phase + 60) vẫn nằm trong heap nhưng bị bỏ qua
+    assert scheduler.set_interval(1, "connection", 300, now=phase)
+    assert scheduler.next_due() == phase + 300
+    assert pop_all(scheduler, phase + 60) == {}
+    assert scheduler.get_interval(1, "connection") == 300
+
+
+def test_expedite_runs_once_then_keeps_interval():
+    clock = FakeClock()
+    scheduler = CheckScheduler(clock=clock)
+    scheduler.sync([1], {"connection": 60})
+    phase = router_phase(1) * 60
+    pop_all(scheduler, phase)
+    
+    clock.now = phase + 10
+    assert scheduler.expedite(1, "connection")
+    assert list(pop_all(scheduler, clock.now)) == [1]
+    # Sau lần chạy sớm, lịch quay lại các mốc phase + k * interval, mục cũ không chạy thêm lần nữa
+    assert scheduler.next_due() == phase + 60
+    assert list(pop_all(scheduler, phase + 60)) == [1]
+    assert scheduler.next_due() == phase + 120
+
+
+def test_sync_removes_routers():
+    scheduler = CheckScheduler(clock=FakeClock())
+    assert scheduler.sync([1, 2], {"connection": 60}) == (2, 0)
+    assert scheduler.sync([2], {"connection": 60}) == (0, 1)
+    assert list(pop_all(scheduler, 60)) == [2]
+    assert len(scheduler) == 1
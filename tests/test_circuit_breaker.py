@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra các chuyển trạng thái của circuit breaker theo router"""
+
+import pytest
+
+from monitoring import circuit_breaker
+from monitoring.circuit_breaker import RouterCircuitBreakers, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeClock:
+    """Thay time.monotonic để điều khiển thời gian backoff"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def breakers(clock):
+    return RouterCircuitBreakers(failure_threshold=3, base_backoff=10, max_backoff=40, multiplier=2, probe_timeout=60)
+
+
+def fail(breakers, router_id, times, start=1):
+    for observed_at in range(start, start + times):
+        breakers.record(router_id, False, observed_at)
+    return start + times
+
+
+def state(breakers, router_id):
+    return breakers.get_states().get(router_id, {"state": CLOSED})["state"]
+
+
+def test_opens_after_threshold(breakers):
+    fail(breakers, 1, 2)
+    assert state(breakers, 1) == CLOSED
+    assert breakers.allow_request(1)
+    
+    fail(breakers, 1, 1, start=3)
+    assert state(breakers, 1) == OPEN
+    assert not breakers.allow_request(1)
+    assert breakers.get_open_routers() == [1]
+
+
+def test_success_resets_failures(breakers):
+    next_at = fail(breakers, 1, 2)
+    breakers.record(1, True, next_at)
+    fail(breakers, 1, 2, start=next_at + 1)
+    assert state(breakers, 1) == CLOSED
+
+
+def test_half_open_probe_after_backoff(breakers, clock):
+    fail(breakers, 1, 3)
+    clock.now += 9
+    assert not breakers.allow_request(1)
+    
+    clock.now += 1
+    assert breakers.allow_request(1)
+    assert state(breakers, 1) == HALF_OPEN
+    assert breakers.is_probing(1)
+    # Chỉ một request thăm dò trong lúc half-open
+    assert not breakers.allow_request(1)
+
+
+def test_failed_probe_doubles_backoff_up_to_max(breakers, clock):
+    observed_at = fail(breakers, 1, 3)
+    for expected in (20, 40, 40):
+        clock.now += breakers.get_states()[1]["backoff"]
+        assert breakers.allow_request(1)
+        breakers.record(1, False, observed_at)
+        observed_at += 1
+        assert state(breakers, 1) == OPEN
+        assert breakers.get_states()[1]["backoff"] == expected
+
+
+def test_successful_probe_closes(breakers, clock):
+    observed_at = fail(breakers, 1, 3)
+    clock.now += 10
+    assert breakers.allow_request(1)
+    breakers.record(1, True, observed_at)
+    assert state(breakers, 1) == CLOSED
+    assert breakers.get_states() == {}
+
+
+def test_stuck_probe_is_retried_after_probe_timeout(breakers, clock):
+    fail(breakers, 1, 3)
+    clock.now += 10
+    assert breakers.allow_request(1)
+    clock.now += 59
+    assert not breakers.allow_request(1)
+    clock.now += 1
+    assert breakers.allow_request(1)
+
+
+def test_stale_observation_is_ignored(breakers):
+    # Snapshot dùng chung giữa các monitor chỉ được tính một lần
+    for _ in range(3):
+        breakers.record(1, False, 5)
+    assert breakers.get_states()[1]["failures"] == 1
+
+
+def test_expedite_allows_probe_immediately(breakers):
+    fail(breakers, 1, 3)
+    assert not breakers.allow_request(1)
+    breakers.expedite(1)
+    assert breakers.allow_request(1)
+
+
+def test_forget_removed_routers(breakers):
+    fail(breakers, 1, 3)
+    fail(breakers, 2, 3)
+    breakers.forget({2})
+    assert list(breakers.get_states()) == [2]
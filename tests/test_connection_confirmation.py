@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra xác nhận mất kết nối: các lần kiểm tra lại nhanh được xếp vào lịch thay vì chờ trong worker"""
+
+import copy
+import importlib
+import time
+
+alert_monitor_module = importlib.import_module("monitoring.alert_monitor")
+
+ROUTER_ID = 9001
+
+
+class DownSource:
+    """Nguồn snapshot giả lập: router luôn không kết nối được"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def fetch(self, router_id, sections, timeout=None):
+        self.calls.append(list(sections))
+        return {"connected": False, "timestamp": time.time(), "sections": {}, "errors": {}}
+
+
+def make_monitor(monkeypatch, confirm_interval):
+    monitor = alert_monitor_module.AlertMonitor()
+    config = copy.deepcopy(monitor.config)
+    config["alerts"]["connection_lost"].update(enabled=True, retries=3, confirm_interval=confirm_interval)
+    config["circuit_breaker"] = dict(config.get("circuit_breaker", {}), failure_threshold=10)
+    monitor.config = config
+    monitor.data_source = DownSource()
+    monitor._reset_schedule()
+    monitor.scheduler.sync([ROUTER_ID], {"connection": 60})
+    
+    alerts = []
+    monkeypatch.setattr(monitor, "_send_connection_lost_alert", lambda router_id, router_name: alerts.append(router_id))
+    monkeypatch.setattr(alert_monitor_module.router_breakers, "allow_request", lambda router_id: True)
+    monkeypatch.setattr(alert_monitor_module.router_breakers, "record", lambda *args, **kwargs: None)
+    return monitor, alerts
+
+
+def test_failed_poll_schedules_confirmation_instead_of_waiting(monkeypatch):
+    monitor, alerts = make_monitor(monkeypatch, confirm_interval=30)
+    
+    started = time.monotonic()
+    assert monitor._poll_router({"id": ROUTER_ID}, ["connection"])
+    assert time.monotonic() - started < 5
+    assert len(monitor.data_source.calls) == 1
+    assert alerts == []
+    
+    # Lần kiểm tra lại được xếp vào lịch sau confirm_interval, sớm hơn chu kỳ kiểm tra 60 giây
+    assert monitor._pop_due_polls() == []
+    assert started + 29 < monitor.scheduler.next_due() < started + 35
+
+
+def test_confirmation_polls_run_until_alert(monkeypatch):
+    monitor, alerts = make_monitor(monkeypatch, confirm_interval=0)
+    
+    monitor._poll_router({"id": ROUTER_ID}, ["connection"])
+    for _ in range(2):
+        polls = monitor._pop_due_polls()
+        assert [(router["id"], checks) for router, checks, _ in polls] == [(ROUTER_ID, ["connection"])]
+        monitor._run_scheduled_poll(*polls[0])
+    
+    assert alerts == [ROUTER_ID]
+    # Đã đủ số lần thử lại: không xếp thêm lần kiểm tra lại nhanh
+    assert monitor.pending_confirmations == {}
+    assert monitor._pop_due_polls() == []
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra tính mức tăng bộ đếm byte: tràn bộ đếm 32/64 bit và bộ đếm bị reset"""
+
+from monitoring.check_bandwidth_usage import BandwidthMonitor, counter_delta, COUNTER32_LIMIT
+
+
+def test_increasing_counter():
+    assert counter_delta(1000, 1500) == 500
+    assert counter_delta(1000, 1000) == 0
+
+
+def test_64bit_counter_never_wraps_to_32bit():
+    # Bộ đếm 64 bit lớn hơn giới hạn 32 bit chỉ tăng
+    assert counter_delta(COUNTER32_LIMIT + 10, COUNTER32_LIMIT + 110, max_delta=1000) == 100
+
+
+def test_decrease_near_32bit_limit_is_reset_by_default():
+    # RouterOS trả về bộ đếm 64 bit: bộ đếm giảm là reset, kể cả khi giá trị trước gần giới hạn 32 bit
+    previous = COUNTER32_LIMIT - 100
+    assert counter_delta(previous, 50, max_delta=1000) is None
+    assert counter_delta(previous, 50) is None
+
+
+def test_32bit_wrap_within_max_delta():
+    previous = COUNTER32_LIMIT - 100
+    assert counter_delta(previous, 50, max_delta=1000, counter32=True) == 150
+    assert counter_delta(previous, 50, counter32=True) == 150
+
+
+def test_32bit_wrap_exceeding_max_delta_is_reset():
+    # Mức tăng sau khi tràn lớn hơn tốc độ tối đa cho phép: coi là reset
+    previous = COUNTER32_LIMIT - 100
+    assert counter_delta(previous, 5000, max_delta=1000, counter32=True) is None
+
+
+def test_decrease_of_64bit_counter_is_reset():
+    # Giá trị trước vượt khoảng 32 bit: bộ đếm giảm chỉ có thể là reset (router khởi động lại)
+    assert counter_delta(COUNTER32_LIMIT + 5000, 10, max_delta=10 ** 12) is None
+
+
+def test_compute_rate_treats_decrease_as_reset_unless_configured_32bit():
+    monitor = BandwidthMonitor()
+    monitor.configure({"counter32_interfaces": ["1_ether2"]})
+    monitor.get_interface_speed = lambda router_id, interface_name, interfaces=None: 10 ** 9
+    
+    for name in ("ether1", "ether2"):
+        monitor.compute_rate(1, {"name": name, "rxBytes": COUNTER32_LIMIT - 1000, "txBytes": 0}, 100)
+    
+    assert monitor.compute_rate(1, {"name": "ether1", "rxBytes": 1000, "txBytes": 10}, 101) is None
+    rate = monitor.compute_rate(1, {"name": "ether2", "rxBytes": 1000, "txBytes": 10}, 101)
+    assert rate["rx_bits_per_second"] == 2000 * 8
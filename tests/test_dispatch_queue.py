@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra hàng đợi gửi thông báo: không chặn người gọi, kết quả theo người nhận, bỏ khi đầy và dừng có thời hạn"""
+
+import time
+import threading
+
+from notifications.dispatch_queue import DispatchQueue, DeliveryHandle
+
+
+def make_queue(**kwargs):
+    kwargs.setdefault("workers", {"email": 1, "sms": 1})
+    kwargs.setdefault("shutdown_timeout", 1)
+    return DispatchQueue(**kwargs)
+
+
+def test_submit_returns_before_slow_send_finishes():
+    dispatch = make_queue()
+    release = threading.Event()
+    handle = DeliveryHandle("Router1", "connection_lost")
+    
+    started = time.monotonic()
+    assert dispatch.submit("email", handle, "a@example.com", release.wait, 5)
+    handle.seal()
+    assert time.monotonic() - started < 0.5
+    assert not handle.done()
+    assert handle.result(timeout=0)["status"] == "queued"
+    
+    release.set()
+    assert handle.wait(2)
+    assert handle.result()["channels"]["email"]["recipients"] == {"a@example.com": "success"}
+    dispatch.shutdown()
+
+
+def test_handle_reports_per_recipient_outcomes():
+    dispatch = make_queue()
+    handle = DeliveryHandle("Router1", "high_cpu")
+    
+    def send(recipient):
+        if recipient == "boom":
+            raise RuntimeError("provider down")
+        return recipient != "bad"
+    
+    for recipient in ("good", "bad", "boom"):
+        dispatch.submit("sms", handle, recipient, send, recipient)
+    handle.seal()
+    
+    result = handle.result(timeout=2)
+    assert result["status"] == "partial"
+    assert result["channels"]["sms"]["recipients"] == {"good": "success", "bad": "failed", "boom": "failed"}
+    metrics = dispatch.get_metrics()["sms"]
+    assert (metrics["sent"], metrics["failed"], metrics["dropped"]) == (1, 2, 0)
+    assert metrics["latency_max"] is not None
+    dispatch.shutdown()
+
+
+def test_batched_recipients_share_one_send():
+    dispatch = make_queue()
+    handle = DeliveryHandle("Router1", "connection_lost")
+    calls = []
+    
+    dispatch.submit("email", handle, ["a", "b", "c"], lambda batch: calls.append(batch) or True, ["a", "b", "c"])
+    handle.seal()
+    
+    result = handle.result(timeout=2)
+    assert calls == [["a", "b", "c"]]
+    assert result["status"] == "sent"
+    assert result["channels"]["email"]["recipients"] == {"a": "success", "b": "success", "c": "success"}
+
+
+def test_slow_channel_does_not_block_other_channel():
+    dispatch = make_queue()
+    release = threading.Event()
+    email = DeliveryHandle("Router1", "connection_lost")
+    sms = DeliveryHandle("Router1", "connection_lost")
+    
+    dispatch.submit("email", email, "a@example.com", release.wait, 5)
+    dispatch.submit("sms", sms, "+840000", lambda: True)
+    email.seal()
+    sms.seal()
+    
+    assert sms.wait(2)
+    assert not email.done()
+    release.set()
+    assert email.wait(2)
+    dispatch.shutdown()
+
+
+def test_full_queue_drops_and_records():
+    dispatch = make_queue(max_queue=1)
+    release = threading.Event()
+    handle = DeliveryHandle("Router1", "connection_lost")
+    busy = threading.Event()
+    
+    def blocking():
+        busy.set()
+        return release.wait(5)
+    
+    assert dispatch.submit("email", handle, "first", blocking)
+    assert busy.wait(2)  # Worker đang gửi lượt đầu, hàng đợi trống
+    assert dispatch.submit("email", handle, "second", lambda: True)
+    assert dispatch.free_slots("email") == 0
+    assert not dispatch.submit("email", handle, "third", lambda: True)
+    handle.seal()
+    
+    release.set()
+    result = handle.result(timeout=2)
+    assert result["channels"]["email"]["recipients"] == {"first": "success", "second": "success", "third": "dropped"}
+    assert result["status"] == "partial"
+    assert dispatch.get_metrics()["email"]["dropped"] == 1
+    dispatch.shutdown()
+
+
+def test_shutdown_drains_within_deadline():
+    dispatch = make_queue()
+    handle = DeliveryHandle("Router1", "connection_lost")
+    for index in range(5):
+        dispatch.submit("email", handle, f"r{index}", lambda: time.sleep(0.01) or True)
+    handle.seal()
+    
+    assert dispatch.shutdown(timeout=2)
+    assert handle.result(timeout=0)["status"] == "sent"
+    assert dispatch.get_metrics()["email"]["sent"] == 5
+    assert dispatch.channels["email"].threads == []
+    
+    # Nhận lại lượt gửi mới sau khi dừng
+    again = DeliveryHandle("Router1", "connection_lost")
+    assert dispatch.submit("email", again, "late", lambda: True)
+    again.seal()
+    assert again.result(timeout=2)["status"] == "sent"
+    dispatch.shutdown()
+
+
+def test_shutdown_past_deadline_drops_pending():
+    dispatch = make_queue()
+    release = threading.Event()
+    handle = DeliveryHandle("Router1", "connection_lost")
+    dispatch.submit("email", handle, "stuck", release.wait, 1.5)
+    dispatch.submit("email", handle, "waiting", lambda: True)
+    handle.seal()
+    
+    assert not dispatch.shutdown(timeout=0.2)
+    assert handle.channels["email"]["recipients"]["waiting"] == "dropped"
+    release.set()
+    assert handle.wait(2)
+    assert handle.result()["status"] == "partial"
+
+
+def test_completed_handle_and_empty_seal():
+    handle = DeliveryHandle.completed({"status": "disabled", "reason": "off"}, "Router1", "high_cpu")
+    assert handle.done()
+    assert handle.result() == {"status": "disabled", "reason": "off", "channels": {}}
+    
+    empty = DeliveryHandle("Router1", "high_cpu")
+    empty.seal()
+    assert empty.done()
+    assert empty.result()["status"] == "sent"
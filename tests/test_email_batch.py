@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra gửi email gộp: một request SendGrid cho nhiều người nhận, render một lần, kết quả theo người nhận"""
+
+import importlib
+import json
+
+import pytest
+
+from notifications.dispatch_queue import DispatchQueue
+from notifications.provider_clients import close_clients
+from scripts.fake_provider_server import FakeProviderServer
+
+email_service_module = importlib.import_module("notifications.email_service")
+notification_service_module = importlib.import_module("notifications.notification_service")
+
+RECIPIENTS = ["a@example.com", "b@example.com", "c@example.com"]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeProviderServer().start()
+    monkeypatch.setenv("SENDGRID_API_HOST", server.url)
+    monkeypatch.setattr(email_service_module.email_service, "api_key", "test-key")
+    yield server
+    close_clients()
+    server.stop()
+
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    calls = []
+    render = email_service_module.email_service.render
+    
+    def counting_render(template_name, context=None):
+        calls.append(template_name)
+        return render(template_name, context)
+    
+    monkeypatch.setattr(email_service_module.email_service, "render", counting_render)
+    return calls
+
+
+def make_service(tmp_path, monkeypatch, recipients, batch=True):
+    config = notification_service_module.NotificationService._get_default_config(None)
+    config["channels"]["email"].update(recipients=recipients, batch=batch)
+    config["outbox"]["enabled"] = False
+    config["alert_types"]["connection_lost"]["channels"] = ["email"]
+    config_file = tmp_path / "notification_config.json"
+    config_file.write_text(json.dumps(config), encoding="utf-8")
+    monkeypatch.setattr(notification_service_module, "CONFIG_FILE", str(config_file))
+    
+    service = notification_service_module.NotificationService()
+    service.dispatch = DispatchQueue(workers={"email": 2}, shutdown_timeout=2)
+    return service
+
+
+def test_batch_sends_one_request_and_renders_once(server, render_calls):
+    results = email_service_module.email_service.send_alert_email_batch(
+        RECIPIENTS + ["a@example.com"], "Router1", "connection_lost", "Mất kết nối"
+    )
+    
+    assert results == {email: True for email in RECIPIENTS}
+    assert render_calls == ["alert_email.html"]
+    counters = server.reset_counters()
+    assert counters["sendgrid"] == 1
+    assert counters["sendgrid_recipients"] == 3
+
+
+def test_batch_splits_at_max_personalizations(server, render_calls, monkeypatch):
+    monkeypatch.setattr(email_service_module, "MAX_PERSONALIZATIONS", 2)
+    recipients = [f"user{index}@example.com" for index in range(5)]
+    
+    results = email_service_module.email_service.send_email_batch(
+        recipients, "subject", "alert_email.html", {"device_name": "Router1"}
+    )
+    
+    assert results == {email: True for email in recipients}
+    assert len(render_calls) == 1
+    counters = server.reset_counters()
+    assert counters["sendgrid"] == 3
+    assert counters["sendgrid_recipients"] == 5
+
+
+def test_batch_rejected_marks_every_recipient_failed(server, monkeypatch):
+    monkeypatch.setenv("SENDGRID_API_HOST", server.url + "/missing")
+    results = email_service_module.email_service.send_alert_email_batch(
+        RECIPIENTS, "Router1", "connection_lost", "Mất kết nối"
+    )
+    assert results == {email: False for email in RECIPIENTS}
+
+
+def test_send_alert_reports_per_recipient_status_for_batch(server, render_calls, tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RECIPIENTS)
+    
+    result = service.send_alert("Router1", "connection_lost").result(timeout=5)
+    
+    assert result["status"] == "sent"
+    assert result["channels"]["email"]["recipients"] == {email: "success" for email in RECIPIENTS}
+    assert len(render_calls) == 1
+    counters = server.reset_counters()
+    assert counters["sendgrid"] == 1
+    assert counters["sendgrid_recipients"] == 3
+    service.dispatch.shutdown()
+
+
+def test_send_alert_batch_failure_and_unbatched_path(server, tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RECIPIENTS, batch=False)
+    result = service.send_alert("Router1", "connection_lost").result(timeout=5)
+    assert result["channels"]["email"]["recipients"] == {email: "success" for email in RECIPIENTS}
+    assert server.reset_counters()["sendgrid"] == 3
+    
+    service.config["channels"]["email"]["batch"] = True
+    monkeypatch.setenv("SENDGRID_API_HOST", server.url + "/missing")
+    result = service.send_alert("Router1", "connection_lost").result(timeout=5)
+    assert result["status"] == "failed"
+    assert result["channels"]["email"]["recipients"] == {email: "failed" for email in RECIPIENTS}
+    service.dispatch.shutdown()
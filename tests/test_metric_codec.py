@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra nén/giải nén chuỗi chỉ số (metric_codec)"""
+
+import numpy as np
+import pytest
+
+from monitoring.metric_codec import (
+    BLOCK_SIZE, TIMESTAMP_RESOLUTION, encode_series, decode_series, block_headers
+)
+
+
+def quantize(timestamps):
+    """Timestamp được lưu theo độ phân giải TIMESTAMP_RESOLUTION"""
+    return np.round(np.asarray(timestamps) * TIMESTAMP_RESOLUTION) / TIMESTAMP_RESOLUTION
+
+
+def assert_round_trip(timestamps, values):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    decoded_timestamps, decoded_values = decode_series(encode_series(timestamps, values))
+    np.testing.assert_allclose(decoded_timestamps, quantize(timestamps), rtol=0, atol=1e-6)
+    # Giá trị được giữ nguyên từng bit
+    assert decoded_values.tobytes() == values.tobytes()
+
+
+def test_regular_polling():
+    timestamps = 1.7e9 + np.arange(500) * 60.0
+    values = np.full(500, 12345.678)
+    assert_round_trip(timestamps, values)
+
+
+def test_empty_series():
+    assert encode_series(np.empty(0), np.empty(0)) == b''
+    timestamps, values = decode_series(b'')
+    assert len(timestamps) == 0 and len(values) == 0
+
+
+def test_single_point():
+    assert_round_trip([1.7e9 + 0.123], [42.0])
+
+
+# Tổng trong header của block có cả inf và -inf là NaN
+@pytest.mark.filterwarnings("ignore:overflow encountered:RuntimeWarning", "ignore:invalid value encountered:RuntimeWarning")
+@pytest.mark.parametrize("seed", range(20))
+def test_random_series(seed):
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(1, 3 * BLOCK_SIZE))
+    # Khoảng cách lấy mẫu bất thường: jitter nhỏ, khoảng trống lớn và timestamp trùng nhau
+    gaps = rng.choice([0.0, 0.001, 1.0, 59.997, 60.0, 3600.0, 1e6], size=count) + rng.integers(0, 1000, count) / 1000
+    timestamps = 1.7e9 + np.cumsum(gaps)
+    values = np.concatenate([
+        rng.normal(0, 1e9, count // 2),
+        rng.choice([0.0, -0.0, 1.0, np.inf, -np.inf, 5e-324, 1.7976931348623157e308], size=count - count // 2)
+    ])
+    rng.shuffle(values)
+    assert_round_trip(timestamps, values)
+
+
+def test_nan_values_round_trip():
+    values = np.array([1.0, np.nan, 2.0, np.nan])
+    timestamps = 1.7e9 + np.arange(4)
+    decoded_timestamps, decoded_values = decode_series(encode_series(timestamps, values))
+    assert decoded_values.tobytes() == values.tobytes()
+
+
+def test_block_headers_and_range_query():
+    count = 2 * BLOCK_SIZE + 10
+    timestamps = 1.7e9 + np.arange(count) * 10.0
+    values = np.arange(count, dtype=np.float64)
+    data = encode_series(timestamps, values)
+    
+    headers = [header for _, header in block_headers(data)]
+    assert [int(header['count']) for header in headers] == [BLOCK_SIZE, BLOCK_SIZE, 10]
+    assert headers[0]['min'] == 0 and headers[0]['max'] == BLOCK_SIZE - 1
+    assert headers[0]['sum'] == values[:BLOCK_SIZE].sum()
+    
+    # Chỉ giải nén block có điểm trong khoảng
+    decoded_timestamps, decoded_values = decode_series(data, start=timestamps[-5], end=timestamps[-1])
+    np.testing.assert_array_equal(decoded_values, values[2 * BLOCK_SIZE:])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra rollup chuỗi thời gian: tổng hợp theo tầng, xử lý tăng dần, chọn tầng khi truy vấn và xóa dữ liệu gốc"""
+
+import time
+
+import numpy as np
+import pytest
+
+from monitoring.metric_store import MetricStore
+from monitoring.metric_rollup import MetricRollups
+
+# Vài giờ trước: các tầng còn giữ khoảng thời gian này khi truy vấn theo thời gian thực
+BASE = (int(time.time()) // 3600 - 4) * 3600
+TAGS = {"router": 1, "interface": "ether1"}
+TIERS = [
+    {"name": "1m", "step": 60, "retention": 86400, "segment_seconds": 3600},
+    {"name": "5m", "step": 300, "retention": 7 * 86400, "segment_seconds": 6 * 3600},
+]
+
+
+def make_rollups(tmp_path, **kwargs):
+    store = MetricStore(path=str(tmp_path), segment_seconds=600, seal_delay=0, flush_interval=3600)
+    return store, MetricRollups(store, tiers=TIERS, lag=30, **kwargs)
+
+
+def write_points(store, start, end, step=10):
+    """Một điểm mỗi step giây trong [start, end), giá trị bằng số giây tính từ BASE"""
+    store.write_many(("rx_bits", TAGS, float(timestamp - BASE), timestamp) for timestamp in range(start, end, step))
+    store.flush()
+
+
+def expected(store, step, aggregate, start, end):
+    return store.query_downsampled("rx_bits", TAGS, start, end - 1e-6, step, aggregate)
+
+
+def test_tiers_match_raw_downsampling(tmp_path):
+    store, rollups = make_rollups(tmp_path)
+    write_points(store, BASE, BASE + 7200)
+    
+    written = rollups.run_once(now=BASE + 7200 + 30)
+    assert written == {"1m": 120, "5m": 24}
+    assert rollups.load_state() == {"1m": BASE + 7200, "5m": BASE + 7200}
+    
+    for tier, aggregates in (("1m", ("avg", "min", "last")), ("5m", ("max", "p95"))):
+        step = 60 if tier == "1m" else 300
+        for aggregate in aggregates:
+            timestamps, values = rollups.tier_stores[tier].query(f"rx_bits:{aggregate}", TAGS)
+            raw_timestamps, raw_values = expected(store, step, aggregate, BASE, BASE + 7200)
+            assert timestamps.tolist() == raw_timestamps.tolist()
+            assert values.tolist() == pytest.approx(raw_values.tolist())
+
+
+def test_runs_are_incremental(tmp_path):
+    store, rollups = make_rollups(tmp_path)
+    write_points(store, BASE, BASE + 3600)
+    rollups.run_once(now=BASE + 3600 + 30)
+    
+    # Khoảng chưa kết thúc quá lag giây chưa được tổng hợp
+    write_points(store, BASE + 3600, BASE + 3900)
+    assert rollups.run_once(now=BASE + 3900 + 10) == {"1m": 4, "5m": 0}
+    assert rollups.run_once(now=BASE + 3900 + 30) == {"1m": 1, "5m": 1}
+    
+    timestamps, _ = rollups.tier_stores["1m"].query("rx_bits:avg", TAGS)
+    assert len(timestamps) == len(np.unique(timestamps)) == 65
+
+
+def test_query_reads_coarsest_tier_and_raw_tail(tmp_path):
+    store, rollups = make_rollups(tmp_path)
+    write_points(store, BASE, BASE + 7200)
+    rollups.run_once(now=BASE + 3600 + 30)
+    
+    now = BASE + 7200
+    assert rollups.select_tier(30, now=now) is None
+    assert rollups.select_tier(60, now=now)["name"] == "1m"
+    assert rollups.select_tier(900, now=now)["name"] == "5m"
+    
+    timestamps, values, tier = rollups.query("rx_bits", TAGS, start=BASE, end=BASE + 7199, resolution=300, aggregate="avg")
+    assert tier == "5m"
+    # Phần sau mốc đã tổng hợp (giờ thứ hai) được gộp từ dữ liệu gốc
+    raw_timestamps, raw_values = expected(store, 300, "avg", BASE, BASE + 7200)
+    assert timestamps.tolist() == raw_timestamps.tolist()
+    assert values.tolist() == pytest.approx(raw_values.tolist())
+    
+    with pytest.raises(ValueError):
+        rollups.query("rx_bits", TAGS, aggregate="sum")
+
+
+def test_raw_data_is_deleted_only_after_rollup(tmp_path):
+    store, rollups = make_rollups(tmp_path, raw_retention=1800)
+    write_points(store, BASE, BASE + 3600)
+    
+    # Chưa tầng nào tổng hợp: dữ liệu gốc được giữ dù đã quá raw_retention
+    rollups.stop_event.set()
+    rollups.run_once(now=BASE + 7200)
+    rollups.stop_event.clear()
+    assert store.first_timestamp() == BASE
+    
+    rollups.run_once(now=BASE + 7200)
+    assert store.first_timestamp() is None
+    timestamps, _, tier = rollups.query("rx_bits", TAGS, start=BASE, resolution=60, aggregate="avg")
+    assert tier == "1m"
+    assert len(timestamps) == 60
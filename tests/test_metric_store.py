@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra kho chuỗi thời gian: ghi/đọc, đóng gói segment, tổng hợp, gộp theo khoảng và xóa dữ liệu cũ"""
+
+import os
+
+import numpy as np
+import pytest
+
+from monitoring.metric_store import MetricStore
+
+# Mốc thời gian đã qua từ lâu: mọi segment đều đóng gói được ngay
+BASE = 1_700_000_000 - 1_700_000_000 % 3600
+TAGS = {"router": 1, "interface": "ether1"}
+
+
+def make_store(path, **kwargs):
+    kwargs.setdefault("flush_interval", 3600)
+    return MetricStore(path=str(path), segment_seconds=600, seal_delay=0, **kwargs)
+
+
+def fill(store, count=1800, step=2.0):
+    """count điểm rx_bits cách nhau step giây, giá trị bằng chỉ số điểm"""
+    store.write_many(("rx_bits", TAGS, float(index), BASE + index * step) for index in range(count))
+
+
+def segment_files(path):
+    return sorted(os.path.splitext(name)[1] for name in os.listdir(path) if name != "series.log")
+
+
+def test_write_and_query_before_sealing(tmp_path):
+    store = MetricStore(path=str(tmp_path), segment_seconds=600, seal_delay=10 ** 12, flush_interval=3600)
+    fill(store, count=10)
+    store.write("rx_bits", {"router": 2, "interface": "ether1"}, 99.0, BASE)
+    
+    # Thứ tự tags không ảnh hưởng đến chuỗi
+    timestamps, values = store.query("rx_bits", {"interface": "ether1", "router": "1"})
+    assert values.tolist() == [float(index) for index in range(10)]
+    assert timestamps[0] == BASE
+    assert segment_files(tmp_path) == [".log"]
+    assert store.query("rx_bits", {"router": 3})[0].size == 0
+    assert store.query("cpu_load", TAGS)[0].size == 0
+
+
+def test_sealed_segments_keep_points_and_accept_late_points(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    store.flush()
+    assert set(segment_files(tmp_path)) == {".seg"}
+    
+    timestamps, values = store.query("rx_bits", TAGS, start=BASE + 100, end=BASE + 199)
+    assert values.tolist() == [float(index) for index in range(50, 100)]
+    
+    # Điểm đến muộn của segment đã đóng gói được gộp lại khi đóng gói lần sau
+    store.write("rx_bits", TAGS, -1.0, BASE + 1.0)
+    store.flush()
+    timestamps, values = store.query("rx_bits", TAGS, end=BASE + 2)
+    assert values.tolist() == [0.0, -1.0, 1.0]
+    assert set(segment_files(tmp_path)) == {".seg"}
+
+
+def test_aggregate_matches_raw_points(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    store.flush()
+    store.write("rx_bits", TAGS, 5000.0, BASE + 3600 * 10)
+    
+    for start, end in ((None, None), (BASE + 333, BASE + 2777), (BASE + 601, BASE + 602)):
+        timestamps, values = store.query("rx_bits", TAGS, start, end)
+        result = store.aggregate("rx_bits", TAGS, start, end)
+        assert result["count"] == len(values)
+        assert result["sum"] == pytest.approx(values.sum())
+        assert result["min"] == values.min() and result["max"] == values.max()
+    
+    assert store.aggregate("rx_bits", TAGS, BASE - 100, BASE - 1) == {
+        "count": 0, "min": None, "max": None, "sum": 0.0, "avg": None
+    }
+
+
+def test_query_downsampled(tmp_path):
+    store = make_store(tmp_path)
+    fill(store, count=60, step=1.0)
+    
+    starts, averages = store.query_downsampled("rx_bits", TAGS, step=20, aggregate="avg")
+    assert starts.tolist() == [BASE, BASE + 20, BASE + 40]
+    assert averages.tolist() == [9.5, 29.5, 49.5]
+    assert store.query_downsampled("rx_bits", TAGS, step=20, aggregate="p95")[1].tolist() == [18.0, 38.0, 58.0]
+    assert store.query_downsampled("rx_bits", TAGS, step=20, aggregate="last")[1].tolist() == [19.0, 39.0, 59.0]
+    with pytest.raises(ValueError):
+        store.query_downsampled("rx_bits", TAGS, aggregate="median")
+
+
+def test_second_reader_sees_writer_data(tmp_path):
+    writer = make_store(tmp_path)
+    fill(writer, count=100)
+    writer.flush()
+    writer.write("rtt_ms", {"router": 1}, 3.5, BASE + 5000)
+    writer.flush()
+    
+    reader = make_store(tmp_path)
+    assert {entry["metric"] for entry in reader.series()} == {"rx_bits", "rtt_ms"}
+    assert reader.query("rx_bits", TAGS)[1].size == 100
+    assert reader.query("rtt_ms", {"router": 1})[1].tolist() == [3.5]
+    assert reader.get_series(reader.get_series_id("rtt_ms", {"router": 1})) == ("rtt_ms", {"router": "1"})
+
+
+def test_scan_and_delete_before(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    store.flush()
+    
+    records = store.scan(BASE, BASE + 600)
+    assert len(records) == 300
+    assert np.sort(records["value"]).tolist() == [float(index) for index in range(300)]
+    
+    assert store.first_timestamp() == BASE
+    removed = store.delete_before(BASE + 1200)
+    assert removed == 2
+    assert store.first_timestamp() == BASE + 1200
+    assert store.query("rx_bits", TAGS)[1][0] == 600.0
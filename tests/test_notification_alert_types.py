@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra mọi loại cảnh báo mà bộ giám sát gửi đều được dịch vụ thông báo hỗ trợ"""
+
+import importlib
+import json
+import os
+
+alert_monitor_module = importlib.import_module("monitoring.alert_monitor")
+notification_service_module = importlib.import_module("notifications.notification_service")
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "notification_config.json")
+
+
+def test_monitor_alert_types_are_registered():
+    monitor_alerts = alert_monitor_module.AlertMonitor._get_default_config(None)["alerts"]
+    alert_types = notification_service_module.NotificationService._get_default_config(None)["alert_types"]
+    assert set(monitor_alerts) <= set(alert_types)
+    assert "high_bandwidth" in alert_types
+
+
+def test_shipped_notification_config_lists_monitor_alert_types():
+    with open(CONFIG_PATH, encoding="utf-8") as f:
+        shipped = json.load(f)["alerts"]
+    monitor_alerts = alert_monitor_module.AlertMonitor._get_default_config(None)["alerts"]
+    assert set(monitor_alerts) <= set(shipped)
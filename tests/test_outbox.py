@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra outbox thông báo: lịch thử lại, chuyển sang dead và gửi tiếp sau khi khởi động lại"""
+
+import time
+import sqlite3
+
+import pytest
+
+from notifications.dispatch_queue import DispatchQueue, DeliveryHandle
+from notifications.outbox import NotificationOutbox, PENDING, SENDING, DELIVERED, DEAD
+
+
+class FlakySender:
+    """Hàm gửi giả lập: thất bại failures lần đầu rồi thành công"""
+    
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+    
+    def __call__(self, recipient, payload):
+        self.calls.append((recipient, payload))
+        return len(self.calls) > self.failures
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def rows(outbox):
+    return outbox._connection().execute("SELECT id, status, attempts, next_attempt FROM outbox ORDER BY id").fetchall()
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    outboxes = []
+    
+    def make(sender, **options):
+        options.setdefault("poll_interval", 0.05)
+        dispatch = DispatchQueue(workers={"email": 1}, shutdown_timeout=1)
+        outbox = NotificationOutbox(path=str(tmp_path / "outbox.db"), senders={"email": sender},
+                                    dispatch=dispatch, **options)
+        outboxes.append(outbox)
+        return outbox
+    
+    yield make
+    for outbox in outboxes:
+        outbox.stop(timeout=1)
+
+
+@pytest.mark.parametrize("attempts, low, high", [(1, 5, 10), (2, 10, 20), (3, 20, 40), (10, 50, 100)])
+def test_retry_delay_backoff_with_jitter(tmp_path, attempts, low, high):
+    outbox = NotificationOutbox(path=str(tmp_path / "outbox.db"), base_delay=10, max_delay=100)
+    delays = [outbox.retry_delay(attempts) for _ in range(200)]
+    assert all(low <= delay <= high for delay in delays)
+    # Jitter: các lần thử lại không dồn vào cùng một thời điểm
+    assert len(set(delays)) > 1
+
+
+def test_delivered_on_first_attempt(make_outbox):
+    sender = FlakySender()
+    outbox = make_outbox(sender)
+    handle = DeliveryHandle("Router1", "connection_lost")
+    outbox.enqueue(handle, [("email", "a@example.com", {"alert_type": "connection_lost"})])
+    handle.seal()
+    
+    assert handle.result(5)["status"] == "sent"
+    assert handle.result()["channels"]["email"]["recipients"] == {"a@example.com": "success"}
+    assert [row[1:3] for row in rows(outbox)] == [(DELIVERED, 1)]
+
+
+def test_failure_schedules_retry(make_outbox):
+    sender = FlakySender(failures=1)
+    outbox = make_outbox(sender, base_delay=100, max_delay=1000)
+    started = time.time()
+    outbox.enqueue(None, [("email", "a@example.com", {})])
+    
+    assert wait_for(lambda: rows(outbox)[0][2] == 1)
+    _, status, attempts, next_attempt = rows(outbox)[0]
+    assert status == PENDING
+    # Lần thử lại đầu tiên sau base_delay / 2 đến base_delay giây
+    assert started + 50 <= next_attempt <= time.time() + 100
+    assert len(sender.calls) == 1
+
+
+def test_retry_until_delivered(make_outbox):
+    sender = FlakySender(failures=2)
+    outbox = make_outbox(sender, base_delay=0.01, max_delay=0.05)
+    handle = DeliveryHandle("Router1", "connection_lost")
+    outbox.enqueue(handle, [("email", "a@example.com", {})])
+    handle.seal()
+    
+    assert handle.result(5)["status"] == "sent"
+    assert [row[1:3] for row in rows(outbox)] == [(DELIVERED, 3)]
+
+
+def test_dead_after_max_attempts_and_retry_dead(make_outbox):
+    sender = FlakySender(failures=3)
+    outbox = make_outbox(sender, max_attempts=3, base_delay=0.01, max_delay=0.05)
+    handle = DeliveryHandle("Router1", "connection_lost")
+    outbox.enqueue(handle, [("email", "a@example.com", {"device_name": "Router1"})])
+    handle.seal()
+    
+    assert handle.result(5)["status"] == "failed"
+    assert [row[1:3] for row in rows(outbox)] == [(DEAD, 3)]
+    dead = outbox.get_dead_letters()
+    assert len(dead) == 1 and dead[0]["payload"] == {"device_name": "Router1"} and dead[0]["last_error"]
+    
+    # Gửi lại dead-letter với số lần thử làm lại từ đầu
+    assert outbox.retry_dead() == 1
+    assert wait_for(lambda: rows(outbox)[0][1] == DELIVERED)
+    assert rows(outbox)[0][2] == 1
+
+
+def test_batched_delivery_records_every_recipient(make_outbox):
+    outbox = make_outbox(FlakySender())
+    handle = DeliveryHandle("Router1", "connection_lost")
+    recipients = ["a@example.com", "b@example.com"]
+    outbox.enqueue(handle, [("email", ", ".join(recipients), {"recipients": recipients})])
+    handle.seal()
+    
+    assert handle.result(5)["channels"]["email"]["recipients"] == {name: "success" for name in recipients}
+
+
+def test_resume_in_flight_deliveries_after_restart(make_outbox, tmp_path):
+    # Lượt gửi đang gửi dở khi tiến trình trước dừng đột ngột
+    path = str(tmp_path / "outbox.db")
+    previous = NotificationOutbox(path=path)
+    previous._connection()
+    now = time.time()
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "INSERT INTO outbox (channel, recipient, payload, status, next_attempt, created_at, updated_at) "
+            "VALUES ('email', 'a@example.com', '{}', ?, ?, ?, ?)", (SENDING, now, now, now)
+        )
+    
+    sender = FlakySender()
+    outbox = make_outbox(sender)
+    outbox.start()
+    assert wait_for(lambda: rows(outbox)[0][1] == DELIVERED)
+    assert sender.calls == [("a@example.com", {})]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra client nhà cung cấp dùng chung: một client cho mỗi bộ xác thực, dùng lại kết nối giữa các lượt gửi"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from notifications import provider_clients
+from notifications.provider_clients import get_sendgrid_client, get_twilio_client, close_clients
+from scripts.fake_provider_server import FakeProviderServer
+
+PAYLOAD = {
+    "personalizations": [{"to": [{"email": "admin@example.com"}]}],
+    "from": {"email": "mikrotik-monitor@example.com"},
+    "subject": "test",
+    "content": [{"type": "text/plain", "value": "test"}]
+}
+
+
+@pytest.fixture
+def server():
+    server = FakeProviderServer().start()
+    yield server
+    close_clients()
+    server.stop()
+
+
+def test_shared_client_per_credentials(server):
+    client = get_sendgrid_client("key-1", server.url)
+    assert get_sendgrid_client("key-1", server.url) is client
+    assert get_sendgrid_client("key-2", server.url) is not client
+    
+    twilio = get_twilio_client("AC1", "token", server.url)
+    assert get_twilio_client("AC1", "token", server.url) is twilio
+    assert get_twilio_client("AC1", "other", server.url) is not twilio
+    
+    close_clients()
+    assert provider_clients._clients == {}
+    assert get_sendgrid_client("key-1", server.url) is not client
+
+
+def test_sendgrid_reuses_connection(server):
+    client = get_sendgrid_client("key", server.url)
+    for _ in range(5):
+        assert client.send(PAYLOAD).status_code == 202
+    
+    counters = server.reset_counters()
+    assert counters["sendgrid"] == 5
+    assert counters["sendgrid_recipients"] == 5
+    assert counters["connections"] == 1
+
+
+def test_sendgrid_client_is_thread_safe(server):
+    client = get_sendgrid_client("key", server.url)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        statuses = list(executor.map(lambda _: client.send(PAYLOAD).status_code, range(40)))
+    
+    assert statuses == [202] * 40
+    counters = server.reset_counters()
+    assert counters["sendgrid"] == 40
+    assert counters["connections"] <= 4  # Không mở kết nối mới cho mỗi lượt gửi
+
+
+def test_twilio_reuses_connection_via_base_url(server):
+    client = get_twilio_client("AC123", "token", server.url)
+    for index in range(3):
+        message = client.messages.create(body=f"alert {index}", from_="+15005550006", to="+84900000000")
+        assert message.sid.startswith("SM")
+    
+    counters = server.reset_counters()
+    assert counters["twilio"] == 3
+    assert counters["connections"] == 1
+
+
+def test_sms_service_uses_shared_client(server, monkeypatch):
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID", "AC123")
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN", "token")
+    monkeypatch.setenv("TWILIO_PHONE_NUMBER", "+15005550006")
+    monkeypatch.setenv("TWILIO_API_BASE_URL", server.url)
+    from notifications.sms_service import SMSService
+    
+    service = SMSService()
+    assert service.send_sms("+84900000000", "router down")
+    assert service.send_sms("+84900000001", "router down")
+    assert SMSService().send_sms("+84900000002", "router down")
+    
+    counters = server.reset_counters()
+    assert counters["twilio"] == 3
+    assert counters["connections"] == 1
+    assert len(provider_clients._clients) == 1
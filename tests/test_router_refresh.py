@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra vòng lặp giám sát giữ nguyên lịch khi không tải được danh sách router"""
+
+import importlib
+
+alert_monitor_module = importlib.import_module("monitoring.alert_monitor")
+
+
+def test_failed_router_list_keeps_schedule(monkeypatch):
+    monitor = alert_monitor_module.AlertMonitor()
+    monitor.config = dict(monitor.config, check_interval=0)
+    monitor.active = True
+    monitor.executor = None
+    
+    responses = [[{"id": 1}, {"id": 2}], None]
+    refreshed = []
+    
+    def get_router_connections():
+        if not responses:
+            monitor.stop_event.set()
+            return None
+        return responses.pop(0)
+    
+    monkeypatch.setattr(monitor, "_get_router_connections", get_router_connections)
+    monkeypatch.setattr(monitor, "_refresh_schedule", refreshed.append)
+    monkeypatch.setattr(monitor, "_run_forecast", lambda: None)
+    monkeypatch.setattr(monitor, "_pop_due_polls", lambda: [])
+    monitor._monitor_loop()
+    
+    assert refreshed == [[{"id": 1}, {"id": 2}]]
+
+
+def test_get_router_connections_reports_failure_as_none(monkeypatch):
+    monitor = alert_monitor_module.AlertMonitor()
+    monkeypatch.setattr(alert_monitor_module.router_metadata, "refresh", lambda timeout=None: None)
+    assert monitor._get_router_connections() is None
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra collector RouterOS với server RouterOS API giả lập (scripts/fake_routeros_server.py)"""
+
+import logging
+
+import pytest
+from routeros_api.exceptions import RouterOsApiCommunicationError
+
+from monitoring.router_snapshot import RouterSnapshotFetcher
+from monitoring.routeros_collector import RouterOSCollector, error_message
+from scripts.fake_routeros_server import FakeRouterOSServer
+
+ROUTER_ID = 7
+PASSWORD = "s3cret-pass"
+
+
+class FakeMetadata:
+    def __init__(self, port):
+        self.router = {"id": ROUTER_ID, "address": "127.0.0.1", "port": str(port), "username": "admin"}
+    
+    def get(self, router_id, refresh=True):
+        return dict(self.router) if router_id == ROUTER_ID else None
+
+
+@pytest.fixture
+def server():
+    server = FakeRouterOSServer(username="admin", password=PASSWORD).start()
+    yield server
+    server.stop()
+
+
+def make_collector(server, monkeypatch, password=PASSWORD):
+    monkeypatch.setenv(f"MIKROTIK_PASSWORD_{ROUTER_ID}", password)
+    return RouterOSCollector(timeout=2, metadata=FakeMetadata(server.port), snapshots=RouterSnapshotFetcher(client=object()))
+
+
+def test_fetch_reads_all_sections(server, monkeypatch):
+    collector = make_collector(server, monkeypatch)
+    snapshot = collector.fetch(ROUTER_ID, ["resources", "interfaces", "firewall", "dhcp", "vpn", "wireless"])
+    collector.close_all()
+    
+    assert snapshot["connected"] is True
+    assert snapshot["errors"] == {}
+    sections = snapshot["sections"]
+    assert sections["resources"]["cpuLoad"] == 12
+    assert sections["resources"]["memoryUsed"] == 324 * 1024 * 1024
+    rates = {interface["name"]: interface.get("rate") for interface in sections["interfaces"]}
+    assert rates == {"ether1": "1Gbps", "ether2": "100Mbps", "wlan1": None, "l2tp-out1": None}
+    assert len(sections["firewall"]["filterRules"]) == 2
+    assert sections["dhcp"]["servers"][0]["name"] == "dhcp1"
+    assert [interface["name"] for interface in sections["vpn"]["interfaces"]] == ["l2tp-out1"]
+    assert sections["wireless"]["clients"][0]["signalStrength"] == -62
+
+
+def test_session_is_reused_between_fetches(server, monkeypatch):
+    collector = make_collector(server, monkeypatch)
+    for _ in range(3):
+        assert collector.fetch(ROUTER_ID, ["resources"])["connected"] is True
+    assert server.login_count == 1
+    assert collector.get_session_count() == 1
+    collector.close_all()
+    assert collector.get_session_count() == 0
+
+
+def test_rejected_login_is_unknown_status_without_password(server, monkeypatch, caplog):
+    collector = make_collector(server, monkeypatch, password="wrong-" + PASSWORD)
+    with caplog.at_level(logging.ERROR, logger="routeros_collector"):
+        snapshot = collector.fetch(ROUTER_ID, ["resources"])
+    
+    # Sai mật khẩu không phải là mất kết nối: trạng thái không xác định và lỗi riêng
+    assert snapshot["connected"] is None
+    assert snapshot["errors"] == {"auth": "RouterOSLoginError: invalid user name or password (6)"}
+    assert PASSWORD not in caplog.text
+    assert "=password=" not in caplog.text
+    assert server.login_count == 0
+
+
+def test_unreachable_router_is_disconnected(server, monkeypatch):
+    collector = make_collector(server, monkeypatch)
+    assert collector.fetch(ROUTER_ID, [])["connected"] is True
+    server.stop()
+    
+    snapshot = collector.fetch(ROUTER_ID, ["resources"])
+    assert snapshot["connected"] is False
+    assert "status" in snapshot["errors"]
+    assert "resources" not in snapshot["sections"]
+
+
+def test_error_message_omits_sent_command():
+    error = RouterOsApiCommunicationError(
+        "Error \"invalid user name or password (6)\" executing command b'/login =name=admin =password=hunter2'",
+        b"invalid user name or password (6)"
+    )
+    assert error_message(error) == "RouterOsApiCommunicationError: invalid user name or password (6)"
+    assert error_message(ConnectionRefusedError(111, "Connection refused")) == \
+        "ConnectionRefusedError: [Errno 111] Connection refused"
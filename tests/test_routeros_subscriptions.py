@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra đăng ký sự kiện interface/log qua lệnh listen với server RouterOS API giả lập"""
+
+import time
+import threading
+
+import pytest
+
+from monitoring.router_snapshot import RouterSnapshotFetcher
+from monitoring.routeros_collector import RouterOSCollector
+from monitoring.routeros_subscriptions import RouterOSSubscriptions
+from scripts.fake_routeros_server import FakeRouterOSServer
+
+ROUTER_ID = 11
+PASSWORD = "listen-secret"
+
+
+class FakeMetadata:
+    def __init__(self, port):
+        self.router = {"id": ROUTER_ID, "address": "127.0.0.1", "port": str(port), "username": "admin"}
+    
+    def get(self, router_id, refresh=True):
+        return dict(self.router) if router_id == ROUTER_ID else None
+
+
+class EventRecorder:
+    """Listener ghi lại các sự kiện nhận được"""
+    
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+    
+    def __call__(self, router_id, kind, data):
+        with self.condition:
+            self.events.append((router_id, kind, data))
+            self.condition.notify_all()
+    
+    def wait_for(self, predicate, timeout=5):
+        with self.condition:
+            assert self.condition.wait_for(lambda: any(predicate(*event) for event in self.events), timeout=timeout)
+    
+    def of_kind(self, kind):
+        with self.condition:
+            return [data for _, event_kind, data in self.events if event_kind == kind]
+
+
+@pytest.fixture
+def server():
+    server = FakeRouterOSServer(username="admin", password=PASSWORD).start()
+    yield server
+    server.stop()
+
+
+def make_subscriptions(server, monkeypatch, password=PASSWORD, retry_interval=60):
+    monkeypatch.setenv(f"MIKROTIK_PASSWORD_{ROUTER_ID}", password)
+    collector = RouterOSCollector(timeout=2, metadata=FakeMetadata(server.port), snapshots=RouterSnapshotFetcher(client=object()))
+    subscriptions = RouterOSSubscriptions(retry_interval=retry_interval, collector=collector)
+    recorder = EventRecorder()
+    subscriptions.add_listener(recorder)
+    return subscriptions, recorder
+
+
+def is_active_state(router_id, kind, data):
+    return kind == "state" and data["active"]
+
+
+def test_seed_and_pushed_changes(server, monkeypatch):
+    subscriptions, recorder = make_subscriptions(server, monkeypatch)
+    subscriptions.sync([ROUTER_ID])
+    try:
+        recorder.wait_for(is_active_state)
+        assert subscriptions.is_active(ROUTER_ID)
+        # Trạng thái ban đầu của mọi interface được gửi trước khi đăng ký được coi là hoạt động
+        assert [interface["name"] for interface in recorder.of_kind("interface")] == ["ether1", "ether2", "wlan1", "l2tp-out1"]
+        
+        server.update('/interface', {'name': 'ether1'}, running='false')
+        recorder.wait_for(lambda router_id, kind, data: kind == "interface" and data["name"] == "ether1" and not data["running"])
+        
+        server.add_log("link down on ether1")
+        recorder.wait_for(lambda router_id, kind, data: kind == "log" and data["message"] == "link down on ether1")
+    finally:
+        subscriptions.stop_all()
+
+
+def test_dropped_connection_is_reported_and_retried(server, monkeypatch):
+    subscriptions, recorder = make_subscriptions(server, monkeypatch, retry_interval=0)
+    subscriptions.sync([ROUTER_ID])
+    try:
+        recorder.wait_for(is_active_state)
+        server.drop_connections()
+        recorder.wait_for(lambda router_id, kind, data: kind == "state" and not data["active"])
+        assert not subscriptions.is_active(ROUTER_ID)
+        
+        deadline = time.monotonic() + 5
+        while subscriptions.subscriptions[ROUTER_ID].is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        subscriptions.sync([ROUTER_ID])
+        recorder.wait_for(lambda router_id, kind, data: len([state for state in recorder.of_kind("state") if state["active"]]) == 2)
+        assert server.login_count == 2
+    finally:
+        subscriptions.stop_all()
+
+
+def test_rejected_login_error_is_redacted(server, monkeypatch):
+    subscriptions, recorder = make_subscriptions(server, monkeypatch, password="wrong-" + PASSWORD)
+    subscriptions.sync([ROUTER_ID])
+    subscriptions.subscriptions[ROUTER_ID].thread.join(timeout=5)
+    
+    error = subscriptions.get_states()[ROUTER_ID]["error"]
+    assert error == "RouterOSLoginError: invalid user name or password (6)"
+    assert recorder.of_kind("state") == []
+
+
+def test_sync_stops_removed_routers(server, monkeypatch):
+    subscriptions, recorder = make_subscriptions(server, monkeypatch)
+    subscriptions.sync([ROUTER_ID])
+    recorder.wait_for(is_active_state)
+    subscription = subscriptions.subscriptions[ROUTER_ID]
+    
+    subscriptions.sync([])
+    subscription.thread.join(timeout=5)
+    assert not subscription.is_alive()
+    assert subscriptions.get_states() == {}
+    # Dừng chủ động không phải là bị ngắt: không có sự kiện "state" inactive
+    assert [state["active"] for state in recorder.of_kind("state")] == [True]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Kiểm tra prober TCP: danh sách đích, thăm dò cổng thật trên localhost và báo đổi trạng thái"""
+
+import socket
+
+from monitoring.tcp_prober import TcpProber, DEFAULT_API_PORT
+
+
+class FakeMetadata:
+    def __init__(self, routers):
+        self.routers = routers
+    
+    def get_all(self):
+        return list(self.routers)
+
+
+def closed_port():
+    """Cổng trên localhost không có tiến trình lắng nghe"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_get_targets_falls_back_to_default_port():
+    prober = TcpProber(metadata=FakeMetadata([
+        {"id": 1, "address": "10.0.0.1", "port": "8729"},
+        {"id": 2, "address": "10.0.0.2", "port": "api"},
+        {"id": 3, "address": "10.0.0.3", "port": ""},
+        {"id": 4, "address": "10.0.0.4"},
+        {"id": 5, "address": ""},
+    ]))
+    assert prober.get_targets() == [
+        (1, "10.0.0.1", 8729),
+        (2, "10.0.0.2", DEFAULT_API_PORT),
+        (3, "10.0.0.3", DEFAULT_API_PORT),
+        (4, "10.0.0.4", DEFAULT_API_PORT),
+    ]
+
+
+def test_probe_all_measures_open_and_closed_ports():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        open_port = server.getsockname()[1]
+        
+        prober = TcpProber(timeout=2)
+        results = prober.probe_all_sync([(1, "127.0.0.1", open_port), (2, "127.0.0.1", closed_port())])
+    
+    assert results[1] is not None and results[1] >= 0
+    assert results[2] is None
+    assert prober.is_reachable(1) is True
+    assert prober.is_reachable(2) is False
+    assert [rtt for _, rtt in prober.get_rtt_series(1)] == [results[1]]
+
+
+def test_record_notifies_listeners_on_state_change():
+    prober = TcpProber(history_size=2)
+    changes = []
+    prober.add_listener(lambda router_id, reachable: changes.append((router_id, reachable)))
+    
+    prober.record({1: 1.5}, timestamp=100)
+    prober.record({1: None}, timestamp=105)
+    prober.record({1: None}, timestamp=110)
+    prober.record({1: 2.0}, timestamp=115)
+    
+    # Lần thăm dò đầu tiên không phải là thay đổi trạng thái
+    assert changes == [(1, False), (1, True)]
+    assert prober.get_status(1)["failures"] == 0
+    assert prober.get_rtt_series(1) == [(110, None), (115, 2.0)]
+    assert prober.get_rtt_series(1, since=110) == [(115, 2.0)]
+
+
+def test_failing_listener_does_not_stop_others():
+    prober = TcpProber()
+    calls = []
+    
+    def broken(router_id, reachable):
+        raise RuntimeError("listener lỗi")
+    
+    prober.add_listener(broken)
+    prober.add_listener(lambda router_id, reachable: calls.append(router_id))
+    prober.record({1: 1.0})
+    prober.record({1: None})
+    assert calls == [1]
+
+
+def test_forget_drops_removed_routers():
+    prober = TcpProber()
+    prober.record({1: 1.0, 2: None})
+    prober.forget({1})
+    assert prober.get_status(2) is None
+    assert prober.get_rtt_series(2) == []
+    assert set(prober.get_all_status()) == {1}